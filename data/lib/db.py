@@ -1,12 +1,21 @@
-from typing import List, Optional
-import asyncio
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 import logging
+from datetime import datetime, timezone
 from supabase import create_client, Client
 from prefect import task
 from dotenv import load_dotenv
 import os 
 import polars as pl
 
+from data.lib.upsert_pipeline import (
+    error_code,
+    estimate_row_bytes,
+    run_pipelined_upserts,
+    upsert_bisecting,
+    upsert_json,
+    write_dead_letters
+)
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -32,8 +41,81 @@ else:
 sb: Client = create_client(url, key)
 
 DB_BATCH_SIZE = 1000
+# Position column added while upserting to track rejected rows
+REJECTED_ROW_INDEX = '__row_index'
+
+
+########################################################
+## KEYSET PAGINATION
+########################################################
+
+
+def _keyset_value(value: Any) -> str:
+    """Format a cursor value for a PostgREST filter (strings quoted)"""
+    if isinstance(value, str):
+        return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    return str(value)
+
+
+def keyset_filter(cursor: Dict[str, Any], keys: Sequence[str], desc: bool = False) -> str:
+    """
+    PostgREST or=() filter selecting rows strictly after the cursor on the keys tuple,
+    e.g. (a > x) or (a = x and b > y) or (a = x and b = y and c > z)
+    """
+    op = 'lt' if desc else 'gt'
+    clauses = []
+    for i, key in enumerate(keys):
+        terms = [f"{prev}.eq.{_keyset_value(cursor[prev])}" for prev in keys[:i]]
+        terms.append(f"{key}.{op}.{_keyset_value(cursor[key])}")
+        clauses.append(terms[0] if len(terms) == 1 else f"and({','.join(terms)})")
+    return ','.join(clauses)
+
+
+def apply_keyset(query, keys: Sequence[str], cursor: Optional[Dict[str, Any]] = None, desc: bool = False):
+    """Order a query by the keys and seek past the cursor (each page costs the same)"""
+    for key in keys:
+        query = query.order(key, desc=desc)
+    if cursor:
+        query = query.or_(keyset_filter(cursor, keys, desc))
+    return query
+
+
+def cursor_from_row(row: Dict[str, Any], keys: Sequence[str]) -> Dict[str, Any]:
+    """Cursor pointing at a row, to resume the scan right after it"""
+    return {key: row[key] for key in keys}
 
     
+########################################################
+## PIPELINE CHECKPOINTS
+########################################################
+
+
+def get_checkpoint(pipeline: str, checkpoint_key: str) -> Optional[Any]:
+    """Read a pipeline checkpoint value (None if never written or table missing)"""
+    try:
+        result = sb.table('pipeline_checkpoints').select('value') \
+            .eq('pipeline', pipeline).eq('checkpoint_key', checkpoint_key).limit(1).execute()
+        return result.data[0]['value'] if result.data else None
+    except Exception as e:
+        print(f"⚠️ Could not read checkpoint {pipeline}/{checkpoint_key}: {str(e)}", flush=True)
+        return None
+
+
+def set_checkpoint(pipeline: str, checkpoint_key: str, value: Any) -> bool:
+    """Write (upsert) a pipeline checkpoint value"""
+    try:
+        sb.table('pipeline_checkpoints').upsert({
+            'pipeline': pipeline,
+            'checkpoint_key': checkpoint_key,
+            'value': value,
+            'updated_at': datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+        }, on_conflict='pipeline,checkpoint_key').execute()
+        return True
+    except Exception as e:
+        print(f"⚠️ Could not write checkpoint {pipeline}/{checkpoint_key}: {str(e)}", flush=True)
+        return False
+
+
 ########################################################
 ## INSERT DATA
 ########################################################
@@ -43,25 +125,26 @@ DB_BATCH_SIZE = 1000
 async def batch_insert(
     df: pl.DataFrame,
     table_name: str,
-    batch_size: Optional[int] = DB_BATCH_SIZE
+    batch_size: Optional[int] = DB_BATCH_SIZE,
+    ignore_duplicates: bool = False
 ) -> pl.DataFrame:
-    """Insert dataframe into database in batches"""
+    """
+    Insert dataframe into database in batches (ignore_duplicates: keep existing rows as they are).
+    Returns the rows that were stored - dead-lettered rows are left out.
+    """
     try:
-        records = df.to_dicts()
-        print(f"Starting insert of {len(records)} records", flush=True)
+        print(f"Starting insert of {df.height} records", flush=True)
         
         # Debug duplicates
-        keys = [(r.get('contract_address'), r.get('blockchain')) for r in records]
-        if len(keys) != len(set(keys)):
-            print("Found duplicates in input data!", flush=True)
+        if {'contract_address', 'blockchain'} <= set(df.columns):
+            if df.select(['contract_address', 'blockchain']).is_duplicated().any():
+                print("Found duplicates in input data!", flush=True)
             
-        total_processed = 0
-        # Single batch since < 1000 rows
-        if await insert_individual_batches(records, table_name=table_name, batch_size=batch_size):
-            total_processed += len(records)
+        # The frame is sliced per batch - rows are never materialized as dicts
+        stored = await insert_individual_batches(df, table_name=table_name, batch_size=batch_size, ignore_duplicates=ignore_duplicates)
         
-        print(f"Total rows stored in DB: {total_processed}", flush=True)
-        return df
+        print(f"Total rows stored in DB: {stored.height}", flush=True)
+        return stored
         
     except Exception as e:
         print(f"Error during batch insert: {str(e)}", flush=True)
@@ -69,17 +152,19 @@ async def batch_insert(
 
 
 @task(retries=3, retry_delay_seconds=lambda x: 2 ** x)
-async def insert_individual_batches(data: List[dict], table_name: str, batch_size: int = 1000) -> bool:
-    """Insert data in batches, skipping records that fail foreign key checks"""
+async def insert_individual_batches(
+    data: pl.DataFrame,
+    table_name: str,
+    batch_size: int = 1000,
+    ignore_duplicates: bool = False
+) -> pl.DataFrame:
+    """Insert data in pipelined batches; rows Postgres rejects go to a dead-letter file. Returns the stored rows"""
     try:
-        print(f"Attempting to insert {len(data)} records into {table_name}...", flush=True)
+        print(f"Attempting to insert {data.height} records into {table_name}...", flush=True)
         
         # Show the first record for debugging
-        if data and len(data) > 0:
-            print(f"Sample record: {data[0]}", flush=True)
-        
-        # Table names that need special handling for "ON CONFLICT" issues
-        special_tables = ['user_nodes', 'cast_nodes', 'cast_edges', 'embeds']
+        if data.height > 0:
+            print(f"Sample record: {data.row(0, named=True)}", flush=True)
         
         # Extract actual table name without quotes for logging
         clean_table_name = table_name.replace('"', '')
@@ -92,82 +177,46 @@ async def insert_individual_batches(data: List[dict], table_name: str, batch_siz
             print(f"Using table '{base_table_name}' in public schema instead of {table_name}", flush=True)
         
         print(f"Using base table name: '{base_table_name}' for Supabase API calls", flush=True)
+        session = sb.postgrest.session
         
-        for i in range(0, len(data), batch_size):
-            batch = data[i:i + batch_size]
-            try:
-                print(f"Executing batch insert for {clean_table_name}, records {i}-{i+len(batch)}", flush=True)
-                
-                # Special handling for certain tables to avoid duplicate PK conflicts in a batch
-                if base_table_name in special_tables:
-                    # Process in much smaller batches for conflict-prone tables
-                    small_batch_size = 20  # Reduced batch size for more granular error handling
-                    successful_count = 0
-                    
-                    for j in range(0, len(batch), small_batch_size):
-                        small_batch = batch[j:j + small_batch_size]
-                        try:
-                            response = sb.table(base_table_name).upsert(small_batch).execute()
-                            print(f"Response for small batch: {response}", flush=True)
-                            successful_count += len(small_batch)
-                        except Exception as e:
-                            error_str = str(e)
-                            print(f"Error in small batch: {error_str}", flush=True)
-                            if '23503' in error_str or '21000' in error_str or 'APIError' in error_str:  # FK violation or conflict error or APIError
-                                # Try inserting one by one for problem batches
-                                print(f"Falling back to single-record inserts for records {i+j}-{i+j+len(small_batch)}", flush=True)
-                                for record in small_batch:
-                                    try:
-                                        single_response = sb.table(base_table_name).upsert([record]).execute()
-                                        print(f"Single record response: {single_response}", flush=True)
-                                        successful_count += 1
-                                    except Exception as single_e:
-                                        error_msg = str(single_e)
-                                        print(f"Error on single record: {type(single_e).__name__}: {error_msg}", flush=True)
-                                        # Log additional details for debugging
-                                        if 'APIError' in error_msg:
-                                            print(f"APIError details for record: {record}", flush=True)
-                            else:
-                                raise
-                            
-                    print(f"Successfully inserted {successful_count} of {len(batch)} records", flush=True)
-                else:
-                    # Normal batch processing for other tables
-                    result = sb.table(base_table_name).upsert(batch).execute()
-                    print(f"Batch {i}-{i+len(batch)} inserted, response: {result}", flush=True)
-            except Exception as e:
-                error_type = type(e).__name__
-                error_msg = str(e)
-                print(f"Error during batch {i}-{i+len(batch)}: {error_type}: {error_msg}", flush=True)
-                
-                if 'APIError' in error_type:
-                    print(f"APIError encountered, will try smaller batches or single records", flush=True)
-                    # Try to process in smaller batches
-                    tiny_batch_size = 10
-                    for k in range(0, len(batch), tiny_batch_size):
-                        try:
-                            tiny_batch = batch[k:k + tiny_batch_size]
-                            tiny_result = sb.table(base_table_name).upsert(tiny_batch).execute()
-                            print(f"Tiny batch {i+k}-{i+k+len(tiny_batch)} inserted, response: {tiny_result}", flush=True)
-                        except Exception as tiny_e:
-                            print(f"Error on tiny batch: {type(tiny_e).__name__}: {str(tiny_e)}", flush=True)
-                
-                elif '23503' in error_msg:  # Foreign key violation
-                    logging.warning(f"Foreign key violation during batch insert: {e}")
-                elif '42501' in error_msg:  # Permission denied
-                    logging.error(f"Permission denied for table {table_name}: {e}")
-                    print(f"Current database user lacks permissions for {table_name}", flush=True)
-                elif '21000' in error_msg:  # Conflicts error
-                    logging.warning(f"ON CONFLICT error: {e}")
-                    print(f"Try one-by-one insertion or remove duplicates before sending", flush=True)
-                elif '23502' in error_msg:  # Not null constraint violation
-                    logging.warning(f"Not null constraint violation: {e}")
-                    print(f"Check if your data contains null values for required fields", flush=True)
-                else:
-                    raise
-                
-            await asyncio.sleep(0.1)
-        return True
+        # Row positions ride along so rejected rows can be left out of the result; never sent
+        indexed = data.with_row_index(REJECTED_ROW_INDEX)
+        rejected_rows: List[int] = []
+        # Dead letters are written once the whole insert went through, so a
+        # task retry after a failed attempt doesn't record the same rows again
+        dead_letters: List[Tuple[Dict, Exception]] = []
+        
+        def upsert_batch(i: int, size: int) -> int:
+            """Upsert rows [i, i + size) - runs on a pipeline thread"""
+            batch = indexed.slice(i, size)
+            print(f"Executing batch insert for {clean_table_name}, records {i}-{i+len(batch)}", flush=True)
+            
+            # Whole batch in one request; row-level errors are bisected down to the bad rows
+            rejected = upsert_bisecting(
+                lambda rows: upsert_json(session, base_table_name, rows.drop(REJECTED_ROW_INDEX).write_json().encode(), ignore_duplicates),
+                batch
+            )
+            if rejected:
+                rejected_rows.extend(record.pop(REJECTED_ROW_INDEX) for record, _ in rejected)
+                dead_letters.extend(rejected)
+                codes = sorted({error_code(error) or 'unknown' for _, error in rejected})
+                print(f"⚠️ {len(rejected)} of {len(batch)} records in batch {i}-{i+len(batch)} rejected ({', '.join(codes)})", flush=True)
+            return len(batch) - len(rejected)
+        
+        # Keep several upserts in flight; batch size adapts to response latency
+        stored = await run_pipelined_upserts(
+            data.height,
+            upsert_batch,
+            batch_size=batch_size,
+            row_bytes=estimate_row_bytes(data)
+        )
+        print(f"Stored {stored} of {data.height} records in {clean_table_name}", flush=True)
+        if dead_letters:
+            path = write_dead_letters(clean_table_name, dead_letters)
+            print(f"⚠️ {len(dead_letters)} rejected records written to {path}", flush=True)
+        if not rejected_rows:
+            return data
+        return indexed.filter(~pl.col(REJECTED_ROW_INDEX).is_in(rejected_rows)).drop(REJECTED_ROW_INDEX)
         
     except Exception as e:
         error_type = type(e).__name__
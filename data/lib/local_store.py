@@ -0,0 +1,28 @@
+"""
+Local SQLite state shared by the pipelines (caches, fingerprints)
+
+Files live in PIPELINE_STATE_DIR (default: data/.state) so they survive
+between runs on the same worker without needing a database round-trip.
+"""
+
+import os
+import sqlite3
+
+LOCAL_STATE_DIR = os.environ.get(
+    "PIPELINE_STATE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".state")
+)
+
+def open_local_db(name: str) -> sqlite3.Connection:
+    """Open (or create) a named SQLite file in the local state directory"""
+    if name == ":memory:":
+        path = name
+    else:
+        os.makedirs(LOCAL_STATE_DIR, exist_ok=True)
+        path = os.path.join(LOCAL_STATE_DIR, f"{name}.sqlite")
+
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
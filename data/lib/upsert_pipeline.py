@@ -0,0 +1,209 @@
+"""
+Pipelined, adaptively sized upserts
+
+The supabase client is synchronous, so upserts run in a small thread pool and
+up to N requests stay in flight while the next batches are sliced. Batch size
+follows the observed round-trip time (grow while responses are fast, shrink
+when they slow down) and is capped by estimated payload size. Batches are
+DataFrame slices serialized straight to JSON bytes, so no per-row dicts are
+built.
+
+Batches go out whole. When Postgres rejects one for a row-level reason, it
+is split in halves until the offending rows are isolated, and those rows
+go to a dead-letter file instead of failing the import.
+"""
+
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+import polars as pl
+from postgrest.exceptions import APIError
+
+from data.lib.local_store import LOCAL_STATE_DIR
+
+DEFAULT_MAX_IN_FLIGHT = 4
+MIN_BATCH_SIZE = 50
+MAX_BATCH_SIZE = 5000
+TARGET_BATCH_SECONDS = 1.0          # Round-trip the sizer steers towards
+MAX_PAYLOAD_BYTES = 4 * 1024 * 1024  # Stay well under the API gateway body limit
+
+# Sends rows [offset, offset + size) and returns how many it sent
+SendBatch = Callable[[int, int], int]
+
+# SQLSTATE classes caused by the rows themselves: cardinality (21000: the
+# same key twice in one upsert), data exceptions (22xxx), constraints (23xxx)
+ROW_ERROR_CLASSES = ('21', '22', '23')
+
+DEAD_LETTER_DIR = os.path.join(LOCAL_STATE_DIR, "dead_letter")
+_dead_letter_lock = threading.Lock()
+
+def estimate_row_bytes(records: Sequence[Any], sample_size: int = 50) -> int:
+    """Approximate JSON bytes per row from a sample of the records (list or DataFrame)"""
+    sample = records[:sample_size]
+    if not len(sample):
+        return 1
+    if isinstance(sample, pl.DataFrame):
+        return max(1, len(sample.write_json()) // sample.height)
+    return max(1, len(json.dumps(list(sample), default=str)) // len(sample))
+
+class AdaptiveBatchSizer:
+    """Batch size steered by upsert latency, capped by payload size"""
+    
+    def __init__(
+        self,
+        initial_size: int,
+        row_bytes: int = 1,
+        min_size: int = MIN_BATCH_SIZE,
+        max_size: int = MAX_BATCH_SIZE,
+        target_seconds: float = TARGET_BATCH_SECONDS,
+        max_payload_bytes: int = MAX_PAYLOAD_BYTES
+    ):
+        self.max_size = max(1, min(max_size, max_payload_bytes // max(1, row_bytes)))
+        self.min_size = min(min_size, self.max_size)
+        self.target_seconds = target_seconds
+        self.size = self._clamp(initial_size)
+    
+    def _clamp(self, size: int) -> int:
+        return max(self.min_size, min(self.max_size, size))
+    
+    def record(self, rows: int, seconds: float) -> None:
+        """Rescale from a finished batch, at most 2x up or down per step"""
+        if rows <= 0:
+            return
+        scale = self.target_seconds / max(seconds, 1e-3)
+        self.size = self._clamp(int(rows * min(2.0, max(0.5, scale))))
+
+async def run_pipelined_upserts(
+    total_rows: int,
+    send: SendBatch,
+    batch_size: int,
+    row_bytes: int = 1,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT
+) -> int:
+    """
+    Run send() over [0, total_rows) in adaptively sized batches with up to
+    max_in_flight batches running at once. Returns rows sent; the first
+    failing batch raises once the batches already in flight have finished.
+    """
+    sizer = AdaptiveBatchSizer(batch_size, row_bytes)
+    loop = asyncio.get_running_loop()
+    
+    def timed_send(offset: int, size: int):
+        started = time.perf_counter()
+        sent = send(offset, size)
+        return size, sent, time.perf_counter() - started
+    
+    sent_rows = 0
+    offset = 0
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="upsert") as executor:
+        try:
+            while offset < total_rows or in_flight:
+                # Keep the pipeline full
+                while offset < total_rows and len(in_flight) < max_in_flight:
+                    size = min(sizer.size, total_rows - offset)
+                    in_flight.add(loop.run_in_executor(executor, timed_send, offset, size))
+                    offset += size
+                
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    size, sent, seconds = future.result()
+                    sizer.record(size, seconds)
+                    sent_rows += sent
+        finally:
+            # Let running batches finish before the error propagates
+            if in_flight:
+                await asyncio.wait(in_flight)
+    
+    return sent_rows
+
+def upsert_json(session: httpx.Client, table_name: str, body: bytes, ignore_duplicates: bool = False) -> None:
+    """POST a JSON array of rows straight to PostgREST as an upsert (or insert-if-absent)"""
+    resolution = 'ignore-duplicates' if ignore_duplicates else 'merge-duplicates'
+    response = session.post(
+        table_name,
+        content=body,
+        headers={
+            'Content-Type': 'application/json',
+            'Prefer': f'resolution={resolution},return=minimal',
+        }
+    )
+    if not response.is_success:
+        try:
+            error = response.json()
+        except ValueError:
+            error = {'message': response.text, 'code': str(response.status_code)}
+        raise APIError(error)
+
+# =============================================================================
+# ERROR ISOLATION
+# =============================================================================
+
+def error_code(error: Exception) -> Optional[str]:
+    """SQLSTATE/PostgREST code of an upsert error, if there is one"""
+    code = getattr(error, 'code', None)
+    if code:
+        return str(code)
+    match = re.search(r"'code': '(\w+)'", str(error))
+    return match.group(1) if match else None
+
+def is_row_error(error: Exception) -> bool:
+    """Whether the error is caused by the rows themselves (vs. the request or permissions)"""
+    code = error_code(error)
+    return bool(code) and code[:2] in ROW_ERROR_CLASSES
+
+def upsert_bisecting(
+    upsert: Callable[[Any], Any],
+    rows: Sequence[Any]
+) -> List[Tuple[Dict, Exception]]:
+    """
+    Upsert rows as one request; on a row-level error split the rows in half
+    and retry each half, down to single rows. Isolating k bad rows costs
+    O(k log n) requests. rows is a list of records or a DataFrame (sliced,
+    never materialized). Returns the rejected records with their errors;
+    any other error is raised.
+    """
+    if not len(rows):
+        return []
+    try:
+        upsert(rows)
+        return []
+    except Exception as e:
+        if not is_row_error(e):
+            raise
+        if len(rows) == 1:
+            record = rows.row(0, named=True) if isinstance(rows, pl.DataFrame) else rows[0]
+            return [(record, e)]
+    
+    middle = len(rows) // 2
+    return upsert_bisecting(upsert, rows[:middle]) + upsert_bisecting(upsert, rows[middle:])
+
+def write_dead_letters(table_name: str, rejected: List[Tuple[Dict, Exception]]) -> str:
+    """Append rejected rows with their error codes to dead_letter/<table>.jsonl"""
+    path = os.path.join(DEAD_LETTER_DIR, f"{table_name}.jsonl")
+    rejected_at = datetime.now(timezone.utc).isoformat()
+    lines = [
+        json.dumps({
+            'table': table_name,
+            'rejected_at': rejected_at,
+            'code': error_code(error),
+            'error': getattr(error, 'message', None) or str(error),
+            'record': record,
+        }, default=str)
+        for record, error in rejected
+    ]
+    
+    # Pipeline threads may reject rows at the same time
+    with _dead_letter_lock:
+        os.makedirs(DEAD_LETTER_DIR, exist_ok=True)
+        with open(path, 'a') as f:
+            f.write('\n'.join(lines) + '\n')
+    return path
@@ -0,0 +1,322 @@
+"""
+Claude Extraction Benchmark
+
+Measures embeds/sec of music extraction against a local mock of the Anthropic
+Messages API. The mock answers POST /v1/messages after a fixed latency plus a
+per-embed cost with a record_music_extractions tool call holding one
+extraction per numbered embed in the prompt (streamed as input_json_delta
+events when asked to stream), and can simulate overload: every Nth request gets a 529, and requests beyond a
+concurrency limit get a 429 with retry-after. It can also cut responses off
+at max_tokens beyond a number of embeds. Nothing leaves the machine.
+
+It also fakes the Message Batches endpoints (create, retrieve, results):
+a batch reports in_progress for a number of polls, then ended, and its
+results answer each request like POST /v1/messages would (every Nth as an
+overloaded error).
+
+Compares the old sequential loop (one batch at a time, 1s pause between
+them) with the concurrent executor at several in-flight levels.
+
+Usage:
+    python -m data.pipelines.cast_music_parser.benchmark
+    python -m data.pipelines.cast_music_parser.benchmark --embeds 400 --latency 1.5 --overload-every 10 --levels 1 4 8
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import anthropic
+
+from data.pipelines.cast_music_parser.lib.claude import (
+    ClaudeExecutor,
+    extract_music_concurrently,
+    extract_music_from_embeds,
+    get_model_info
+)
+from data.pipelines.cast_music_parser.lib.extraction_stream import ExtractionStreamParser
+
+MOCK_KEY = "mock-anthropic-key"
+MODEL = "claude-3-5-haiku-20241022"
+
+class MockAnthropicServer(ThreadingHTTPServer):
+    """Mock Messages API with simulated latency, overload and a concurrency limit"""
+    daemon_threads = True
+    
+    def __init__(self, latency: float, embed_cost: float = 0.0, overload_every: int = 0, max_concurrent: int = 0, retry_after: float = 0.2, max_output_embeds: int = 0, batch_polls: int = 1):
+        self.latency = latency
+        self.batch_polls = batch_polls
+        self.batches = {}
+        self.max_output_embeds = max_output_embeds
+        self.embed_cost = embed_cost
+        self.overload_every = overload_every
+        self.max_concurrent = max_concurrent
+        self.retry_after = retry_after
+        self.requests = 0
+        self.overloaded = 0
+        self.rate_limited = 0
+        self.active = 0
+        self.peak_active = 0
+        self.lock = threading.Lock()
+        super().__init__(("127.0.0.1", 0), MockAnthropicHandler)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+    
+    def mock_tool_input(self, request: dict) -> tuple:
+        """Tool input JSON answering every numbered embed in the prompt, and the stop reason"""
+        prompt = request["messages"][0]["content"]
+        embed_ids = re.findall(r"^(\d+)\. ", prompt, re.MULTILINE)
+        tool_input = json.dumps({"extractions": [
+            {"embed_id": embed_id, "music_type": "song", "title": f"Song {embed_id}", "artist": "Mock Artist", "genres": ["rock"], "confidence": 0.9}
+            for embed_id in embed_ids
+        ]})
+        if self.max_output_embeds and len(embed_ids) > self.max_output_embeds:
+            # Out of output tokens partway through the array
+            return tool_input[:len(tool_input) * self.max_output_embeds // len(embed_ids)], "max_tokens"
+        return tool_input, "end_turn"
+    
+    def mock_message(self, request: dict) -> dict:
+        """Complete (non-streamed) response with the tool call"""
+        tool_input, stop_reason = self.mock_tool_input(request)
+        return {
+            "id": f"msg_mock_{self.requests}",
+            "type": "message",
+            "role": "assistant",
+            "model": request["model"],
+            "content": [{
+                "type": "tool_use",
+                "id": f"toolu_mock_{self.requests}",
+                "name": request["tool_choice"]["name"],
+                # A cut-off tool call keeps the objects that closed
+                "input": json.loads(tool_input) if stop_reason == "end_turn" else {"extractions": ExtractionStreamParser().feed(tool_input)},
+            }],
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": {"input_tokens": len(request["messages"][0]["content"]) // 4, "output_tokens": len(tool_input) // 4},
+        }
+    
+    def mock_stream_events(self, request: dict, chunk_size: int = 32) -> list:
+        """Server-sent events of the same response, the tool input split into input_json_delta chunks"""
+        tool_input, stop_reason = self.mock_tool_input(request)
+        message = self.mock_message(request)
+        usage = message.pop("usage")
+        events = [
+            ("message_start", {"type": "message_start", "message": {**message, "content": [], "stop_reason": None, "usage": {**usage, "output_tokens": 1}}}),
+            ("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {**message["content"][0], "input": {}}}),
+        ]
+        events += [
+            ("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "input_json_delta", "partial_json": tool_input[i:i + chunk_size]}})
+            for i in range(0, len(tool_input), chunk_size)
+        ]
+        events += [
+            ("content_block_stop", {"type": "content_block_stop", "index": 0}),
+            ("message_delta", {"type": "message_delta", "delta": {"stop_reason": stop_reason, "stop_sequence": None}, "usage": {"output_tokens": usage["output_tokens"]}}),
+            ("message_stop", {"type": "message_stop"}),
+        ]
+        return events
+    
+    def create_batch(self, requests: list) -> dict:
+        """Answer a Message Batch's requests up front; they are served once it has been polled enough"""
+        results = []
+        with self.lock:
+            batch_id = f"msgbatch_mock_{len(self.batches) + 1}"
+            for request in requests:
+                self.requests += 1
+                if self.overload_every and self.requests % self.overload_every == 0:
+                    self.overloaded += 1
+                    result = {"type": "errored", "error": {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}}}
+                else:
+                    result = {"type": "succeeded", "message": self.mock_message(request["params"])}
+                results.append({"custom_id": request["custom_id"], "result": result})
+            self.batches[batch_id] = {"id": batch_id, "results": results, "polls": 0}
+        return self.batch_status(self.batches[batch_id])
+    
+    def batch_status(self, batch: dict) -> dict:
+        """MessageBatch object: in_progress until polled batch_polls times, then ended"""
+        ended = batch["polls"] >= self.batch_polls
+        counts = {"processing": 0, "succeeded": 0, "errored": 0, "canceled": 0, "expired": 0}
+        for item in batch["results"]:
+            counts[item["result"]["type"] if ended else "processing"] += 1
+        return {
+            "id": batch["id"],
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": counts,
+            "created_at": "2025-01-01T00:00:00Z",
+            "expires_at": "2025-01-02T00:00:00Z",
+            "ended_at": "2025-01-01T01:00:00Z" if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": f"{self.base_url}/v1/messages/batches/{batch['id']}/results" if ended else None,
+        }
+
+class MockAnthropicHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        if self.path == "/v1/messages/batches":
+            return self.send_json(200, server.create_batch(request["requests"]))
+        prompt = request["messages"][0]["content"]
+        
+        with server.lock:
+            server.requests += 1
+            overloaded = server.overload_every and server.requests % server.overload_every == 0
+            limited = server.max_concurrent and server.active >= server.max_concurrent
+            if overloaded:
+                server.overloaded += 1
+            elif limited:
+                server.rate_limited += 1
+            else:
+                server.active += 1
+                server.peak_active = max(server.peak_active, server.active)
+        
+        if overloaded:
+            time.sleep(server.latency / 10)
+            return self.send_error_json(529, "overloaded_error", "Overloaded")
+        if limited:
+            return self.send_error_json(429, "rate_limit_error", "Too many concurrent requests", {"retry-after": str(server.retry_after)})
+        
+        try:
+            embed_ids = re.findall(r"^(\d+)\. ", prompt, re.MULTILINE)
+            time.sleep(server.latency + len(embed_ids) * server.embed_cost)
+            if request.get("stream"):
+                self.send_events(server.mock_stream_events(request))
+            else:
+                self.send_json(200, server.mock_message(request))
+        finally:
+            with server.lock:
+                server.active -= 1
+    
+    def do_GET(self):
+        match = re.fullmatch(r"/v1/messages/batches/(\w+)(/results)?", self.path)
+        batch = match and self.server.batches.get(match.group(1))
+        if not batch:
+            return self.send_error_json(404, "not_found_error", "Batch not found")
+        if match.group(2):
+            body = "".join(json.dumps(item) + "\n" for item in batch["results"]).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/binary")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        with self.server.lock:
+            batch["polls"] += 1
+        self.send_json(200, self.server.batch_status(batch))
+    
+    def send_events(self, events: list):
+        body = "".join(f"event: {name}\ndata: {json.dumps(data)}\n\n" for name, data in events).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def send_error_json(self, status: int, error_type: str, message: str, headers: dict = None):
+        self.send_json(status, {"type": "error", "error": {"type": error_type, "message": message}}, headers)
+    
+    def send_json(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, *args):
+        pass
+
+def start_mock_anthropic(latency: float, **options) -> MockAnthropicServer:
+    """Start a mock Messages API server in a background thread"""
+    server = MockAnthropicServer(latency, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def mock_client(server: MockAnthropicServer) -> anthropic.AsyncAnthropic:
+    """Async client pointed at the mock (retries left to ClaudeExecutor, as in production)"""
+    return anthropic.AsyncAnthropic(api_key=MOCK_KEY, base_url=server.base_url, max_retries=0)
+
+def build_contexts(count: int) -> list:
+    """Synthetic embed contexts"""
+    return [
+        {
+            "cast_id": f"0x{i:040x}",
+            "embed_index": 0,
+            "cast_text": f"on repeat today #{i}",
+            "author_fid": str(1000 + i % 500),
+            "platform_name": "spotify",
+            "embed_metadata": f"title - Song {i} | artist - Mock Artist | release_date - 2024-01-01",
+        }
+        for i in range(count)
+    ]
+
+async def run_sequential(client, contexts: list, pause: float) -> float:
+    """Old behaviour: one batch at a time with a fixed pause after each"""
+    batch_size = get_model_info(MODEL)['recommended_batch_size']
+    executor = ClaudeExecutor(client, max_in_flight=1, tokens_per_minute=10_000_000)
+    started = time.perf_counter()
+    for i in range(0, len(contexts), batch_size):
+        await extract_music_from_embeds(contexts[i:i + batch_size], MODEL, executor)
+        if i + batch_size < len(contexts):
+            await asyncio.sleep(pause)
+    return len(contexts) / (time.perf_counter() - started)
+
+async def run_concurrent(client, contexts: list, max_in_flight: int, tokens_per_minute: int) -> tuple:
+    """Concurrent executor; returns (embeds/sec, retried requests)"""
+    executor = ClaudeExecutor(client, max_in_flight=max_in_flight, tokens_per_minute=tokens_per_minute, backoff_base=0.2)
+    started = time.perf_counter()
+    await extract_music_concurrently(contexts, MODEL, executor)
+    return len(contexts) / (time.perf_counter() - started), executor.retries
+
+async def main(args: argparse.Namespace) -> None:
+    server = start_mock_anthropic(
+        args.latency,
+        embed_cost=args.embed_cost,
+        overload_every=args.overload_every,
+        max_concurrent=args.max_concurrent
+    )
+    client = mock_client(server)
+    contexts = build_contexts(args.embeds)
+    
+    print(f"\n=== CLAUDE EXTRACTION BENCHMARK ===")
+    print(f"Embeds: {args.embeds} | mock latency: {args.latency * 1000:.0f}ms + {args.embed_cost * 1000:.0f}ms/embed | 529 every {args.overload_every or '-'} requests | 429 above {args.max_concurrent or '-'} concurrent\n")
+    print(f"{'Mode':<16} {'Embeds/sec':>11} {'Retries':>8} {'Speedup':>9}")
+    print(f"{'-'*16} {'-'*11} {'-'*8} {'-'*9}")
+    
+    # Per-batch progress output would drown the table
+    with contextlib.redirect_stdout(io.StringIO()):
+        baseline = await run_sequential(client, contexts, args.pause)
+    print(f"{'sequential':<16} {baseline:>11.1f} {'-':>8} {1.0:>8.1f}x")
+    
+    for level in args.levels:
+        with contextlib.redirect_stdout(io.StringIO()):
+            rate, retries = await run_concurrent(client, contexts, level, args.tokens_per_minute)
+        print(f"{f'concurrent x{level}':<16} {rate:>11.1f} {retries:>8} {rate / baseline:>8.1f}x")
+    
+    server.shutdown()
+    print("===================================\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark concurrent Claude extraction against a mock Messages API")
+    parser.add_argument("--embeds", type=int, default=200, help="Embeds extracted per mode")
+    parser.add_argument("--latency", type=float, default=1.0, help="Mock response delay in seconds")
+    parser.add_argument("--embed-cost", type=float, default=0.02, help="Mock per-embed generation cost in seconds")
+    parser.add_argument("--overload-every", type=int, default=0, help="Answer every Nth request with a 529 (0: never)")
+    parser.add_argument("--max-concurrent", type=int, default=0, help="Answer requests beyond this concurrency with a 429 (0: no limit)")
+    parser.add_argument("--pause", type=float, default=1.0, help="Sequential mode pause between batches in seconds")
+    parser.add_argument("--tokens-per-minute", type=int, default=1_000_000, help="Concurrent mode token budget")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 8], help="Requests in flight to test")
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -6,7 +6,7 @@ Combines cast text with URL metadata for improved accuracy.
 """
 
 import asyncio
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime, timezone, timedelta
 from prefect import flow
 
@@ -15,9 +15,27 @@ from data.pipelines.cast_music_parser.lib.db import (
     get_stats_task,
     get_embeds_in_range_task,
     assemble_embed_contexts_task,
-    store_extractions_task
+    store_extractions_task,
+    get_genre_pending_task,
+    store_genres_task
+)
+from data.pipelines.cast_music_parser.lib.claude import (
+    DEFAULT_MAX_IN_FLIGHT,
+    DEFAULT_TOKENS_PER_MINUTE,
+    ClaudeExecutor,
+    get_claude_client,
+    classify_genres,
+    extract_music_task
+)
+from data.pipelines.cast_music_parser.lib.cache import get_extraction_cache
+from data.pipelines.cast_music_parser.lib.rules import split_rule_extractions
+from data.pipelines.cast_music_parser.lib.batches import (
+    DEFAULT_POLL_SECONDS,
+    MAX_EMBEDS_PER_BATCH,
+    BatchSubmitter,
+    get_batch_job_store,
+    run_batch_jobs
 )
-from data.pipelines.cast_music_parser.lib.claude import extract_music_task
 
 @flow(name="Cast Music Parser")
 async def cast_music_parser_flow(
@@ -25,7 +43,12 @@ async def cast_music_parser_flow(
     end_time: str,
     model: str = "claude-3-5-haiku-20241022",
     batch_size: int = 100,
-    testing: bool = False
+    testing: bool = False,
+    resume_cursor: Optional[Dict[str, Any]] = None,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    tokens_per_minute: int = DEFAULT_TOKENS_PER_MINUTE,
+    use_cache: bool = True,
+    use_rules: bool = True
 ):
     """
     Main flow for extracting music information from Farcaster cast embeds
@@ -36,12 +59,18 @@ async def cast_music_parser_flow(
         model: Claude model to use for extraction
         batch_size: Number of embeds to process per batch
         testing: If True, only process one batch for testing
+        resume_cursor: next_cursor from a previous (interrupted) run to continue its scan
+        max_in_flight: Claude requests running at once
+        tokens_per_minute: Token budget shared by those requests (stay under the API rate limit)
+        use_cache: Reuse extractions of identical embed content from earlier runs instead of re-sending it
+        use_rules: Read music fields straight off structured platform metadata; only the rest goes to Claude
     """
     
     print("\n=== CAST MUSIC PARSER FLOW ===\n")
     print(f"📅 Date Range: {start_time} to {end_time}")
     print(f"🤖 Model: {model}")
     print(f"📦 Batch size: {batch_size}")
+    print(f"⚡ Claude requests: up to {max_in_flight} in flight, {tokens_per_minute:,} tokens/min")
     
     if testing:
         print(f"🧪 TESTING MODE: Processing only 1 batch of {batch_size} embeds")
@@ -53,9 +82,13 @@ async def cast_music_parser_flow(
         "music_extractions": 0,
         "batches_processed": 0,
         "success": False,
-        "date_range": f"{start_time} to {end_time}"
+        "date_range": f"{start_time} to {end_time}",
+        "next_cursor": resume_cursor
     }
     
+    cache = get_extraction_cache()
+    cache.reset_stats()
+    
     # Test database connection
     print("🔗 Testing database connection...")
     db_ok = await test_db_task()
@@ -79,23 +112,26 @@ async def cast_music_parser_flow(
     total_processed = 0
     total_extractions = 0
     batches_processed = 0
-    offset = 0
+    cursor = resume_cursor
     
     while True:
         print(f"\n--- BATCH {batches_processed + 1} ---")
-        print(f"🔍 Fetching next {batch_size} embeds (offset: {offset})...")
+        print(f"🔍 Fetching next {batch_size} embeds (after: {cursor or 'start'})...")
         
-        # Get next batch of embeds
-        batch_embeds = await get_embeds_in_range_task(
+        # Get next batch of embeds (keyset pagination - each page costs the same)
+        batch_embeds, cursor = await get_embeds_in_range_task(
             limit=batch_size,
-            offset=offset,
+            cursor=cursor,
             start_time=start_time,
             end_time=end_time
         )
         
         if not batch_embeds:
-            print("✅ No more embeds to process")
-            break
+            if cursor is None:
+                print("✅ No more embeds to process")
+                break
+            # Page had no embeds with cast data - keep scanning
+            continue
         
         print(f"📋 Processing {len(batch_embeds)} embeds")
         
@@ -105,14 +141,22 @@ async def cast_music_parser_flow(
         
         if not embed_contexts:
             print("⚠️ No valid contexts assembled for this batch")
-            offset += len(batch_embeds)
+            if cursor is None:
+                break
             continue
         
         print(f"📝 Successfully assembled {len(embed_contexts)} contexts")
         
         # Process this batch with AI
         print(f"🎵 Processing with AI...")
-        batch_extractions = await extract_music_task(embed_contexts, model)
+        batch_extractions = await extract_music_task(
+            embed_contexts,
+            model,
+            max_in_flight=max_in_flight,
+            tokens_per_minute=tokens_per_minute,
+            use_cache=use_cache,
+            use_rules=use_rules
+        )
         
         if batch_extractions:
             print(f"✅ AI extracted {len(batch_extractions)} music items")
@@ -136,16 +180,13 @@ async def cast_music_parser_flow(
         
         print(f"Batch summary: {batch_successful} extractions from {len(batch_embeds)} embeds")
         
-        # Move to next batch
-        offset += len(batch_embeds)
-        
         # In testing mode, stop after first batch
         if testing:
             print("🧪 Testing mode - stopping after first batch")
             break
         
-        # Stop if we got fewer embeds than requested (end of data)
-        if len(batch_embeds) < batch_size:
+        # No cursor means the last page was short (end of data)
+        if cursor is None:
             print("✅ Reached end of data")
             break
     
@@ -158,7 +199,9 @@ async def cast_music_parser_flow(
         "processed_embeds": total_processed,
         "music_extractions": total_extractions,
         "batches_processed": batches_processed,
-        "success": True
+        "success": True,
+        "next_cursor": cursor,  # None once the range has been fully scanned
+        "cache": cache.summary()
     })
     
     print(f"\n=== PIPELINE COMPLETE ===")
@@ -166,12 +209,167 @@ async def cast_music_parser_flow(
     print(f"Embeds processed: {total_processed}")
     print(f"Music extractions: {total_extractions}")
     print(f"Extraction rate: {extraction_rate:.1f}%")
+    if use_cache:
+        cache_stats = cache.summary()
+        print(f"Extraction cache hit rate: {cache_stats['hit_rate']:.1f}% "
+              f"({cache_stats['hits']} embeds reused, {cache_stats['misses']} sent to Claude)")
     print(f"Total embeds in system: {final_stats['total_embeds']:,}")
     print(f"Total music extractions overall: {final_stats['music_extractions']:,}")
     print("=============================\n")
     
     return results
 
+@flow(name="Cast Music Parser - Batch Backfill")
+async def cast_music_batch_flow(
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    model: str = "claude-3-5-haiku-20241022",
+    batch_size: int = 1000,
+    batch_ids: Optional[List[str]] = None,
+    resume: bool = False,
+    poll_seconds: float = DEFAULT_POLL_SECONDS,
+    max_embeds_per_batch: int = MAX_EMBEDS_PER_BATCH,
+    use_rules: bool = True
+):
+    """
+    Offline bulk extraction through the Message Batches API (half price, results within 24h)
+    
+    Scans the date range, stores rule and cache hits right away and submits
+    everything else as Message Batches, then polls them and stores their
+    results. An interrupted run is picked up with batch_ids (or resume=True
+    for every batch not yet ingested) - nothing is scanned or submitted again.
+    
+    Args:
+        start_time: Start time filter (YYYY-MM-DD HH:MM:SS)
+        end_time: End time filter (YYYY-MM-DD HH:MM:SS)
+        model: Claude model to use for extraction
+        batch_size: Number of embeds fetched per page of the scan
+        batch_ids: Message Batch ids of an earlier run to poll and ingest instead of scanning
+        resume: Poll and ingest every submitted batch not yet ingested instead of scanning
+        poll_seconds: Delay between batch status checks
+        max_embeds_per_batch: Distinct pieces of content per Message Batch
+        use_rules: Read music fields straight off structured platform metadata; only the rest goes to Claude
+    """
+    
+    print("\n=== CAST MUSIC PARSER BATCH BACKFILL ===\n")
+    print(f"🤖 Model: {model}")
+    
+    results = {
+        "processed_embeds": 0,
+        "immediate_extractions": 0,
+        "batch_ids": [],
+        "batches": {},
+        "success": False
+    }
+    
+    cache = get_extraction_cache()
+    cache.reset_stats()
+    store = get_batch_job_store()
+    
+    db_ok = await test_db_task()
+    if not db_ok:
+        print("❌ Database connection failed")
+        return results
+    
+    claude_client = get_claude_client()
+    
+    if batch_ids or resume:
+        batch_ids = batch_ids or store.unfinished_jobs()
+        print(f"🔁 Resuming {len(batch_ids)} batches: {', '.join(batch_ids) or '-'}")
+    else:
+        print(f"📅 Date Range: {start_time} to {end_time}")
+        submitter = BatchSubmitter(claude_client, model, store, cache, max_embeds=max_embeds_per_batch)
+        cursor = None
+        
+        while True:
+            page_embeds, cursor = await get_embeds_in_range_task(
+                limit=batch_size,
+                cursor=cursor,
+                start_time=start_time,
+                end_time=end_time
+            )
+            embed_contexts = await assemble_embed_contexts_task(page_embeds) if page_embeds else []
+            
+            if embed_contexts:
+                immediate = []
+                if use_rules:
+                    immediate, embed_contexts = split_rule_extractions(embed_contexts)
+                immediate += await submitter.add(embed_contexts)
+                
+                if immediate:
+                    success = await store_extractions_task(immediate)
+                    if not success:
+                        print("❌ Failed to store extractions")
+                        return results
+                
+                results["processed_embeds"] += len(page_embeds)
+                results["immediate_extractions"] += len(immediate)
+                print(f"📋 Scanned {results['processed_embeds']} embeds, stored {results['immediate_extractions']} from rules/cache")
+            
+            if cursor is None:
+                break
+        
+        await submitter.flush()
+        batch_ids = submitter.batch_ids
+        cache_stats = cache.summary()
+        print(f"💾 Extraction cache hit rate: {cache_stats['hit_rate']:.1f}% "
+              f"({cache_stats['hits']} embeds reused, {cache_stats['misses']} queued for batches)")
+        print(f"📨 Submitted {len(batch_ids)} batches: {', '.join(batch_ids) or '-'} (resume with batch_ids if interrupted)")
+    
+    results["batch_ids"] = batch_ids
+    results["batches"] = await run_batch_jobs(claude_client, batch_ids, store, cache, store_extractions_task, poll_seconds)
+    
+    # Rule extractions were stored without genres - fill them in now
+    results["genres"] = await backfill_rule_genres_flow(model=model)
+    results["success"] = True
+    
+    print(f"\n=== BATCH BACKFILL COMPLETE ===")
+    print(f"Embeds scanned: {results['processed_embeds']}")
+    print(f"Extractions stored from rules/cache: {results['immediate_extractions']}")
+    print(f"Extractions stored from batches: {results['batches'].get('stored', 0)}")
+    print(f"Rule extractions given genres: {results['genres']['classified']}")
+    print("===============================\n")
+    
+    return results
+
+@flow(name="Cast Music Parser - Rule Genre Backfill")
+async def backfill_rule_genres_flow(
+    model: str = "claude-3-5-haiku-20241022",
+    batch_size: int = 500,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    tokens_per_minute: int = DEFAULT_TOKENS_PER_MINUTE
+):
+    """
+    Fill in the genres of rule-extracted rows stored as RULES_GENRES_PENDING
+    (rule extractions whose genre pass failed, or stored by the batch backfill)
+    with genre-only Claude requests carrying just title and artist.
+    
+    Args:
+        model: Claude model to use for the genre pass
+        batch_size: Number of pending rows fetched per page
+        max_in_flight: Claude requests running at once
+        tokens_per_minute: Token budget shared by those requests
+    """
+    
+    print("\n=== RULE GENRE BACKFILL ===\n")
+    
+    results = {"pending": 0, "classified": 0}
+    executor = ClaudeExecutor(max_in_flight=max_in_flight, tokens_per_minute=tokens_per_minute)
+    cursor = None
+    
+    while True:
+        pending, cursor = await get_genre_pending_task(limit=batch_size, cursor=cursor)
+        if pending:
+            classified = await classify_genres(pending, model, executor)
+            results["pending"] += len(pending)
+            results["classified"] += await store_genres_task(classified)
+            print(f"🏷️ Gave genres to {results['classified']}/{results['pending']} pending rule extractions")
+        
+        if cursor is None:
+            break
+    
+    return results
+
 @flow(name="Cast Music Parser - Stats Only")
 async def show_stats_flow():
     """Flow that only shows current processing statistics"""
@@ -199,10 +397,10 @@ async def show_stats_flow():
 
 if __name__ == "__main__":
     print("🎵 Cast Music Parser Flow")
-
+    
     today = datetime.now(timezone.utc)
     tomorrow = today + timedelta(days=1)
-
+    
     # Configuration
     testing_mode = False  # Set to True for one batch only
     batch_size = 100  # Standard batch size
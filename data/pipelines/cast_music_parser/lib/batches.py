@@ -0,0 +1,383 @@
+"""
+Offline bulk extraction through the Message Batches API
+
+For backfills, where nobody waits on the answer: uncached embed contexts are
+packed into requests the same way as the online path, submitted as Message
+Batches (half the price, no rate limit pressure, results within 24 hours),
+polled until they end, and their results parsed into the extraction cache
+and stored in music_library.
+
+Every submitted batch is recorded in a local job store with the contexts
+behind each request and every context waiting on it (duplicates of the same
+content included), so an interrupted run resumes from its batch ids.
+Requests that errored or expired are resubmitted as-is. Responses cut off at
+max_tokens keep the extractions that closed and resubmit only the embeds left
+unanswered (in halves if none were answered), as the online path does. A
+batch is marked ingested only once its follow-up batch is recorded.
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+import anthropic
+
+from data.lib.local_store import open_local_db
+from data.pipelines.cast_music_parser.lib.cache import ExtractionCache, content_key, restamp
+from data.pipelines.cast_music_parser.lib.claude import (
+    PROMPT_VERSION,
+    RETRYABLE_STATUS_CODES,
+    build_extraction_prompt,
+    build_extraction_records,
+    cache_extractions,
+    extraction_request_params,
+    message_extractions,
+    pack_batches,
+    split_answered
+)
+
+MAX_EMBEDS_PER_BATCH = 50_000  # ~1,250 requests: far under the API's 100k requests / 256 MB per batch
+DEFAULT_POLL_SECONDS = 60
+MAX_RESUBMISSIONS = 2           # Follow-up batches for errored, expired or truncated requests
+STORE_CHUNK = 1000              # Extractions per music_library write
+
+# Stores extraction records in music_library; returns whether it succeeded
+SaveExtractions = Callable[[List[Dict]], Awaitable[bool]]
+
+class BatchJobStore:
+    """SQLite-backed record of submitted Message Batches and the contexts behind them"""
+    
+    def __init__(self, name: str = "music_batch_jobs"):
+        self._conn = open_local_db(name)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS batch_jobs (
+                batch_id TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                request_count INTEGER NOT NULL,
+                parent_batch_id TEXT,
+                submitted_at REAL NOT NULL,
+                ingested_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS batch_requests (
+                batch_id TEXT NOT NULL,
+                custom_id TEXT NOT NULL,
+                contexts TEXT NOT NULL,
+                PRIMARY KEY (batch_id, custom_id)
+            );
+            CREATE TABLE IF NOT EXISTS batch_waiting (
+                batch_id TEXT NOT NULL,
+                content_key TEXT NOT NULL,
+                context TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_batch_waiting_batch ON batch_waiting (batch_id);
+        """)
+        self._conn.commit()
+    
+    def record_job(
+        self,
+        batch_id: str,
+        model: str,
+        requests: Dict[str, List[Dict]],
+        waiting: List[Tuple[str, Dict]],
+        parent_batch_id: Optional[str] = None
+    ) -> None:
+        """Remember a submitted batch: contexts per custom_id, plus every context waiting on it"""
+        self._conn.execute(
+            "INSERT INTO batch_jobs (batch_id, model, prompt_version, request_count, parent_batch_id, submitted_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (batch_id, model, PROMPT_VERSION, len(requests), parent_batch_id, time.time())
+        )
+        self._conn.executemany(
+            "INSERT INTO batch_requests (batch_id, custom_id, contexts) VALUES (?, ?, ?)",
+            ((batch_id, custom_id, json.dumps(contexts, ensure_ascii=False, default=str)) for custom_id, contexts in requests.items())
+        )
+        self._conn.commit()
+        self.add_waiting(batch_id, waiting)
+    
+    def add_waiting(self, batch_id: str, waiting: List[Tuple[str, Dict]]) -> None:
+        """Contexts whose content is extracted by this batch"""
+        if not waiting:
+            return
+        self._conn.executemany(
+            "INSERT INTO batch_waiting (batch_id, content_key, context) VALUES (?, ?, ?)",
+            ((batch_id, key, json.dumps(context, ensure_ascii=False, default=str)) for key, context in waiting)
+        )
+        self._conn.commit()
+    
+    def get_job(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute("SELECT * FROM batch_jobs WHERE batch_id = ?", (batch_id,)).fetchone()
+        return dict(row) if row else None
+    
+    def request_contexts(self, batch_id: str) -> Dict[str, List[Dict]]:
+        """custom_id -> contexts of a batch's requests"""
+        rows = self._conn.execute("SELECT custom_id, contexts FROM batch_requests WHERE batch_id = ?", (batch_id,))
+        return {row['custom_id']: json.loads(row['contexts']) for row in rows}
+    
+    def iter_waiting(self, batch_id: str, chunk_size: int = STORE_CHUNK) -> Iterator[List[Tuple[str, Dict]]]:
+        """(content key, context) pairs waiting on a batch, in chunks"""
+        cursor = self._conn.execute("SELECT content_key, context FROM batch_waiting WHERE batch_id = ? ORDER BY rowid", (batch_id,))
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield [(row['content_key'], json.loads(row['context'])) for row in rows]
+    
+    def mark_ingested(self, batch_id: str) -> None:
+        self._conn.execute("UPDATE batch_jobs SET ingested_at = ? WHERE batch_id = ?", (time.time(), batch_id))
+        self._conn.commit()
+    
+    def follow_up_of(self, batch_id: str) -> Optional[str]:
+        """Batch already submitted for a batch's failed requests, if any"""
+        row = self._conn.execute("SELECT batch_id FROM batch_jobs WHERE parent_batch_id = ?", (batch_id,)).fetchone()
+        return row['batch_id'] if row else None
+    
+    def unfinished_jobs(self) -> List[str]:
+        """Batch ids submitted but not yet ingested, oldest first"""
+        rows = self._conn.execute("SELECT batch_id FROM batch_jobs WHERE ingested_at IS NULL ORDER BY submitted_at")
+        return [row['batch_id'] for row in rows]
+
+_store: Optional[BatchJobStore] = None
+
+def get_batch_job_store() -> BatchJobStore:
+    """Get the process-wide batch job store"""
+    global _store
+    if _store is None:
+        _store = BatchJobStore()
+    return _store
+
+# =============================================================================
+# SUBMISSION
+# =============================================================================
+
+async def submit_requests(
+    client: anthropic.AsyncAnthropic,
+    requests: List[List[Dict]],
+    model: str,
+    store: BatchJobStore,
+    waiting: List[Tuple[str, Dict]],
+    parent_batch_id: Optional[str] = None
+) -> str:
+    """Submit packed requests as one Message Batch and record it; returns the batch id"""
+    by_custom_id = {f"req-{i}": contexts for i, contexts in enumerate(requests)}
+    batch = await client.messages.batches.create(requests=[
+        {"custom_id": custom_id, "params": extraction_request_params(build_extraction_prompt(contexts), model)}
+        for custom_id, contexts in by_custom_id.items()
+    ])
+    store.record_job(batch.id, model, by_custom_id, waiting, parent_batch_id)
+    print(f"📨 Submitted batch {batch.id}: {len(requests)} requests for {len(waiting)} embeds")
+    return batch.id
+
+class BatchSubmitter:
+    """
+    Collects uncached contexts across scanned pages and submits them as
+    Message Batches of up to max_embeds distinct pieces of content
+    """
+    
+    def __init__(
+        self,
+        client: anthropic.AsyncAnthropic,
+        model: str,
+        store: BatchJobStore,
+        cache: ExtractionCache,
+        max_embeds: int = MAX_EMBEDS_PER_BATCH
+    ):
+        self.client = client
+        self.model = model
+        self.store = store
+        self.cache = cache
+        self.max_embeds = max_embeds
+        self.batch_ids: List[str] = []
+        self._submitted: Dict[str, str] = {}     # content key -> batch extracting it
+        self._representatives: Dict[str, Dict] = {}
+        self._waiting: List[Tuple[str, Dict]] = []
+    
+    async def add(self, embed_contexts: List[Dict]) -> List[Dict]:
+        """Queue contexts for extraction; returns the cached ones as extraction records"""
+        keys = [content_key(context, self.model, PROMPT_VERSION) for context in embed_contexts]
+        known = self.cache.lookup(list(dict.fromkeys(keys)))
+        
+        cached, late = [], {}
+        for key, context in zip(keys, embed_contexts):
+            if key in known:
+                if known[key]:
+                    cached.append(restamp(known[key], context))
+            elif key in self._submitted:
+                # Content already on its way in an earlier batch of this run
+                late.setdefault(self._submitted[key], []).append((key, context))
+            else:
+                self._representatives.setdefault(key, context)
+                self._waiting.append((key, context))
+        
+        for batch_id, waiting in late.items():
+            self.store.add_waiting(batch_id, waiting)
+        hits = sum(key in known for key in keys)
+        self.cache.record(hits=hits, misses=len(embed_contexts) - hits)
+        
+        if len(self._representatives) >= self.max_embeds:
+            await self.flush()
+        return cached
+    
+    async def flush(self) -> None:
+        """Submit whatever is queued"""
+        if not self._representatives:
+            return
+        requests = pack_batches(list(self._representatives.values()))
+        batch_id = await submit_requests(self.client, requests, self.model, self.store, self._waiting)
+        self._submitted.update(dict.fromkeys(self._representatives, batch_id))
+        self.batch_ids.append(batch_id)
+        self._representatives, self._waiting = {}, []
+
+# =============================================================================
+# POLLING AND INGESTION
+# =============================================================================
+
+async def wait_for_batch(client: anthropic.AsyncAnthropic, batch_id: str, poll_seconds: float = DEFAULT_POLL_SECONDS):
+    """Poll a batch until it has ended; connection errors and overload just mean polling again"""
+    while True:
+        try:
+            batch = await client.messages.batches.retrieve(batch_id)
+        except anthropic.APIConnectionError as e:
+            print(f"⚠️ Polling {batch_id} failed ({e}) - retrying")
+        except anthropic.APIStatusError as e:
+            if e.status_code not in RETRYABLE_STATUS_CODES and e.status_code < 500:
+                raise
+            print(f"⚠️ Polling {batch_id} failed ({e.status_code}) - retrying")
+        else:
+            counts = batch.request_counts
+            if batch.processing_status == "ended":
+                print(f"🏁 Batch {batch_id} ended: {counts.succeeded} succeeded, {counts.errored} errored, {counts.expired} expired, {counts.canceled} canceled")
+                return batch
+            print(f"⏳ Batch {batch_id} {batch.processing_status}: {counts.processing} processing, {counts.succeeded} succeeded")
+        await asyncio.sleep(poll_seconds)
+
+async def store_waiting(
+    batch_id: str,
+    store: BatchJobStore,
+    cache: ExtractionCache,
+    save: SaveExtractions
+) -> int:
+    """Store extractions for every context waiting on a batch, from the cache; returns rows stored"""
+    stored = 0
+    for chunk in store.iter_waiting(batch_id):
+        known = cache.lookup(list({key for key, _ in chunk}))
+        # Content still missing from the cache is waiting on a follow-up batch
+        extractions = [restamp(known[key], context) for key, context in chunk if known.get(key)]
+        if not extractions:
+            continue
+        if not await save(extractions):
+            raise RuntimeError(f"Failed to store extractions of batch {batch_id} - resume with this batch id")
+        stored += len(extractions)
+    return stored
+
+async def ingest_batch(
+    client: anthropic.AsyncAnthropic,
+    batch_id: str,
+    store: BatchJobStore,
+    cache: ExtractionCache,
+    save: SaveExtractions
+) -> Tuple[Dict[str, int], List[List[Dict]]]:
+    """
+    Stream an ended batch's results into the cache and store them for every
+    waiting context. Returns per-outcome counts and the requests to resubmit;
+    the caller marks the batch ingested once those are taken care of.
+    """
+    job = store.get_job(batch_id)
+    if job is None:
+        raise ValueError(f"Batch {batch_id} is not in the local job store")
+    if job['prompt_version'] != PROMPT_VERSION:
+        raise ValueError(f"Batch {batch_id} used prompt {job['prompt_version']}, current is {PROMPT_VERSION} - its results can't be cached")
+    
+    model = job['model']
+    requests = store.request_contexts(batch_id)
+    stats = {'succeeded': 0, 'errored': 0, 'expired': 0, 'canceled': 0, 'truncated': 0, 'unparsed': 0, 'stored': 0}
+    resubmit = []
+    
+    async for item in await client.messages.batches.results(batch_id):
+        contexts = requests.get(item.custom_id)
+        if contexts is None:
+            continue
+        result = item.result
+        if result.type != "succeeded":
+            stats[result.type] += 1
+            if result.type in ("errored", "expired"):
+                resubmit.append(contexts)
+            continue
+        
+        stats['succeeded'] += 1
+        message = result.message
+        extractions_json = message_extractions(message)
+        if message.stop_reason == "max_tokens":
+            # Keep the objects that closed; ask again for the rest (in halves if nothing closed -
+            # a single embed that doesn't fit is dropped)
+            stats['truncated'] += 1
+            answered, remaining = split_answered(contexts, extractions_json or [])
+            if answered:
+                cache_extractions(cache, answered, build_extraction_records(extractions_json, contexts, model), model)
+                if remaining:
+                    resubmit.append(remaining)
+            elif len(remaining) > 1:
+                middle = len(remaining) // 2
+                resubmit.extend([remaining[:middle], remaining[middle:]])
+            continue
+        
+        if extractions_json is None:
+            stats['unparsed'] += 1
+            continue
+        cache_extractions(cache, contexts, build_extraction_records(extractions_json, contexts, model), model)
+    
+    stats['stored'] = await store_waiting(batch_id, store, cache, save)
+    print(f"💾 Batch {batch_id}: stored {stats['stored']} extractions "
+          f"({stats['succeeded']} succeeded, {stats['errored']} errored, {stats['expired']} expired, {stats['truncated']} truncated)")
+    return stats, resubmit
+
+async def resubmit_requests(
+    client: anthropic.AsyncAnthropic,
+    batch_id: str,
+    requests: List[List[Dict]],
+    store: BatchJobStore
+) -> str:
+    """Submit a follow-up batch for requests of batch_id, moving their waiting contexts over"""
+    job = store.get_job(batch_id)
+    keys = {content_key(context, job['model'], PROMPT_VERSION) for contexts in requests for context in contexts}
+    waiting = [(key, context) for chunk in store.iter_waiting(batch_id) for key, context in chunk if key in keys]
+    return await submit_requests(client, requests, job['model'], store, waiting, parent_batch_id=batch_id)
+
+async def run_batch_jobs(
+    client: anthropic.AsyncAnthropic,
+    batch_ids: List[str],
+    store: BatchJobStore,
+    cache: ExtractionCache,
+    save: SaveExtractions,
+    poll_seconds: float = DEFAULT_POLL_SECONDS,
+    max_resubmissions: int = MAX_RESUBMISSIONS
+) -> Dict[str, int]:
+    """Wait for and ingest batches in order, following up on failed requests; returns summed counts"""
+    totals = {'batches': 0, 'resubmitted': 0}
+    queue = [(batch_id, 0) for batch_id in batch_ids]
+    while queue:
+        batch_id, round_num = queue.pop(0)
+        job = store.get_job(batch_id)
+        if job and job['ingested_at']:
+            print(f"⏭️ Batch {batch_id} was already ingested")
+            continue
+        
+        await wait_for_batch(client, batch_id, poll_seconds)
+        stats, resubmit = await ingest_batch(client, batch_id, store, cache, save)
+        totals['batches'] += 1
+        for name, count in stats.items():
+            totals[name] = totals.get(name, 0) + count
+        
+        follow_up = store.follow_up_of(batch_id)
+        if follow_up:
+            # Submitted by an interrupted run before this batch was marked ingested
+            queue.append((follow_up, round_num + 1))
+        elif resubmit and round_num < max_resubmissions:
+            follow_up = await resubmit_requests(client, batch_id, resubmit, store)
+            totals['resubmitted'] += len(resubmit)
+            queue.append((follow_up, round_num + 1))
+        elif resubmit:
+            print(f"⚠️ Giving up on {len(resubmit)} requests of batch {batch_id} - they stay uncached for the next run")
+        # Only now: a crash before this point re-ingests the batch instead of losing its follow-up
+        store.mark_ingested(batch_id)
+    return totals
@@ -0,0 +1,111 @@
+"""
+Persistent extraction cache for the music parser
+
+Stores Claude's music fields per embed content: the cleaned embed metadata
+(or the cast text when an embed has none), the model and the prompt version.
+The same track shared in thousands of casts is extracted once; cached fields
+are re-stamped with each cast's own join columns (cast_id, embed_index,
+author_fid, platform_name). Embeds Claude found no music in are cached too,
+so they aren't re-sent every run. Bumping PROMPT_VERSION invalidates it all.
+"""
+
+import hashlib
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from data.lib.local_store import open_local_db
+
+# Extraction fields that come from Claude; everything else is per-cast
+MUSIC_FIELDS = ['music_type', 'title', 'artist', 'album', 'genres', 'release_date', 'confidence_score', 'ai_model_version']
+LOOKUP_CHUNK = 900  # Stay under SQLite's bound-parameter limit
+
+def content_key(context: Dict, model: str, prompt_version: str) -> str:
+    """Cache key of an embed context: hash of what the extraction depends on"""
+    metadata = ' '.join((context.get('embed_metadata') or '').split())
+    if metadata:
+        content = ['metadata', metadata]
+    else:
+        content = ['cast_text', ' '.join((context.get('cast_text') or '').split())]
+    payload = json.dumps([model, prompt_version, *content], ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def restamp(music: Dict[str, Any], context: Dict) -> Dict[str, Any]:
+    """Extraction record for a context from cached music fields"""
+    return {
+        'cast_id': context['cast_id'],
+        'embed_index': context['embed_index'],
+        'author_fid': context.get('author_fid', ''),
+        **music,
+        'platform_name': context.get('platform_name'),
+    }
+
+class ExtractionCache:
+    """SQLite-backed content key -> music fields (None: no music) map"""
+
+    def __init__(self, name: str = "music_extraction_cache"):
+        self._conn = open_local_db(name)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS music_extractions (
+                content_key TEXT PRIMARY KEY,
+                music TEXT,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        """Zero the per-run counters"""
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+        }
+
+    def lookup(self, keys: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Cached entries for the keys that have one (value None: no music)"""
+        entries = {}
+        for i in range(0, len(keys), LOOKUP_CHUNK):
+            chunk = keys[i:i + LOOKUP_CHUNK]
+            rows = self._conn.execute(
+                f"SELECT content_key, music FROM music_extractions WHERE content_key IN ({','.join('?' * len(chunk))})",
+                chunk
+            ).fetchall()
+            for row in rows:
+                entries[row['content_key']] = json.loads(row['music']) if row['music'] else None
+        return entries
+
+    def store(self, entries: Dict[str, Optional[Dict[str, Any]]]) -> None:
+        """Save music fields (or None for no music) per content key"""
+        if not entries:
+            return
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO music_extractions (content_key, music, created_at) VALUES (?, ?, ?)",
+            (
+                (key, json.dumps(music, ensure_ascii=False) if music else None, now)
+                for key, music in entries.items()
+            )
+        )
+        self._conn.commit()
+
+    def record(self, hits: int, misses: int) -> None:
+        self.stats['hits'] += hits
+        self.stats['misses'] += misses
+
+    def summary(self) -> Dict[str, Any]:
+        """Counters plus hit rate for the current run"""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'hit_rate': (self.stats['hits'] / lookups * 100) if lookups else 0.0,
+        }
+
+_cache: Optional[ExtractionCache] = None
+
+def get_extraction_cache() -> ExtractionCache:
+    """Get the process-wide extraction cache"""
+    global _cache
+    if _cache is None:
+        _cache = ExtractionCache()
+    return _cache
@@ -5,23 +5,110 @@ Updated to process enhanced context (cast text + URL metadata)
 
 import json
 import asyncio
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import anthropic
 import os
+import random
+import time
 from dotenv import load_dotenv
 from prefect import task
 from datetime import datetime
-import re
+
+from data.pipelines.cast_music_parser.lib.cache import (
+    MUSIC_FIELDS,
+    ExtractionCache,
+    content_key,
+    get_extraction_cache,
+    restamp
+)
+from data.pipelines.cast_music_parser.lib.extraction_stream import ExtractionStreamParser
+from data.pipelines.cast_music_parser.lib.rules import RULES_GENRES_PENDING, RULES_VERSION, split_rule_extractions
 
 load_dotenv()
 
-# Initialize Claude client
-claude_client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+# Bump when the prompt or response parsing changes (invalidates the extraction cache)
+PROMPT_VERSION = "embed-v3"
+
+# Request concurrency and rate budget (override per run or via env)
+DEFAULT_MAX_IN_FLIGHT = int(os.getenv("CLAUDE_MAX_IN_FLIGHT", "4"))
+DEFAULT_TOKENS_PER_MINUTE = int(os.getenv("CLAUDE_TOKENS_PER_MINUTE", "80000"))
+MAX_OUTPUT_TOKENS = 4000
+OUTPUT_TOKENS_PER_EMBED = 60  # Typical extraction size, reserved up front
+CHARS_PER_TOKEN = 4           # Rough size estimate (UTF-8 bytes per token) before usage is known
+
+# Request packing: fill each request up to an input token target while the
+# expected JSON response still fits in MAX_OUTPUT_TOKENS
+TARGET_INPUT_TOKENS = 4000
+OUTPUT_HEADROOM = 1.5         # Long titles and artist lists run over the typical extraction size
+MAX_CAST_TEXT_CHARS = 400
+MAX_METADATA_CHARS = 600
+DROPPED_METADATA_PREFIXES = ('image - ',)  # URLs cost tokens and say nothing about the music
+
+# Backoff on rate limiting (429) and overload (529); mid-stream they arrive as error events
+RETRYABLE_STATUS_CODES = (429, 529)
+RETRYABLE_ERROR_TYPES = ('rate_limit_error', 'overloaded_error')
+MAX_ATTEMPTS = 6
+BACKOFF_BASE_SECONDS = 2.0
+MAX_BACKOFF_SECONDS = 60.0
+
+MUSIC_TYPES = ['song', 'album', 'playlist', 'artist']
+GENRES = [
+    'ambient', 'bluegrass', 'blues', 'christian rap', 'classic rock', 'classical', 
+    'country', 'disco', 'drum-and-bass', 'electronic', 'folk', 'funk', 'hip-hop', 
+    'house', 'indie', 'jazz', 'k-pop', 'lo-fi', 'metal', 'old school hip-hop', 
+    'pop', 'pop punk', 'punk', 'r&b', 'reggae', 'rock', 'roots', 'soul', 'synthwave'
+]
+
+# Structured output: Claude is made to answer through this tool, so the
+# response is schema-shaped JSON instead of free text to search for an array
+EXTRACTION_TOOL = {
+    "name": "record_music_extractions",
+    "description": "Record the music found in each numbered embed, one entry per embed in order",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "extractions": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "embed_id": {"type": "string"},
+                        "music_type": {"type": "string", "enum": MUSIC_TYPES},
+                        "title": {"type": "string"},
+                        "artist": {"type": "string"},
+                        "album": {"type": ["string", "null"]},
+                        "genres": {"type": "array", "items": {"type": "string", "enum": GENRES}, "maxItems": 3},
+                        "release_date": {"type": ["string", "null"]},
+                        "confidence": {"type": "number"}
+                    },
+                    "required": ["embed_id"]
+                }
+            }
+        },
+        "required": ["extractions"]
+    }
+}
+GENRE_BATCH_SIZE = 100  # Rule extractions per genre-only request (title and artist only)
+TOOL_USE_OVERHEAD_TOKENS = 313  # System prompt the API adds when a tool call is forced
+
+# Claude client shared by a run's requests (its httpx pool is bound to the event loop)
+_client: Optional[anthropic.AsyncAnthropic] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def get_claude_client() -> anthropic.AsyncAnthropic:
+    """Get the shared Claude client for the running event loop (retries are handled by ClaudeExecutor)"""
+    global _client, _client_loop
+    
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        # Old client belongs to another loop - let it be garbage collected
+        _client = anthropic.AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), max_retries=0)
+        _client_loop = loop
+    return _client
 
 # Test tracking globals
 current_test_run = None
 test_results = []
-current_cast_id_map = {}  # Maps prompt index to actual cast_id
 
 def start_test_run(model: str, prompt_version: str, batch_size: int, context_length: str = "full"):
     """Start tracking a new test run"""
@@ -55,7 +142,7 @@ def finish_test_run(all_extractions: list):
     
     if not current_test_run:
         return None
-        
+    
     # Calculate final metrics
     processing_time = (current_test_run["processing_end"] - current_test_run["processing_start"]).total_seconds() if current_test_run["processing_start"] and current_test_run["processing_end"] else 0
     avg_confidence = sum(e.get('confidence_score', 0) for e in all_extractions) / len(all_extractions) if all_extractions else 0
@@ -148,7 +235,7 @@ def print_test_comparison():
             model_name = "4.0-sonnet"
         else:
             model_name = model_str[:12]
-            
+        
         print(f"{result['test_start_time']:<8} {model_name:<12} {result['prompt_version']:<10} {result['casts_processed']:<6} {result['extracted_entries']:<9} {result['success_rate']:<8} {result['average_confidence']:<6} {result['total_duration']:<8} {result['estimated_cost']:<7} {result['cost_per_extraction']:<7} {result['api_calls']:<4} {result['extractions_per_second']:<6}")
     
     # Best results
@@ -179,9 +266,208 @@ def print_test_comparison():
             avg_cost = sum(float(r['estimated_cost'].rstrip('¢')) for r in current_config_results) / len(current_config_results)
             print(f"📊 Current config ({format_model_name(test_results[-1]['model'])} {test_results[-1]['prompt_version']}): {avg_success:.1f}% success, {avg_cost:.1f}¢ avg cost over {len(current_config_results)} runs")
 
+# =============================================================================
+# CONCURRENT EXECUTOR
+# =============================================================================
+
+class TokenBudget:
+    """Tokens-per-minute bucket shared by concurrent requests"""
+    
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    async def acquire(self, tokens: int) -> None:
+        """Wait until tokens fit in the budget, then spend them (callers are served in order)"""
+        tokens = min(tokens, self.capacity)  # An oversized request still goes out, alone
+        async with self._lock:
+            self._refill()
+            while self.available < tokens:
+                await asyncio.sleep((tokens - self.available) / self.rate)
+                self._refill()
+            self.available -= tokens
+    
+    def adjust(self, tokens: int) -> None:
+        """Charge (or refund, if negative) the difference between reserved and actual usage"""
+        self._refill()
+        self.available = min(self.capacity, self.available - tokens)
+
+def extraction_request_params(prompt: str, model: str) -> Dict[str, Any]:
+    """Messages API parameters of one extraction request (online or in a Message Batch)"""
+    return {
+        "model": model,
+        "max_tokens": MAX_OUTPUT_TOKENS,
+        "temperature": 0.1,
+        "tools": [EXTRACTION_TOOL],
+        "tool_choice": {"type": "tool", "name": EXTRACTION_TOOL["name"]},
+        "messages": [
+            {"role": "user", "content": prompt}
+        ]
+    }
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a text"""
+    return len(text.encode('utf-8')) // CHARS_PER_TOKEN + 1
+
+def estimate_request_tokens(prompt: str, embed_count: int) -> int:
+    """Tokens to reserve for a request before its usage is known"""
+    return estimate_tokens(prompt) + embed_count * OUTPUT_TOKENS_PER_EMBED
+
+def is_retryable(error: anthropic.APIStatusError) -> bool:
+    """Rate limiting or overload, as an HTTP status or an error event in a stream"""
+    if error.status_code in RETRYABLE_STATUS_CODES:
+        return True
+    body = error.body if isinstance(error.body, dict) else {}
+    return (body.get('error') or {}).get('type') in RETRYABLE_ERROR_TYPES
+
+def retry_after_seconds(error: anthropic.APIStatusError) -> Optional[float]:
+    """Server-requested wait from the retry-after(-ms) headers, if any"""
+    headers = error.response.headers
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except ValueError:
+        pass
+    return None
+
+class ClaudeExecutor:
+    """
+    Sends extraction requests with at most max_in_flight running at once and
+    within a tokens-per-minute budget. A 429/529 pauses every request (honoring
+    retry-after, else exponential backoff, both jittered), halves the in-flight
+    limit and retries the batch; the limit grows back by one after a run of
+    successes. A busy API slows the run down instead of failing it.
+    """
+    
+    def __init__(
+        self,
+        client: Optional[anthropic.AsyncAnthropic] = None,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        tokens_per_minute: int = DEFAULT_TOKENS_PER_MINUTE,
+        max_attempts: int = MAX_ATTEMPTS,
+        backoff_base: float = BACKOFF_BASE_SECONDS
+    ):
+        self.client = client or get_claude_client()
+        self.budget = TokenBudget(tokens_per_minute)
+        self.max_in_flight = max_in_flight
+        self.in_flight_limit = max_in_flight
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.retries = 0
+        self._active = 0
+        self._successes = 0
+        self._slot_freed = asyncio.Condition()
+        self._paused_until = 0.0
+    
+    async def _acquire_slot(self) -> None:
+        async with self._slot_freed:
+            await self._slot_freed.wait_for(lambda: self._active < self.in_flight_limit)
+            self._active += 1
+    
+    async def _release_slot(self, throttled: Optional[bool]) -> None:
+        """Free a slot and adapt the limit (throttled None: the request failed otherwise, no change)"""
+        if throttled:
+            self.in_flight_limit = max(1, self.in_flight_limit // 2)
+            self._successes = 0
+        elif throttled is False:
+            self._successes += 1
+            if self._successes >= self.in_flight_limit and self.in_flight_limit < self.max_in_flight:
+                self.in_flight_limit += 1
+                self._successes = 0
+        async with self._slot_freed:
+            self._active -= 1
+            self._slot_freed.notify_all()
+    
+    def _pause(self, error: anthropic.APIStatusError, attempt: int) -> float:
+        """Hold back all requests after a rate-limit/overload response"""
+        delay = retry_after_seconds(error)
+        if delay is None:
+            delay = min(MAX_BACKOFF_SECONDS, self.backoff_base * 2 ** attempt)
+        # Jitter so throttled requests don't all come back at the same moment
+        delay *= random.uniform(1.0, 1.5)
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+    
+    async def _wait_if_paused(self) -> None:
+        while (delay := self._paused_until - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+    
+    async def stream_extractions(self, prompt: str, model: str, embed_count: int) -> Dict[str, Any]:
+        """Send one extraction request and stream its answer, backing off and retrying on 429/529"""
+        reserved = estimate_request_tokens(prompt, embed_count)
+        await self.budget.acquire(reserved)
+        
+        for attempt in range(self.max_attempts):
+            await self._wait_if_paused()
+            await self._acquire_slot()
+            throttled = None
+            try:
+                response = await stream_extraction_response(self.client, extraction_request_params(prompt, model))
+                throttled = False
+            except anthropic.APIStatusError as api_error:
+                if not is_retryable(api_error):
+                    raise
+                throttled = True
+                if attempt + 1 == self.max_attempts:
+                    raise
+                delay = self._pause(api_error, attempt)
+                self.retries += 1
+                print(f"⏳ API returned {api_error.status_code} - backing off {delay:.1f}s (attempt {attempt + 1}/{self.max_attempts})")
+                continue
+            finally:
+                await self._release_slot(throttled)
+            
+            self.budget.adjust(response['input_tokens'] + response['output_tokens'] - reserved)
+            return response
+
+async def stream_extraction_response(client: anthropic.AsyncAnthropic, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Stream one request and feed its tool input to an ExtractionStreamParser as
+    it arrives. Returns the extraction objects (every one that closed, even if
+    the response was cut off), whether the JSON completed, stop reason and usage.
+    """
+    parser = ExtractionStreamParser()
+    response = {'extractions': [], 'complete': False, 'stop_reason': None, 'input_tokens': 0, 'output_tokens': 0}
+    
+    # Raw events: the SDK's stream helper would re-parse the whole accumulated JSON on every delta
+    stream = await client.messages.create(**params, stream=True)
+    async for event in stream:
+        if event.type == "content_block_delta" and event.delta.type == "input_json_delta":
+            response['extractions'].extend(parser.feed(event.delta.partial_json))
+        elif event.type == "message_start":
+            response['input_tokens'] = event.message.usage.input_tokens
+        elif event.type == "message_delta":
+            response['stop_reason'] = event.delta.stop_reason
+            response['output_tokens'] = event.usage.output_tokens
+    
+    response['complete'] = parser.complete
+    if parser.malformed:
+        print(f"⚠️ Skipped {parser.malformed} malformed extraction objects")
+    return response
+
+def message_extractions(message: anthropic.types.Message) -> Optional[List]:
+    """Extraction objects from a complete (non-streamed) response's tool call; None if it has none"""
+    for block in message.content:
+        if block.type == "tool_use" and block.name == EXTRACTION_TOOL["name"]:
+            extractions = block.input.get("extractions") if isinstance(block.input, dict) else None
+            return extractions if isinstance(extractions, list) else None
+    return None
+
 async def extract_music_from_embeds(
     embed_contexts: List[Dict], 
-    model: str = "claude-3-5-sonnet-20241022"
+    model: str = "claude-3-5-sonnet-20241022",
+    executor: Optional[ClaudeExecutor] = None,
+    cache: Optional[ExtractionCache] = None
 ) -> List[Dict]:
     """
     Extract music information from embeds using per-embed context
@@ -189,49 +475,44 @@ async def extract_music_from_embeds(
     Args:
         embed_contexts: List of embed contexts with cast text and embed metadata
         model: Claude model to use for extraction
-        
+        executor: Shared executor (concurrency, token budget, backoff); a fresh one if not given
+        cache: Extraction cache to record this batch's answers in
+    
     Returns:
         List of music extraction dictionaries
     """
     if not embed_contexts:
         return []
-        
+    
+    executor = executor or ClaudeExecutor()
+    
     try:
         print(f"Processing {len(embed_contexts)} embeds with {model}")
         
-        if current_test_run:
+        if current_test_run and not current_test_run["processing_start"]:
             current_test_run["processing_start"] = datetime.now()
         
         # Build the extraction prompt
         prompt = build_extraction_prompt(embed_contexts)
         
-        # Call Claude API
+        # Call Claude API (extraction objects are parsed as they stream in)
         try:
-            response = claude_client.messages.create(
-                model=model,
-                max_tokens=4000,
-                temperature=0.1,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            
-            response_text = response.content[0].text
-            
+            response = await executor.stream_extractions(prompt, model, len(embed_contexts))
         except Exception as api_error:
-            if "overloaded" in str(api_error).lower() or "529" in str(api_error):
-                print(f"🚨 API overloaded (529 error) - this is a system-wide issue")
-                print("💡 This requires stopping the entire flow and trying again later")
-                raise Exception("API_OVERLOAD") from api_error
-            else:
-                print(f"❌ API call failed: {str(api_error)}")
-                raise
+            print(f"❌ API call failed: {str(api_error)}")
+            raise
+        
+        if response['stop_reason'] == "max_tokens":
+            return await extract_music_after_truncation(embed_contexts, response['extractions'], model, executor, cache)
         
         if current_test_run:
             current_test_run["processing_end"] = datetime.now()
-            
-        # Parse the response
-        extractions = parse_claude_response(response_text, embed_contexts, model)
+        
+        extractions = build_extraction_records(response['extractions'], embed_contexts, model)
+        
+        # Only a complete JSON answer tells which embeds have no music
+        if cache is not None and response['complete']:
+            cache_extractions(cache, embed_contexts, extractions, model)
         
         # Log results for test tracking
         if current_test_run:
@@ -245,28 +526,72 @@ async def extract_music_from_embeds(
             current_test_run["processing_end"] = datetime.now()
         raise
 
+async def extract_music_after_truncation(
+    embed_contexts: List[Dict],
+    extractions_json: List,
+    model: str,
+    executor: ClaudeExecutor,
+    cache: Optional[ExtractionCache]
+) -> List[Dict]:
+    """
+    Keep the extractions that closed before a response hit max_tokens and ask
+    again only for the embeds left unanswered (in halves if none were answered)
+    """
+    answered, remaining = split_answered(embed_contexts, extractions_json)
+    
+    extractions = build_extraction_records(extractions_json, embed_contexts, model)
+    if cache is not None and answered:
+        cache_extractions(cache, answered, extractions, model)
+    
+    if answered:
+        print(f"✂️ Response hit max_tokens - kept {len(answered)} answered embeds, re-requesting {len(remaining)}")
+        extractions += await extract_music_from_embeds(remaining, model, executor, cache)
+    elif len(remaining) > 1:
+        middle = len(remaining) // 2
+        print(f"✂️ Response hit max_tokens - splitting {len(remaining)} embeds into two requests")
+        first, second = await asyncio.gather(
+            extract_music_from_embeds(remaining[:middle], model, executor, cache),
+            extract_music_from_embeds(remaining[middle:], model, executor, cache)
+        )
+        extractions += first + second
+    
+    # Back in the batch's embed order
+    position = {(context['cast_id'], context['embed_index']): i for i, context in enumerate(embed_contexts)}
+    return sorted(extractions, key=lambda extraction: position[(extraction['cast_id'], extraction['embed_index'])])
+
+def truncate_text(text: str, limit: int) -> str:
+    """Cut text to at most limit characters at a word boundary"""
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(' ', 1)[0] + '…'
+
+def context_block(i: int, context: Dict) -> Optional[str]:
+    """One prompt line for an embed: cast text → metadata, trimmed to what helps extraction"""
+    cast_text = truncate_text(' '.join((context.get('cast_text') or '').split()), MAX_CAST_TEXT_CHARS)
+    metadata_parts = [
+        part for part in ' '.join((context.get('embed_metadata') or '').split()).split(' | ')
+        if part and not part.startswith(DROPPED_METADATA_PREFIXES)
+    ]
+    embed_metadata = truncate_text(' | '.join(metadata_parts), MAX_METADATA_CHARS)
+    
+    if not cast_text and not embed_metadata:
+        return None
+    
+    # Build structured but concise context block
+    block = f"{i}."
+    if cast_text:
+        block += f" {cast_text}"
+    if embed_metadata:
+        block += f" → {embed_metadata}"  # Arrow to show embed metadata
+    return block
+
 def build_extraction_prompt(embed_contexts: List[Dict]) -> str:
     """Build the extraction prompt for per-embed processing"""
     
-    context_blocks = []
-    embed_id_map = {}  # Map index to actual (cast_id, embed_index)
-    
-    for i, context in enumerate(embed_contexts, 1):
-        cast_text = context.get('cast_text', '').strip()
-        embed_metadata = context.get('embed_metadata', '').strip()
-        
-        # Store mapping for later
-        embed_id_map[str(i)] = (context['cast_id'], context['embed_index'])
-        
-        # Build structured but concise context block
-        block = f"{i}."
-        if cast_text:
-            block += f" {cast_text}"
-        if embed_metadata:
-            block += f" → {embed_metadata}"  # Arrow to show embed metadata
-            
-        if cast_text or embed_metadata:
-            context_blocks.append(block)
+    context_blocks = [
+        block for block in (context_block(i, context) for i, context in enumerate(embed_contexts, 1))
+        if block
+    ]
     
     contexts_text = "\n".join(context_blocks)
     
@@ -290,139 +615,143 @@ Examples:
 "absolutely loving this classic → title - Ain't Wastin' Time No More | artist - Allman Brothers Band | album - Eat A Peach | release_date - 1972-02-12" → {{"embed_id":"8","music_type":"song","title":"Ain't Wastin' Time No More","artist":"Allman Brothers Band","album":"Eat A Peach","genres":["rock","classic rock"],"release_date":"1972-02-12","confidence":0.9}}
 "new lorde track hits different → title - Man Of The Year | artist - Lorde | album - Solar Power | release_date - 2025-06-27" → {{"embed_id":"9","music_type":"song","title":"Man Of The Year","artist":"Lorde","album":"Solar Power","genres":["pop","indie"],"release_date":"2025-06-27","confidence":0.9}}
 
-Return JSON array (ONE extraction per embed - if no music found, return empty object):
-[{{"embed_id":"1","music_type":"song","title":"Name","artist":"Artist","album":"Album","genres":["genre1","genre2"],"release_date":"YYYY-MM-DD","confidence":0.8}}]
+Record the extractions with the record_music_extractions tool: ONE entry per embed, in embed order. An embed without music gets only its embed_id, e.g. {{"embed_id":"3"}}."""
+    
+    return prompt
 
-Return [] if no music found."""
+PROMPT_OVERHEAD_TOKENS = (
+    estimate_tokens(build_extraction_prompt([]))
+    + estimate_tokens(json.dumps(EXTRACTION_TOOL))
+    + TOOL_USE_OVERHEAD_TOKENS
+)
 
-    # Store the mapping globally so parse function can access it
-    global current_cast_id_map
-    current_cast_id_map = embed_id_map
+def pack_batches(
+    embed_contexts: List[Dict],
+    target_input_tokens: int = TARGET_INPUT_TOKENS,
+    max_output_tokens: int = MAX_OUTPUT_TOKENS
+) -> List[List[Dict]]:
+    """
+    Greedily fill requests with contexts up to target_input_tokens of prompt,
+    with at most as many embeds as max_output_tokens can answer (with headroom)
+    """
+    max_embeds = max(1, int(max_output_tokens // (OUTPUT_TOKENS_PER_EMBED * OUTPUT_HEADROOM)))
+    context_budget = target_input_tokens - PROMPT_OVERHEAD_TOKENS
     
-    return prompt
+    batches, batch, batch_tokens = [], [], 0
+    for context in embed_contexts:
+        tokens = estimate_tokens(context_block(len(batch) + 1, context) or '')
+        if batch and (batch_tokens + tokens > context_budget or len(batch) >= max_embeds):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(context)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+def build_embed_id_map(embed_contexts: List[Dict]) -> Dict[str, Dict]:
+    """Map the prompt's embed_id (1-based position in the batch) to its context"""
+    return {str(i): context for i, context in enumerate(embed_contexts, 1)}
+
+def split_answered(embed_contexts: List[Dict], extractions_json: List) -> Tuple[List[Dict], List[Dict]]:
+    """Split a truncated response's contexts into (answered by a closed object, still unanswered)"""
+    embed_id_map = build_embed_id_map(embed_contexts)
+    answered_ids = {str(extraction.get('embed_id')) for extraction in extractions_json if isinstance(extraction, dict)}
+    answered = [context for embed_id, context in embed_id_map.items() if embed_id in answered_ids]
+    remaining = [context for embed_id, context in embed_id_map.items() if embed_id not in answered_ids]
+    return answered, remaining
+
+def find_extraction_json(response_text: str) -> Optional[List]:
+    """Extraction objects of the first JSON array in a text response; [] means no music, None no complete array"""
+    start = response_text.find('[')
+    if start == -1:
+        return None
+    parser = ExtractionStreamParser()
+    extractions_json = parser.feed(response_text[start:])
+    return extractions_json if parser.complete else None
 
 def parse_claude_response(response_text: str, contexts: List[Dict], model: str = "claude-3-5-sonnet-20241022") -> List[Dict]:
     """Parse Claude's response and format as extraction records for per-embed processing"""
-    global current_cast_id_map
-    
     try:
-        # Try multiple approaches to extract JSON from Claude's response
-        extractions_json = None
+        extractions_json = find_extraction_json(response_text)
+        if extractions_json is None:
+            return []
+        return build_extraction_records(extractions_json, contexts, model)
         
-        # Method 1: Look for JSON inside markdown code blocks
-        code_block_match = re.search(r'```json\s*(\[.*?\])\s*```', response_text, re.DOTALL | re.IGNORECASE)
-        if code_block_match:
-            try:
-                extractions_json = json.loads(code_block_match.group(1))
-                print("✅ Found JSON in markdown code block")
-            except json.JSONDecodeError:
-                pass
+    except Exception as e:
+        print(f"❌ Error parsing response: {e}")
+        print(f"Response preview: {response_text[:300]}...")
+        return []
+
+def parse_confidence(value: Any) -> float:
+    """Confidence as a float in [0, 1] (0.0 if missing or not a number)"""
+    try:
+        return min(1.0, max(0.0, float(value or 0.0)))
+    except (TypeError, ValueError):
+        return 0.0
+
+def build_extraction_records(extractions_json: List, contexts: List[Dict], model: str) -> List[Dict]:
+    """Format Claude's extraction objects as records, mapping embed_ids back to the batch's contexts"""
+    # Built from this batch's contexts, so concurrent batches never share a mapping
+    embed_id_map = build_embed_id_map(contexts)
+    
+    results = []
+    for extraction in extractions_json:
+        if not isinstance(extraction, dict):
+            continue
         
-        # Method 2: Look for the last/final JSON array in the response
-        if not extractions_json:
-            # Find all JSON arrays and take the last one (usually the final output)
-            json_matches = re.findall(r'\[(?:[^[\]]|(?:\[.*?\]))*\]', response_text, re.DOTALL)
-            for match in reversed(json_matches):  # Start from the end
-                try:
-                    parsed = json.loads(match)
-                    if isinstance(parsed, list):  # Make sure it's a list
-                        extractions_json = parsed
-                        print("✅ Found JSON array in response text")
-                        break
-                except json.JSONDecodeError:
-                    continue
+        embed_index = extraction.get('embed_id', '')
         
-        # Method 3: Original simple regex approach
-        if not extractions_json:
-            json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
-            if json_match:
-                try:
-                    extractions_json = json.loads(json_match.group())
-                    print("✅ Found JSON with simple regex")
-                except json.JSONDecodeError:
-                    pass
+        # Map index back to this embed's context
+        context = embed_id_map.get(str(embed_index))
+        if not context:
+            print(f"⚠️ Could not map embed index {embed_index} to actual key")
+            continue
         
-        if not extractions_json:
-            print("❌ No valid JSON array found in response")
-            print(f"Response preview: {response_text[:200]}...")
-            return []
+        cast_id, embed_idx = context['cast_id'], context['embed_index']
         
-        # Process the found JSON
-        results = []
-        for extraction in extractions_json:
-            if not isinstance(extraction, dict):
-                continue
-                
-            embed_index = extraction.get('embed_id', '')
-            
-            # Map index back to actual (cast_id, embed_index)
-            embed_key = current_cast_id_map.get(str(embed_index))
-            if not embed_key:
-                print(f"⚠️ Could not map embed index {embed_index} to actual key")
-                continue
-            
-            cast_id, embed_idx = embed_key
-            
-            # Find the context for this embed to get author_fid
-            context = next((c for c in contexts if c['cast_id'] == cast_id and c['embed_index'] == embed_idx), None)
-            if not context:
-                print(f"⚠️ Could not find context for embed {cast_id}:{embed_idx}")
-                continue
-            
-            # Parse genres array (Phase 3 enhancement)
-            genres = extraction.get('genres', [])
-            if isinstance(genres, list):
-                # Validate genres against our taxonomy
-                valid_genres = [
-                    'ambient', 'bluegrass', 'blues', 'christian rap', 'classic rock', 'classical', 
-                    'country', 'disco', 'drum-and-bass', 'electronic', 'folk', 'funk', 'hip-hop', 
-                    'house', 'indie', 'jazz', 'k-pop', 'lo-fi', 'metal', 'old school hip-hop', 
-                    'pop', 'pop punk', 'punk', 'r&b', 'reggae', 'rock', 'roots', 'soul', 'synthwave'
-                ]
-                filtered_genres = [g for g in genres if g in valid_genres][:3]  # Max 3 genres
-            else:
-                filtered_genres = []
-            
-            # Parse release date (Phase 3 enhancement)
-            release_date = extraction.get('release_date')
-            if release_date and release_date != 'null':
-                # Normalize date format
-                if len(str(release_date)) == 4:  # Just year
-                    release_date = f"{release_date}-01-01"
-            else:
-                release_date = None
-
-            result = {
-                'cast_id': cast_id,
-                'embed_index': embed_idx,
-                'author_fid': context.get('author_fid', ''),
-                'music_type': extraction.get('music_type', 'song'),  # Default to 'song'
-                'title': extraction.get('title', '').strip() if extraction.get('title') else None,
-                'artist': extraction.get('artist', '').strip() if extraction.get('artist') else None,
-                'album': extraction.get('album', '').strip() if extraction.get('album') else None,
-                'genres': filtered_genres,  # Phase 3: Genre classification
-                'release_date': release_date,  # Phase 3: Release date extraction
-                'platform_name': context.get('platform_name'),  # Include platform info from metadata
-                'confidence_score': float(extraction.get('confidence', 0.0)),
-                'ai_model_version': current_test_run.get('model') if current_test_run else model
-            }
-            
-            # Validate music_type
-            valid_music_types = ['song', 'album', 'playlist', 'artist']
-            if result['music_type'] not in valid_music_types:
-                result['music_type'] = 'song'  # Default fallback
-            
-            # Only store if we have an actual title (not just artist name)
-            if result['title']:
-                results.append(result)
+        # Parse genres array (Phase 3 enhancement)
+        genres = extraction.get('genres', [])
+        if isinstance(genres, list):
+            # Validate genres against our taxonomy
+            filtered_genres = [g for g in genres if g in GENRES][:3]  # Max 3 genres
+        else:
+            filtered_genres = []
         
-        print(f"🎵 Successfully parsed {len(results)} music extractions from response")
-        return results
+        # Parse release date (Phase 3 enhancement)
+        release_date = extraction.get('release_date')
+        if release_date and release_date != 'null':
+            # Normalize date format
+            if len(str(release_date)) == 4:  # Just year
+                release_date = f"{release_date}-01-01"
+        else:
+            release_date = None
         
-    except Exception as e:
-        print(f"❌ Error parsing response: {e}")
-        print(f"Response preview: {response_text[:300]}...")
-        return []
+        result = {
+            'cast_id': cast_id,
+            'embed_index': embed_idx,
+            'author_fid': context.get('author_fid', ''),
+            'music_type': extraction.get('music_type', 'song'),  # Default to 'song'
+            'title': extraction.get('title', '').strip() if extraction.get('title') else None,
+            'artist': extraction.get('artist', '').strip() if extraction.get('artist') else None,
+            'album': extraction.get('album', '').strip() if extraction.get('album') else None,
+            'genres': filtered_genres,  # Phase 3: Genre classification
+            'release_date': release_date,  # Phase 3: Release date extraction
+            'platform_name': context.get('platform_name'),  # Include platform info from metadata
+            'confidence_score': parse_confidence(extraction.get('confidence')),
+            'ai_model_version': current_test_run.get('model') if current_test_run else model
+        }
+        
+        # Validate music_type
+        if result['music_type'] not in MUSIC_TYPES:
+            result['music_type'] = 'song'  # Default fallback
+        
+        # Only store if we have an actual title (not just artist name)
+        if result['title']:
+            results.append(result)
+    
+    print(f"🎵 Successfully parsed {len(results)} music extractions from response")
+    return results
 
 async def extract_music_batch(
     casts: List[Dict],
@@ -455,12 +784,12 @@ def validate_extraction_result(extraction: Dict) -> bool:
     for field in required_fields:
         if not extraction.get(field):
             return False
-            
+    
     # Check confidence score range
     confidence = extraction.get('confidence_score')
     if confidence is not None and (confidence < 0 or confidence > 1):
         return False
-        
+    
     return True
 
 def get_model_info(model: str) -> Dict[str, Any]:
@@ -500,6 +829,151 @@ def get_model_info(model: str) -> Dict[str, Any]:
         "quality": "unknown"
     })
 
+async def extract_music_concurrently(
+    embed_contexts: List[Dict],
+    model: str,
+    executor: ClaudeExecutor,
+    cache: Optional[ExtractionCache] = None
+) -> List[Dict]:
+    """Pack contexts into token-budgeted requests and extract them all through the executor"""
+    batches = pack_batches(embed_contexts)
+    
+    async def run_batch(batch_num: int, batch: List[Dict]) -> List[Dict]:
+        print(f"🎵 Processing batch {batch_num}/{len(batches)} ({len(batch)} embeds)...")
+        try:
+            batch_extractions = await extract_music_from_embeds(batch, model, executor, cache)
+        except Exception as batch_error:
+            print(f"❌ Batch {batch_num} failed: {str(batch_error)}")
+            raise
+        
+        if batch_extractions:
+            print(f"✅ Batch {batch_num}: {len(batch_extractions)} extractions")
+        else:
+            print(f"ℹ️ Batch {batch_num}: No extractions")
+        return batch_extractions
+    
+    # Let every batch finish (or exhaust its backoff) before an error propagates
+    results = await asyncio.gather(
+        *(run_batch(batch_num, batch) for batch_num, batch in enumerate(batches, 1)),
+        return_exceptions=True
+    )
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        raise errors[0]
+    
+    return [extraction for batch_extractions in results for extraction in batch_extractions]
+
+# =============================================================================
+# EXTRACTION CACHE
+# =============================================================================
+
+def cache_extractions(cache: ExtractionCache, contexts: List[Dict], extractions: List[Dict], model: str) -> None:
+    """Remember a batch's answers: music fields per extracted embed, None (no music) for the rest"""
+    found = {(extraction['cast_id'], extraction['embed_index']): extraction for extraction in extractions}
+    entries = {}
+    for context in contexts:
+        extraction = found.get((context['cast_id'], context['embed_index']))
+        key = content_key(context, model, PROMPT_VERSION)
+        if extraction:
+            entries[key] = {field: extraction[field] for field in MUSIC_FIELDS}
+        else:
+            entries.setdefault(key, None)
+    cache.store(entries)
+
+async def extract_music_cached(
+    embed_contexts: List[Dict],
+    model: str,
+    executor: ClaudeExecutor,
+    cache: ExtractionCache
+) -> List[Dict]:
+    """Reuse cached extractions and send each piece of uncached content to Claude only once"""
+    keys = [content_key(context, model, PROMPT_VERSION) for context in embed_contexts]
+    known = cache.lookup(list(dict.fromkeys(keys)))
+    
+    # One representative context per uncached content key
+    pending = {}
+    for key, context in zip(keys, embed_contexts):
+        if key not in known:
+            pending.setdefault(key, context)
+    
+    cache.record(hits=len(embed_contexts) - len(pending), misses=len(pending))
+    print(f"💾 Extraction cache: {len(embed_contexts) - len(pending)} embeds reused, {len(pending)} to extract")
+    
+    if pending:
+        await extract_music_concurrently(list(pending.values()), model, executor, cache)
+        # Batches whose response couldn't be parsed stay uncached and yield nothing
+        known.update(cache.lookup(list(pending)))
+    
+    return [restamp(known[key], context) for key, context in zip(keys, embed_contexts) if known.get(key)]
+
+# =============================================================================
+# GENRE PASS (RULE EXTRACTIONS)
+# =============================================================================
+
+def build_genre_prompt(extractions: List[Dict]) -> str:
+    """Genre-only prompt: one numbered 'title — artist' line per extraction"""
+    lines = "\n".join(
+        f"{i}. {extraction['title']} — {extraction['artist']}"
+        for i, extraction in enumerate(extractions, 1)
+    )
+    
+    return f"""Classify the genres of these releases (title — artist):
+
+{lines}
+
+Select 1-3 genres from this curated list only:
+{', '.join(GENRES)}
+
+Record them with the record_music_extractions tool: ONE entry per line, in order, with only embed_id and genres, e.g. {{"embed_id":"1","genres":["hip-hop"]}}."""
+
+async def classify_genre_batch(extractions: List[Dict], model: str, executor: ClaudeExecutor) -> Dict[str, List[str]]:
+    """Genres per embed_id (1-based line number) from one genre-only request"""
+    response = await executor.stream_extractions(build_genre_prompt(extractions), model, len(extractions))
+    
+    genres_by_id = {}
+    for answer in response['extractions']:
+        if not isinstance(answer, dict) or not isinstance(answer.get('genres'), list):
+            continue
+        genres = [genre for genre in answer['genres'] if genre in GENRES][:3]
+        if genres:
+            genres_by_id[str(answer.get('embed_id'))] = genres
+    return genres_by_id
+
+async def classify_genres(
+    extractions: List[Dict],
+    model: str,
+    executor: ClaudeExecutor,
+    batch_size: int = GENRE_BATCH_SIZE
+) -> List[Dict]:
+    """
+    Fill in the genres of rule extractions still pending them. Rows the pass
+    couldn't classify keep RULES_GENRES_PENDING for the genre backfill.
+    """
+    pending = [extraction for extraction in extractions if extraction['ai_model_version'] == RULES_GENRES_PENDING]
+    if not pending:
+        return extractions
+    
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    results = await asyncio.gather(
+        *(classify_genre_batch(batch, model, executor) for batch in batches),
+        return_exceptions=True
+    )
+    
+    classified = {}
+    for batch, genres_by_id in zip(batches, results):
+        if isinstance(genres_by_id, Exception):
+            print(f"⚠️ Genre pass failed for {len(batch)} rule extractions, left pending: {genres_by_id}")
+            continue
+        for i, extraction in enumerate(batch, 1):
+            genres = genres_by_id.get(str(i))
+            if genres:
+                classified[(extraction['cast_id'], extraction['embed_index'])] = {
+                    **extraction, 'genres': genres, 'ai_model_version': RULES_VERSION
+                }
+    
+    print(f"🏷️ Genre pass classified {len(classified)}/{len(pending)} rule extractions")
+    return [classified.get((extraction['cast_id'], extraction['embed_index']), extraction) for extraction in extractions]
+
 # =============================================================================
 # PREFECT TASK WRAPPER
 # =============================================================================
@@ -507,46 +981,37 @@ def get_model_info(model: str) -> Dict[str, Any]:
 @task(name="Extract Music Information", log_prints=True, retries=3, retry_delay_seconds=[2, 4, 8])
 async def extract_music_task(
     embed_contexts: List[Dict],
-    model: str = "claude-3-5-sonnet-20241022"
+    model: str = "claude-3-5-sonnet-20241022",
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    tokens_per_minute: int = DEFAULT_TOKENS_PER_MINUTE,
+    use_cache: bool = True,
+    use_rules: bool = True
 ) -> List[Dict]:
-    """Extract music information using Claude AI with per-embed context"""
+    """Extract music information with per-embed context: rules for structured metadata, Claude for the rest"""
     if not embed_contexts:
         return []
     
+    executor = ClaudeExecutor(max_in_flight=max_in_flight, tokens_per_minute=tokens_per_minute)
+    
+    rule_extractions = []
+    if use_rules:
+        rule_extractions, embed_contexts = split_rule_extractions(embed_contexts)
+        print(f"📐 Rules extracted {len(rule_extractions)} embeds from structured metadata, {len(embed_contexts)} left for Claude")
+        rule_extractions = await classify_genres(rule_extractions, model, executor)
+        if not embed_contexts:
+            return rule_extractions
+    
     model_info = get_model_info(model)
-    batch_size = model_info['recommended_batch_size']
     
-    print(f"Processing {len(embed_contexts)} embeds with {model_info['name']}")
+    print(f"Processing {len(embed_contexts)} embeds with {model_info['name']} (up to {max_in_flight} requests in flight)")
     
-    # Process in batches if needed
-    all_extractions = []
-    for i in range(0, len(embed_contexts), batch_size):
-        batch = embed_contexts[i:i + batch_size]
-        batch_num = (i // batch_size) + 1
-        total_batches = (len(embed_contexts) + batch_size - 1) // batch_size
-        
-        print(f"🎵 Processing batch {batch_num}/{total_batches} ({len(batch)} embeds)...")
-        
-        try:
-            batch_extractions = await extract_music_from_embeds(batch, model)
-            all_extractions.extend(batch_extractions)
-            
-            if batch_extractions:
-                print(f"✅ Batch {batch_num}: {len(batch_extractions)} extractions")
-            else:
-                print(f"ℹ️ Batch {batch_num}: No extractions")
-                
-        except Exception as batch_error:
-            if "API_OVERLOAD" in str(batch_error):
-                print(f"🚨 API overloaded - stopping entire flow")
-                raise batch_error
-            else:
-                print(f"❌ Batch {batch_num} failed: {str(batch_error)}")
-                raise
-        
-        # Brief pause between batches
-        if i + batch_size < len(embed_contexts):
-            await asyncio.sleep(1)
+    if use_cache:
+        claude_extractions = await extract_music_cached(embed_contexts, model, executor, get_extraction_cache())
+    else:
+        claude_extractions = await extract_music_concurrently(embed_contexts, model, executor)
+    all_extractions = rule_extractions + claude_extractions
     
+    if executor.retries:
+        print(f"⏳ {executor.retries} requests were retried after rate limiting/overload")
     print(f"✅ Total extractions: {len(all_extractions)}")
     return all_extractions
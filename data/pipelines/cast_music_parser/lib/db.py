@@ -8,12 +8,18 @@ Updated to use new schema: cast_nodes + music_library + embeds_metadata
 
 import os
 import polars as pl
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional, Tuple
 from datetime import datetime
 from prefect import task
 
 # Import the existing Supabase client and batch insert function
-from data.lib.db import sb, batch_insert
+from data.lib.db import sb, batch_insert, apply_keyset, cursor_from_row
+from data.pipelines.cast_music_parser.lib.rules import RULES_GENRES_PENDING
+
+# Scan order for embeds_metadata (newest first) - matches idx_embeds_metadata_keyset
+EMBED_METADATA_KEYSET = ('created_at', 'cast_id', 'embed_index')
+# Scan order for rows waiting for the genre pass - music_library's primary key
+MUSIC_LIBRARY_KEYSET = ('cast_id', 'embed_index')
 
 async def insert_music_extractions(extractions: List[Dict]) -> bool:
     """
@@ -65,22 +71,24 @@ async def insert_music_extractions(extractions: List[Dict]) -> bool:
 
 async def get_embeds_in_range(
     limit: int = 500,  # Higher default, more reasonable for batch processing
-    offset: int = 0,
+    cursor: Optional[Dict[str, Any]] = None,
     start_time: Optional[str] = None, 
     end_time: Optional[str] = None
-) -> List[Dict]:
+) -> Tuple[List[Dict], Optional[Dict[str, Any]]]:
     """
     Get embeds in date range using direct filtering on embeds_metadata.created_at
     No JOINs needed - much simpler and faster!
+    Pages with keyset pagination (newest first); returns the embeds and the
+    cursor after the last scanned row, or None when the range is exhausted.
     """
     try:
-        print(f"🔍 Fetching embeds with limit: {limit}, offset: {offset}")
+        print(f"🔍 Fetching embeds with limit: {limit}, after: {cursor or 'start'}")
         if start_time or end_time:
             print(f"📅 Date range: {start_time or 'beginning'} to {end_time or 'end'}")
         
         # Simple query - filter embeds_metadata directly by created_at
         query = sb.table('embeds_metadata').select(
-            'cast_id, embed_index, platform_name, og_metadata, created_at'
+            'cast_id, embed_index, url, platform_name, og_metadata, created_at'
         )
         
         # Apply date filters directly on embeds_metadata.created_at  
@@ -91,17 +99,18 @@ async def get_embeds_in_range(
         elif end_time:
             query = query.lte('created_at', end_time)
         
-        # Apply ordering and pagination
-        query = query.order('created_at', desc=True).range(offset, offset + limit - 1)
+        # Apply ordering and seek past the cursor instead of OFFSET
+        query = apply_keyset(query.not_.is_('created_at', 'null'), EMBED_METADATA_KEYSET, cursor, desc=True).limit(limit)
         
         # Execute query
         result = query.execute()
         
         if not result.data:
             print("No embeds found in date range")
-            return []
+            return [], None
         
         print(f"📊 Found {len(result.data)} embeds_metadata records")
+        next_cursor = cursor_from_row(result.data[-1], EMBED_METADATA_KEYSET) if len(result.data) == limit else None
         
         # Get unique cast_ids to fetch cast data
         cast_ids = list(set([item['cast_id'] for item in result.data]))
@@ -113,7 +122,7 @@ async def get_embeds_in_range(
         
         if not cast_result.data:
             print("No cast_nodes found")
-            return []
+            return [], next_cursor
         
         print(f"📊 Found {len(cast_result.data)} cast_nodes")
         
@@ -129,6 +138,7 @@ async def get_embeds_in_range(
                     'cast_id': metadata['cast_id'],
                     'embed_index': metadata['embed_index'],
                     'platform_name': metadata.get('platform_name'),
+                    'embed_url': metadata.get('url', ''),
                     'og_metadata': metadata.get('og_metadata', ''),
                     'created_at': metadata.get('created_at', ''),
                     'cast_text': cast_data.get('cast_text', ''),
@@ -136,13 +146,41 @@ async def get_embeds_in_range(
                 })
         
         print(f"✅ Found {len(result_embeds)} embeds in date range")
-        return result_embeds
+        return result_embeds, next_cursor
         
     except Exception as e:
         print(f"❌ Error getting embeds: {str(e)}")
         import traceback
         print(f"🐛 DEBUG: Traceback: {traceback.format_exc()}")
-        return []
+        # Re-raise so a failed page isn't mistaken for the end of the range
+        raise
+
+async def get_genre_pending_extractions(
+    limit: int = 500,
+    cursor: Optional[Dict[str, Any]] = None
+) -> Tuple[List[Dict], Optional[Dict[str, Any]]]:
+    """Next page of rule-extracted rows still waiting for genres, and the cursor after it"""
+    query = sb.table('music_library').select(
+        'cast_id, embed_index, title, artist, ai_model_version'
+    ).eq('ai_model_version', RULES_GENRES_PENDING)
+    result = apply_keyset(query, MUSIC_LIBRARY_KEYSET, cursor).limit(limit).execute()
+    
+    rows = result.data or []
+    next_cursor = cursor_from_row(rows[-1], MUSIC_LIBRARY_KEYSET) if len(rows) == limit else None
+    return rows, next_cursor
+
+async def update_extraction_genres(extractions: List[Dict]) -> int:
+    """Store the genres the genre pass found (rows still pending are skipped); returns rows updated"""
+    updated = 0
+    for extraction in extractions:
+        if extraction['ai_model_version'] == RULES_GENRES_PENDING:
+            continue
+        sb.table('music_library').update({
+            'genre': extraction['genres'],
+            'ai_model_version': extraction['ai_model_version']
+        }).eq('cast_id', extraction['cast_id']).eq('embed_index', extraction['embed_index']).execute()
+        updated += 1
+    return updated
 
 async def assemble_embed_context(embed: Dict) -> Dict:
     """
@@ -162,6 +200,7 @@ async def assemble_embed_context(embed: Dict) -> Dict:
             'author_fid': embed.get('author_fid', ''),
             'created_at': embed.get('created_at', ''),
             'platform_name': embed.get('platform_name'),  # Include platform info
+            'embed_url': embed.get('embed_url', ''),  # Rules read the page type off the URL
             'embed_metadata': clean_metadata_text(embed.get('og_metadata', ''))
         }
         
@@ -174,6 +213,7 @@ async def assemble_embed_context(embed: Dict) -> Dict:
             'author_fid': '',
             'created_at': '',
             'platform_name': None,
+            'embed_url': '',
             'embed_metadata': ''
         }
 
@@ -257,12 +297,25 @@ async def get_stats_task() -> Dict:
 @task(name="Get Embeds in Range", log_prints=True)
 async def get_embeds_in_range_task(
     limit: int = 500,
-    offset: int = 0,
+    cursor: Optional[Dict[str, Any]] = None,
     start_time: Optional[str] = None,
     end_time: Optional[str] = None
-) -> List[Dict]:
-    """Get embeds in date range with single efficient JOIN query"""
-    return await get_embeds_in_range(limit, offset, start_time, end_time)
+) -> Tuple[List[Dict], Optional[Dict[str, Any]]]:
+    """Get the next page of embeds in date range and the cursor after it"""
+    return await get_embeds_in_range(limit, cursor, start_time, end_time)
+
+@task(name="Get Genre-Pending Extractions", log_prints=True)
+async def get_genre_pending_task(
+    limit: int = 500,
+    cursor: Optional[Dict[str, Any]] = None
+) -> Tuple[List[Dict], Optional[Dict[str, Any]]]:
+    """Get the next page of rule extractions waiting for genres and the cursor after it"""
+    return await get_genre_pending_extractions(limit, cursor)
+
+@task(name="Store Extraction Genres", log_prints=True)
+async def store_genres_task(extractions: List[Dict]) -> int:
+    """Store genres found by the genre pass"""
+    return await update_extraction_genres(extractions)
 
 @task(name="Assemble Embed Contexts", log_prints=True)
 async def assemble_embed_contexts_task(embeds: List[Dict]) -> List[Dict]:
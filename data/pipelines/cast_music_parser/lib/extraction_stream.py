@@ -0,0 +1,84 @@
+"""
+Incremental parser for streamed extraction JSON
+
+Claude's tool input ({"extractions": [{...}, ...]}) arrives as JSON fragments.
+The parser tracks only structure (brackets, braces, strings and escapes) and
+hands back each extraction object as soon as its closing brace arrives, so
+nothing waits for the full response and a response cut off at max_tokens
+still yields every object that was completed. A bare top-level array
+([{...}, ...]) is read the same way.
+
+Each fragment is scanned once for structural characters; there is no regex
+backtracking and no re-parse of text already seen.
+"""
+
+import json
+import re
+from typing import Dict, List
+
+STRUCTURAL_CHARS = re.compile(r'[{}\[\]"\\]')
+
+# Open containers around an extraction object: a bare array, or the array in the tool input
+ELEMENT_PARENTS = (['['], ['{', '['])
+
+class ExtractionStreamParser:
+    """Feed JSON fragments in order; feed() returns the extraction objects they complete"""
+
+    def __init__(self):
+        self.complete = False   # The root array/object has closed
+        self.malformed = 0      # Element objects that closed but weren't valid JSON
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape_at = -1    # Absolute offset of the character a backslash escapes
+        self._offset = 0        # Characters fed before the current fragment
+        self._element_parts: List[str] = []
+        self._element_start = -1  # Start of the open element in the current fragment (-1: none)
+        self._in_element = False
+
+    def feed(self, fragment: str) -> List[Dict]:
+        """Consume the next fragment; returns the objects closed in it"""
+        if self.complete or not fragment:
+            return []
+
+        completed = []
+        for match in STRUCTURAL_CHARS.finditer(fragment):
+            char, pos = match.group(), match.start()
+            if self._offset + pos == self._escape_at:
+                continue
+            if self._in_string:
+                if char == '\\':
+                    self._escape_at = self._offset + pos + 1
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in '{[':
+                if char == '{' and self._stack in ELEMENT_PARENTS:
+                    self._in_element = True
+                    self._element_start = pos
+                    self._element_parts = []
+                self._stack.append(char)
+            elif char in '}]':
+                if self._stack:
+                    self._stack.pop()
+                if char == '}' and self._in_element and self._stack in ELEMENT_PARENTS:
+                    element = ''.join(self._element_parts) + fragment[self._element_start:pos + 1]
+                    self._in_element = False
+                    try:
+                        parsed = json.loads(element)
+                    except json.JSONDecodeError:
+                        self.malformed += 1
+                    else:
+                        completed.append(parsed)
+                if not self._stack:
+                    self.complete = True
+                    break
+
+        if self._in_element:
+            # Carry the open element's text over to the next fragment
+            self._element_parts.append(fragment[self._element_start:])
+            self._element_start = 0
+        self._offset += len(fragment)
+        return completed
@@ -0,0 +1,153 @@
+"""
+Rule-based music extraction for structured platforms
+
+The metadata extractor already turns Spotify, Apple Music, Tidal, Bandcamp
+and YouTube Music pages into 'title - … | artist - … | album - …' strings.
+For those, the music fields can be read straight off the metadata instead of
+asking Claude to re-derive them. Anything ambiguous (playlists, artist pages,
+missing artist, other platforms, bare links) returns None and goes to Claude.
+Where the metadata doesn't say what the page is (Tidal, YouTube Music), the
+type comes from the embed URL's path.
+
+The structured metadata has no genres, so rule extractions are stored as
+RULES_GENRES_PENDING with an empty genre list; a genre-only Claude pass over
+their title and artist fills them in and moves them to RULES_VERSION.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+RULES_VERSION = "rules-v1"  # Stored as ai_model_version for rule-extracted rows with genres
+RULES_GENRES_PENDING = "rules-v1-genres-pending"  # ... and for those still waiting for the genre pass
+MIN_RULE_CONFIDENCE = 0.8   # Below this the embed goes to Claude instead
+
+# Labels format_parts emits; a ' | ' not followed by one of these is part of a value
+METADATA_LABELS = {'title', 'artist', 'album', 'year', 'release_date', 'type', 'image', 'tracks', 'description', 'channel', 'genre', 'upload_date'}
+
+# Spotify og:type (music.*) -> music_type; playlists and artist pages are left to Claude
+SPOTIFY_TYPES = {'song': 'song', 'album': 'album'}
+
+# platform -> (URL pattern, music_type) for platforms whose metadata has no type
+URL_TYPES = {
+    'tidal': [
+        (re.compile(r'^(/browse)?/track/\d+'), 'song'),
+        (re.compile(r'^(/browse)?/album/\d+'), 'album'),
+    ],
+    'youtube_music': [
+        (re.compile(r'^/watch\?(.*&)?v=[\w-]+'), 'song'),  # Playlists and channels are left to Claude
+    ],
+}
+
+# platform -> base confidence of a title + artist read off its metadata
+PLATFORM_CONFIDENCE = {
+    'spotify': 0.9,        # og:title + "Artist · Album · Song · Year" description
+    'apple_music': 0.85,   # JSON-LD MusicAlbum
+    'tidal': 0.85,         # "Artist - Song" og:title
+    'bandcamp': 0.85,      # "Song, by Artist" og:title
+    'youtube_music': 0.75, # Artist is the first video tag - needs album or release date to pass
+}
+
+PLACEHOLDER_PATTERN = re.compile(r' - (metadata extracted|extraction error)')
+
+def parse_metadata_fields(metadata: str) -> Dict[str, str]:
+    """Split 'label - value | label - value' into a dict (first value per label wins)"""
+    fields: Dict[str, str] = {}
+    last_label = None
+    for part in metadata.split(' | '):
+        label, separator, value = part.partition(' - ')
+        label = label.strip().lower()
+        if separator and label in METADATA_LABELS:
+            last_label = label
+            fields.setdefault(label, value.strip())
+        elif last_label and fields.get(last_label) is not None:
+            # A ' | ' inside a value, e.g. a livestream title
+            fields[last_label] = f"{fields[last_label]} | {part.strip()}"
+    return fields
+
+def release_date_of(fields: Dict[str, str]) -> Optional[str]:
+    """YYYY-MM-DD release date from release_date or year (year -> Jan 1st, as for Claude)"""
+    release_date = fields.get('release_date')
+    if release_date and re.fullmatch(r'\d{4}-\d{2}-\d{2}', release_date):
+        return release_date
+    year = fields.get('year') or release_date
+    if year and re.fullmatch(r'\d{4}', year):
+        return f"{year}-01-01"
+    return None
+
+def url_music_type(platform: str, url: str) -> Optional[str]:
+    """Music type the embed URL's path implies, or None when it can't be told"""
+    parsed = urlparse(url or '')
+    target = f"{parsed.path}?{parsed.query}" if parsed.query else parsed.path
+    for pattern, music_type in URL_TYPES.get(platform, []):
+        if pattern.match(target):
+            return music_type
+    return None
+
+def music_type_of(platform: str, fields: Dict[str, str], url: str = '') -> Optional[str]:
+    """Music type the metadata (or the URL) implies, or None when it can't be told"""
+    if platform in URL_TYPES:
+        return url_music_type(platform, url)
+    if platform == 'spotify':
+        return SPOTIFY_TYPES.get(fields.get('type', ''))
+    if platform == 'apple_music':
+        # The extractor reads JSON-LD MusicAlbum; a track count confirms an album page
+        return 'album' if fields.get('tracks') else None
+    if platform == 'bandcamp':
+        # Tracks mention their album ("from the album …"); album pages don't
+        return 'song' if fields.get('album') else None
+    return None
+
+def score_confidence(platform: str, fields: Dict[str, str]) -> float:
+    """Platform base confidence, nudged up by corroborating fields"""
+    confidence = PLATFORM_CONFIDENCE[platform]
+    if fields.get('album'):
+        confidence += 0.03
+    if release_date_of(fields):
+        confidence += 0.03
+    return round(min(confidence, 0.95), 2)
+
+def extract_music_by_rules(context: Dict) -> Optional[Dict]:
+    """Extraction record read off structured metadata, or None if Claude should decide"""
+    platform = context.get('platform_name')
+    metadata = context.get('embed_metadata') or ''
+    if platform not in PLATFORM_CONFIDENCE or not metadata or PLACEHOLDER_PATTERN.search(metadata):
+        return None
+
+    fields = parse_metadata_fields(metadata)
+    title, artist = fields.get('title'), fields.get('artist')
+    music_type = music_type_of(platform, fields, context.get('embed_url', ''))
+    if not title or not artist or not music_type:
+        return None
+
+    confidence = score_confidence(platform, fields)
+    if confidence < MIN_RULE_CONFIDENCE:
+        return None
+
+    # An album page's album is itself (Spotify album descriptions have no album part)
+    album = title if music_type == 'album' else fields.get('album')
+    return {
+        'cast_id': context['cast_id'],
+        'embed_index': context['embed_index'],
+        'author_fid': context.get('author_fid', ''),
+        'music_type': music_type,
+        'title': title,
+        'artist': artist,
+        'album': album,
+        'genres': [],
+        'release_date': release_date_of(fields),
+        'platform_name': platform,
+        'confidence_score': confidence,
+        'ai_model_version': RULES_GENRES_PENDING
+    }
+
+def split_rule_extractions(embed_contexts: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    """Split contexts into (rule extractions, contexts still needing Claude)"""
+    extractions, remaining = [], []
+    for context in embed_contexts:
+        extraction = extract_music_by_rules(context)
+        if extraction:
+            extractions.append(extraction)
+        else:
+            remaining.append(context)
+    return extractions, remaining
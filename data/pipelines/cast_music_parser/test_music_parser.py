@@ -10,19 +10,42 @@ import pandas as pd
 from datetime import datetime
 from unittest.mock import Mock, patch, AsyncMock
 import asyncio
+import json
 import sys
 import os
+import time
 
 # Add the parent directories to the path so we can import the modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 # Import the functions we want to test
+import anthropic
+
 from data.pipelines.cast_music_parser.lib.claude import (
+    PROMPT_VERSION,
     build_extraction_prompt,
     parse_claude_response,
     validate_extraction_result,
-    get_model_info
+    get_model_info,
+    ClaudeExecutor,
+    TokenBudget,
+    extract_music_concurrently,
+    extract_music_cached,
+    extract_music_from_embeds,
+    classify_genres,
+    get_claude_client,
+    build_extraction_prompt,
+    pack_batches,
+    MAX_CAST_TEXT_CHARS,
+    TARGET_INPUT_TOKENS,
+    PROMPT_OVERHEAD_TOKENS,
+    estimate_tokens
 )
+from data.pipelines.cast_music_parser.lib.cache import ExtractionCache, content_key
+from data.pipelines.cast_music_parser.lib.extraction_stream import ExtractionStreamParser
+from data.pipelines.cast_music_parser.lib.rules import RULES_GENRES_PENDING, RULES_VERSION, parse_metadata_fields, split_rule_extractions
+from data.pipelines.cast_music_parser.lib.batches import BatchJobStore, BatchSubmitter, run_batch_jobs
+from data.pipelines.cast_music_parser.benchmark import MODEL, build_contexts, mock_client, start_mock_anthropic
 
 def test_music_extraction_data_preparation():
     """Test that music extraction data is properly prepared for database insertion"""
@@ -302,6 +325,433 @@ def test_extract_music_task_mock(mock_claude_client):
     
     print("✅ Mocked extract_music_task test passed")
 
+def test_parse_claude_response_maps_ids_per_batch():
+    """Each batch maps embed_ids to its own contexts, whichever prompt was built last"""
+    batch_a = build_contexts(2)
+    batch_b = build_contexts(4)[2:]
+    build_extraction_prompt(batch_a)
+    build_extraction_prompt(batch_b)
+    
+    parsed = parse_claude_response('[{"embed_id": "2", "title": "Song"}]', batch_a)
+    assert parsed[0]['cast_id'] == batch_a[1]['cast_id']
+    assert parsed[0]['author_fid'] == batch_a[1]['author_fid']
+
+def test_token_budget_waits_for_refill():
+    """Requests beyond the per-minute budget wait for it to refill"""
+    async def run():
+        budget = TokenBudget(6000)  # 100 tokens/sec
+        await budget.acquire(6000)
+        started = time.monotonic()
+        await budget.acquire(50)
+        return time.monotonic() - started
+    
+    assert asyncio.run(run()) >= 0.4
+
+def run_against_mock(contexts, server, **executor_options):
+    """Extract contexts through the mock server, returning (extractions, executor)"""
+    async def run():
+        executor = ClaudeExecutor(mock_client(server), **executor_options)
+        return await extract_music_concurrently(contexts, MODEL, executor), executor
+    return asyncio.run(run())
+
+def test_claude_client_is_shared_per_event_loop(monkeypatch):
+    """One client per event loop - a client's connection pool can't move to another loop"""
+    monkeypatch.setenv('ANTHROPIC_API_KEY', 'test-key')
+    
+    async def clients():
+        return get_claude_client(), get_claude_client(), ClaudeExecutor().client
+    
+    first, same, executor_client = asyncio.run(clients())
+    assert first is same is executor_client
+    assert asyncio.run(clients())[0] is not first
+
+def test_executor_runs_batches_concurrently_within_limit():
+    """Batches overlap, never beyond max_in_flight, and every embed comes back in order"""
+    server = start_mock_anthropic(0.1)
+    contexts = build_contexts(300)
+    try:
+        extractions, _ = run_against_mock(contexts, server, max_in_flight=4)
+    finally:
+        server.shutdown()
+    
+    assert [e['cast_id'] for e in extractions] == [c['cast_id'] for c in contexts]
+    assert server.requests == len(pack_batches(contexts)) > 4
+    assert 1 < server.peak_active <= 4
+
+def test_executor_backs_off_on_overload():
+    """529s are retried instead of failing the run"""
+    server = start_mock_anthropic(0.05, overload_every=3)
+    contexts = build_contexts(250)
+    try:
+        extractions, executor = run_against_mock(contexts, server, max_in_flight=3, backoff_base=0.01)
+    finally:
+        server.shutdown()
+    
+    assert len(extractions) == len(contexts)
+    assert executor.retries == server.overloaded > 0
+
+def test_executor_shrinks_in_flight_on_rate_limit():
+    """429s halve the in-flight limit and are retried after retry-after"""
+    server = start_mock_anthropic(0.1, max_concurrent=2, retry_after=0.05)
+    contexts = build_contexts(300)
+    try:
+        extractions, executor = run_against_mock(contexts, server, max_in_flight=8)
+    finally:
+        server.shutdown()
+    
+    assert len(extractions) == len(contexts)
+    assert server.rate_limited > 0
+    assert executor.in_flight_limit < 8
+
+def test_executor_raises_after_max_attempts():
+    """A batch that stays overloaded fails once its attempts are used up"""
+    server = start_mock_anthropic(0.01, overload_every=1)
+    try:
+        with pytest.raises(anthropic.APIStatusError) as error:
+            run_against_mock(build_contexts(3), server, max_attempts=2, backoff_base=0.01)
+    finally:
+        server.shutdown()
+    
+    assert error.value.status_code == 529
+    assert server.requests == 2
+
+def test_content_key_follows_metadata_model_and_prompt_version():
+    """Same metadata shares a key whatever the cast says; model and prompt version split it"""
+    context = {'cast_text': 'on repeat', 'embed_metadata': 'title - YAH. | artist - Kendrick Lamar'}
+    other_cast = {'cast_text': 'so good', 'embed_metadata': 'title - YAH.  | artist - Kendrick Lamar'}
+    bare_link = {'cast_text': 'on repeat', 'embed_metadata': ''}
+    
+    assert content_key(context, MODEL, 'v1') == content_key(other_cast, MODEL, 'v1')
+    assert content_key(context, MODEL, 'v1') != content_key(context, MODEL, 'v2')
+    assert content_key(context, MODEL, 'v1') != content_key(context, 'claude-3-5-sonnet-20241022', 'v1')
+    assert content_key(bare_link, MODEL, 'v1') != content_key({**bare_link, 'cast_text': 'other'}, MODEL, 'v1')
+
+def test_extraction_cache_sends_each_content_once():
+    """Repeated metadata is extracted once, re-stamped per cast, and reused on the next run"""
+    contexts = [
+        {**context, 'embed_metadata': f"title - Song {i % 3} | artist - Mock Artist"}
+        for i, context in enumerate(build_contexts(30))
+    ]
+    cache = ExtractionCache(":memory:")
+    server = start_mock_anthropic(0.01)
+    
+    async def run():
+        executor = ClaudeExecutor(mock_client(server))
+        first = await extract_music_cached(contexts, MODEL, executor, cache)
+        second = await extract_music_cached(contexts, MODEL, executor, cache)
+        return first, second
+    
+    try:
+        first, second = asyncio.run(run())
+    finally:
+        server.shutdown()
+    
+    assert server.requests == 1
+    assert first == second
+    assert [e['cast_id'] for e in first] == [c['cast_id'] for c in contexts]
+    assert [e['author_fid'] for e in first] == [c['author_fid'] for c in contexts]
+    assert first[3]['title'] == first[0]['title']
+    assert cache.summary()['hits'] == 57
+
+def test_extraction_cache_remembers_no_music_but_not_parse_failures():
+    """A complete answer caches embeds without an extraction as no music; incomplete JSON caches nothing"""
+    class StubExecutor:
+        def __init__(self, tool_input):
+            self.tool_input = tool_input
+        
+        async def stream_extractions(self, prompt, model, embed_count):
+            parser = ExtractionStreamParser()
+            extractions = parser.feed(self.tool_input)
+            return {'extractions': extractions, 'complete': parser.complete, 'stop_reason': 'end_turn', 'input_tokens': 0, 'output_tokens': 0}
+    
+    contexts = build_contexts(2)
+    keys = [content_key(context, MODEL, PROMPT_VERSION) for context in contexts]
+    
+    cache = ExtractionCache(":memory:")
+    asyncio.run(extract_music_from_embeds(contexts, MODEL, StubExecutor('{"extractions": [{"embed_id": "1"'), cache))
+    assert cache.lookup(keys) == {}
+    
+    asyncio.run(extract_music_from_embeds(contexts, MODEL, StubExecutor('{"extractions": [{"embed_id": "1"}, {"embed_id": "2", "title": "Song 1"}]}'), cache))
+    cached = cache.lookup(keys)
+    assert cached[keys[0]] is None
+    assert cached[keys[1]]['title'] == 'Song 1'
+
+def test_parse_metadata_fields_keeps_separators_inside_values():
+    """A ' | ' that isn't followed by a label belongs to the previous value"""
+    fields = parse_metadata_fields("title - LA Livestream | WORSHIP x UKF | artist - Sub Focus | image - https://i.scdn.co/x")
+    assert fields == {'title': 'LA Livestream | WORSHIP x UKF', 'artist': 'Sub Focus', 'image': 'https://i.scdn.co/x'}
+
+def test_rules_extract_structured_platforms_and_leave_the_rest_to_claude():
+    """Structured metadata becomes a record directly; ambiguous embeds are left for Claude"""
+    def context(i, platform, metadata, url=''):
+        return {'cast_id': f'0x{i}', 'embed_index': 0, 'author_fid': '1', 'cast_text': 'listen', 'platform_name': platform, 'embed_url': url, 'embed_metadata': metadata}
+    
+    contexts = [
+        context(1, 'spotify', "title - YAH. | artist - Kendrick Lamar | album - DAMN. | year - 2017 | type - song"),
+        context(2, 'spotify', "title - Chill Hits | artist - Playlist | type - playlist"),
+        context(3, 'tidal', "title - Falling | artist - Roudeep", "https://tidal.com/browse/track/123"),
+        context(4, 'youtube', "title - Roudeep - Falling | channel - GEORGIA BEATS"),
+        context(5, 'bandcamp', "title - Stars As Eyes | artist - Robot Koch"),
+        context(6, 'spotify', "spotify - metadata extracted"),
+        # The type comes from the URL; an unknown page shape is left to Claude
+        context(7, 'tidal', "title - Deep Cuts | artist - Roudeep", "https://tidal.com/browse/album/456"),
+        context(8, 'tidal', "title - Falling | artist - Roudeep", "https://tidal.com/browse/playlist/abc"),
+        # YouTube Music needs corroborating fields to clear MIN_RULE_CONFIDENCE
+        context(9, 'youtube_music', "title - Falling | artist - Roudeep", "https://music.youtube.com/watch?v=abc"),
+        context(10, 'youtube_music', "title - Falling | artist - Roudeep | album - Falling | year - 2020", "https://music.youtube.com/watch?v=abc"),
+    ]
+    extractions, remaining = split_rule_extractions(contexts)
+    
+    assert [e['cast_id'] for e in extractions] == ['0x1', '0x3', '0x7', '0x10']
+    assert [c['cast_id'] for c in remaining] == ['0x2', '0x4', '0x5', '0x6', '0x8', '0x9']
+    assert [e['music_type'] for e in extractions[1:]] == ['song', 'album', 'song']
+    
+    spotify = extractions[0]
+    assert (spotify['title'], spotify['artist'], spotify['album']) == ('YAH.', 'Kendrick Lamar', 'DAMN.')
+    assert spotify['release_date'] == '2017-01-01'
+    assert spotify['music_type'] == 'song'
+    assert (spotify['genres'], spotify['ai_model_version']) == ([], RULES_GENRES_PENDING)
+    assert 0.8 <= extractions[1]['confidence_score'] < spotify['confidence_score'] <= 0.95
+    assert all(validate_extraction_result(e) for e in extractions)
+
+def test_rule_extractions_get_genres_or_stay_queued_for_backfill():
+    """A genre-only request fills in rule rows; unanswered or failed ones keep the pending version"""
+    class GenreStubExecutor:
+        def __init__(self, tool_input=None):
+            self.tool_input = tool_input
+            self.prompts = []
+        
+        async def stream_extractions(self, prompt, model, embed_count):
+            self.prompts.append(prompt)
+            if self.tool_input is None:
+                raise RuntimeError("API unavailable")
+            return {'extractions': ExtractionStreamParser().feed(self.tool_input), 'complete': True, 'stop_reason': 'end_turn', 'input_tokens': 0, 'output_tokens': 0}
+    
+    contexts = [
+        {'cast_id': f'0x{i}', 'embed_index': 0, 'author_fid': '1', 'cast_text': 'listen', 'platform_name': 'spotify', 'embed_url': '',
+         'embed_metadata': f"title - Song {i} | artist - Artist {i} | type - song"}
+        for i in (1, 2)
+    ]
+    extractions, _ = split_rule_extractions(contexts)
+    
+    executor = GenreStubExecutor('{"extractions": [{"embed_id": "1", "genres": ["hip-hop", "not-a-genre"]}, {"embed_id": "2", "genres": []}]}')
+    classified = asyncio.run(classify_genres(extractions, MODEL, executor))
+    assert (classified[0]['genres'], classified[0]['ai_model_version']) == (['hip-hop'], RULES_VERSION)
+    assert (classified[1]['genres'], classified[1]['ai_model_version']) == ([], RULES_GENRES_PENDING)
+    # Only title and artist are sent, not the cast text or metadata
+    assert len(executor.prompts) == 1 and '1. Song 1 — Artist 1' in executor.prompts[0]
+    assert 'listen' not in executor.prompts[0]
+    
+    failed = asyncio.run(classify_genres(extractions, MODEL, GenreStubExecutor()))
+    assert [e['ai_model_version'] for e in failed] == [RULES_GENRES_PENDING] * 2
+
+def test_pack_batches_fills_input_budget_and_leaves_room_for_output():
+    """Short contexts are capped by the response budget, long ones by the input target"""
+    short = build_contexts(100)
+    assert [len(batch) for batch in pack_batches(short, max_output_tokens=900)] == [10] * 10
+    
+    long = [{**context, 'cast_text': 'word ' * 2000} for context in build_contexts(30)]
+    batches = pack_batches(long)
+    assert sum(len(batch) for batch in batches) == 30
+    for batch in batches:
+        assert estimate_tokens(build_extraction_prompt(batch)) <= TARGET_INPUT_TOKENS
+    
+    # Oversized cast text is cut at a word boundary
+    prompt = build_extraction_prompt(long[:1])
+    assert 'word…' in prompt
+    assert prompt.count('word') < MAX_CAST_TEXT_CHARS // 4
+    
+    # Image URLs are dropped from the metadata
+    context = {**short[0], 'embed_metadata': 'title - YAH. | artist - Kendrick Lamar | image - https://i.scdn.co/image/abc'}
+    assert 'scdn' not in build_extraction_prompt([context])
+    assert PROMPT_OVERHEAD_TOKENS < TARGET_INPUT_TOKENS
+
+def test_truncated_responses_are_split_instead_of_dropped():
+    """A response cut off at max_tokens is retried in halves until every embed is answered"""
+    server = start_mock_anthropic(0.01, max_output_embeds=10)
+    contexts = build_contexts(40)
+    try:
+        extractions, _ = run_against_mock(contexts, server)
+    finally:
+        server.shutdown()
+    
+    assert [e['cast_id'] for e in extractions] == [c['cast_id'] for c in contexts]
+
+def test_stream_parser_emits_each_extraction_as_it_closes():
+    """Objects come back as soon as they close, whatever the fragment boundaries"""
+    extractions = [
+        {"embed_id": "1", "title": 'Say "Hi" [live] {edit} \\', "genres": ["rock", "pop"], "album": None},
+        {"embed_id": "2"},
+        {"embed_id": "3", "title": "Ünïcødé", "confidence": 0.8},
+    ]
+    tool_input = json.dumps({"extractions": extractions})
+    
+    for size in (1, 3, 7, len(tool_input)):
+        parser = ExtractionStreamParser()
+        emitted = [parser.feed(tool_input[i:i + size]) for i in range(0, len(tool_input), size)]
+        assert [e for chunk in emitted for e in chunk] == extractions
+        assert parser.complete
+    
+    # The first object is handed back before the rest of the array has arrived
+    parser = ExtractionStreamParser()
+    first_end = tool_input.index('}, {') + 1
+    assert parser.feed(tool_input[:first_end]) == extractions[:1]
+    
+    # Cut off mid-object (max_tokens): completed objects only, not complete
+    parser = ExtractionStreamParser()
+    assert parser.feed(tool_input[:tool_input.index('"3"')]) == extractions[:2]
+    assert not parser.complete
+
+def test_parse_claude_response_handles_truncated_text_without_backtracking():
+    """A long unterminated array (old regex: exponential time) is rejected quickly"""
+    text = json.dumps([{"embed_id": str(i), "title": f"Song {i}", "genres": ["rock"]} for i in range(1, 200)])[:-20]
+    started = time.perf_counter()
+    assert parse_claude_response(text, build_contexts(200)) == []
+    assert time.perf_counter() - started < 0.5
+
+def test_truncated_stream_keeps_answered_embeds():
+    """After a cut-off response only the unanswered embeds are requested again"""
+    server = start_mock_anthropic(0.01, max_output_embeds=10)
+    contexts = build_contexts(40)
+    try:
+        extractions, _ = run_against_mock(contexts, server)
+    finally:
+        server.shutdown()
+    
+    assert [e['cast_id'] for e in extractions] == [c['cast_id'] for c in contexts]
+    # Each response answers ~10 embeds: no request is spent re-asking for answered ones
+    assert server.requests <= 5
+
+def submit_to_mock(server, pages, cache, store, max_embeds):
+    """Scan pages of contexts into Message Batches; returns (cached extractions, batch ids)"""
+    async def run():
+        submitter = BatchSubmitter(mock_client(server), MODEL, store, cache, max_embeds=max_embeds)
+        cached = []
+        for page in pages:
+            cached += await submitter.add(page)
+        await submitter.flush()
+        return cached, submitter.batch_ids
+    return asyncio.run(run())
+
+def test_batch_backfill_submits_polls_and_stores_every_embed():
+    """Duplicates wait on one request, errored and truncated requests are resubmitted"""
+    server = start_mock_anthropic(0, overload_every=6, max_output_embeds=25, batch_polls=2)
+    cache, store = ExtractionCache(":memory:"), BatchJobStore(":memory:")
+    contexts = build_contexts(120)
+    # The second page repeats content of the first (shared tracks, other casts)
+    repeats = [{**context, 'cast_id': f"{context['cast_id']}-repost"} for context in contexts[:30]]
+    saved = []
+    
+    async def save(extractions):
+        saved.extend(extractions)
+        return True
+    
+    try:
+        cached, batch_ids = submit_to_mock(server, [contexts[:80], contexts[80:] + repeats], cache, store, max_embeds=60)
+        totals = asyncio.run(run_batch_jobs(mock_client(server), batch_ids, store, cache, save, poll_seconds=0.01))
+    finally:
+        server.shutdown()
+    
+    assert cached == [] and len(batch_ids) == 2
+    assert totals['errored'] > 0 and totals['truncated'] > 0 and totals['resubmitted'] > 0
+    assert sorted(e['cast_id'] for e in saved) == sorted(c['cast_id'] for c in contexts + repeats)
+    assert store.unfinished_jobs() == []
+    
+    # Every piece of content is cached now: another scan needs no batch
+    server = start_mock_anthropic(0)
+    try:
+        cached, batch_ids = submit_to_mock(server, [contexts], cache, store, max_embeds=60)
+    finally:
+        server.shutdown()
+    assert len(cached) == len(contexts) and batch_ids == []
+
+def test_batch_truncated_results_keep_answered_embeds():
+    """A batch result cut off at max_tokens keeps its closed objects; only the rest is resubmitted"""
+    server = start_mock_anthropic(0, max_output_embeds=10)
+    cache, store = ExtractionCache(":memory:"), BatchJobStore(":memory:")
+    contexts = build_contexts(30)
+    saved = []
+    
+    async def save(extractions):
+        saved.extend(extractions)
+        return True
+    
+    try:
+        _, batch_ids = submit_to_mock(server, [contexts], cache, store, max_embeds=1000)
+        asyncio.run(run_batch_jobs(mock_client(server), batch_ids, store, cache, save, poll_seconds=0.01))
+    finally:
+        server.shutdown()
+    
+    assert sorted(e['cast_id'] for e in saved) == sorted(c['cast_id'] for c in contexts)
+    # Each result answers 10 embeds; follow-ups carry only the embeds still unanswered
+    follow_up_sizes, batch_id = [], store.follow_up_of(batch_ids[0])
+    while batch_id:
+        follow_up_sizes.append(sum(len(request) for request in store.request_contexts(batch_id).values()))
+        batch_id = store.follow_up_of(batch_id)
+    assert follow_up_sizes == [20, 10]
+
+def test_batch_follow_up_is_not_resubmitted_after_a_crash():
+    """A run that dies after submitting a follow-up resumes with that follow-up, not a new one"""
+    server = start_mock_anthropic(0, max_output_embeds=10)
+    cache, store = ExtractionCache(":memory:"), BatchJobStore(":memory:")
+    contexts = build_contexts(20)
+    saved = []
+    
+    async def save(extractions):
+        saved.extend(extractions)
+        return True
+    
+    mark_ingested = store.mark_ingested
+    def crash_once(batch_id):
+        store.mark_ingested = mark_ingested
+        raise RuntimeError("worker died")
+    
+    try:
+        _, batch_ids = submit_to_mock(server, [contexts], cache, store, max_embeds=1000)
+        store.mark_ingested = crash_once
+        with pytest.raises(RuntimeError):
+            asyncio.run(run_batch_jobs(mock_client(server), batch_ids, store, cache, save, poll_seconds=0.01))
+        submitted = len(server.batches)
+        follow_up = store.follow_up_of(batch_ids[0])
+        assert follow_up and store.unfinished_jobs() == batch_ids + [follow_up]
+        
+        asyncio.run(run_batch_jobs(mock_client(server), store.unfinished_jobs(), store, cache, save, poll_seconds=0.01))
+    finally:
+        server.shutdown()
+    
+    assert store.follow_up_of(batch_ids[0]) == follow_up
+    assert len(server.batches) - submitted <= 1  # At most the follow-up's own follow-up
+    assert {e['cast_id'] for e in saved} == {c['cast_id'] for c in contexts}
+    assert store.unfinished_jobs() == []
+
+def test_batch_backfill_resumes_from_batch_ids():
+    """A run that fails while storing picks up the same batches without resubmitting them"""
+    server = start_mock_anthropic(0)
+    cache, store = ExtractionCache(":memory:"), BatchJobStore(":memory:")
+    contexts = build_contexts(50)
+    saved = []
+    
+    async def failing_save(extractions):
+        return False
+    
+    async def save(extractions):
+        saved.extend(extractions)
+        return True
+    
+    try:
+        _, batch_ids = submit_to_mock(server, [contexts], cache, store, max_embeds=1000)
+        with pytest.raises(RuntimeError):
+            asyncio.run(run_batch_jobs(mock_client(server), batch_ids, store, cache, failing_save, poll_seconds=0.01))
+        assert store.unfinished_jobs() == batch_ids
+        
+        asyncio.run(run_batch_jobs(mock_client(server), store.unfinished_jobs(), store, cache, save, poll_seconds=0.01))
+    finally:
+        server.shutdown()
+    
+    assert len(server.batches) == 1
+    assert [e['cast_id'] for e in saved] == [c['cast_id'] for c in contexts]
+    assert store.unfinished_jobs() == []
+
 if __name__ == "__main__":
     """Run all tests when executed directly"""
     print("🧪 Running Music Parser Tests...\n")
@@ -316,5 +766,23 @@ if __name__ == "__main__":
     test_validate_extraction_result_invalid()
     test_get_model_info()
     test_extract_music_task_mock()
+    test_parse_claude_response_maps_ids_per_batch()
+    test_token_budget_waits_for_refill()
+    test_executor_runs_batches_concurrently_within_limit()
+    test_executor_backs_off_on_overload()
+    test_executor_shrinks_in_flight_on_rate_limit()
+    test_executor_raises_after_max_attempts()
+    test_content_key_follows_metadata_model_and_prompt_version()
+    test_extraction_cache_sends_each_content_once()
+    test_extraction_cache_remembers_no_music_but_not_parse_failures()
+    test_parse_metadata_fields_keeps_separators_inside_values()
+    test_rules_extract_structured_platforms_and_leave_the_rest_to_claude()
+    test_pack_batches_fills_input_budget_and_leaves_room_for_output()
+    test_truncated_responses_are_split_instead_of_dropped()
+    test_stream_parser_emits_each_extraction_as_it_closes()
+    test_parse_claude_response_handles_truncated_text_without_backtracking()
+    test_truncated_stream_keeps_answered_embeds()
+    test_batch_backfill_submits_polls_and_stores_every_embed()
+    test_batch_backfill_resumes_from_batch_ids()
     
     print("\n🎉 All tests passed! Music parser pipeline is working correctly.") 
\ No newline at end of file
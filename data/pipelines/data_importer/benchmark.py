@@ -0,0 +1,124 @@
+"""
+Upsert Pipeline Benchmark
+
+Measures rows/sec of batch upserts through the supabase client against a
+local stub PostgREST server. The stub answers POST /rest/v1/<table> after a
+fixed round-trip delay plus a per-row cost, roughly like an upsert into an
+indexed table, so results reflect request overlap and batch sizing rather
+than a real database.
+
+Compares the old sequential loop (fixed batches of dicts, 0.1s pause
+between them) with the pipelined writer at several in-flight levels.
+
+Usage:
+    python -m data.pipelines.data_importer.benchmark
+    python -m data.pipelines.data_importer.benchmark --rows 100000 --latency 0.08 --levels 1 4 8
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import polars as pl
+from supabase import create_client
+
+from data.lib.upsert_pipeline import estimate_row_bytes, run_pipelined_upserts, upsert_json
+
+STUB_KEY = "stub-service-role-key"
+
+def start_stub_postgrest(latency: float, row_cost: float) -> ThreadingHTTPServer:
+    """Start a stub PostgREST that accepts upserts on any table"""
+    
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            rows = body.count(b'"fid"')
+            time.sleep(latency + rows * row_cost)
+            self.send_response(201)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"[]")
+        
+        def log_message(self, *args):
+            pass
+    
+    class StubServer(ThreadingHTTPServer):
+        daemon_threads = True
+    
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def build_edges(count: int) -> list:
+    """Synthetic cast_edges rows"""
+    return [
+        {
+            "fid": str(1000 + i % 5000),
+            "cast_id": f"0x{i:040x}",
+            "edge_type": "POSTED",
+            "created_at": "2025-01-01T00:00:00",
+        }
+        for i in range(count)
+    ]
+
+async def run_sequential(client, rows: list, batch_size: int) -> float:
+    """Old behaviour: one upsert at a time with a fixed pause after each"""
+    started = time.perf_counter()
+    for i in range(0, len(rows), batch_size):
+        client.table("cast_edges").upsert(rows[i:i + batch_size]).execute()
+        await asyncio.sleep(0.1)
+    return len(rows) / (time.perf_counter() - started)
+
+async def run_pipelined(client, frame: pl.DataFrame, batch_size: int, max_in_flight: int) -> float:
+    """Pipelined writer with adaptive batch sizes, sending DataFrame slices as JSON bytes"""
+    session = client.postgrest.session
+    
+    def send(offset: int, size: int) -> int:
+        upsert_json(session, "cast_edges", frame.slice(offset, size).write_json().encode())
+        return size
+    
+    started = time.perf_counter()
+    await run_pipelined_upserts(
+        frame.height,
+        send,
+        batch_size=batch_size,
+        row_bytes=estimate_row_bytes(frame),
+        max_in_flight=max_in_flight
+    )
+    return frame.height / (time.perf_counter() - started)
+
+async def main(args: argparse.Namespace) -> None:
+    server = start_stub_postgrest(args.latency, args.row_cost)
+    client = create_client(f"http://127.0.0.1:{server.server_address[1]}", STUB_KEY)
+    rows = build_edges(args.rows)
+    
+    print(f"\n=== UPSERT PIPELINE BENCHMARK ===")
+    print(f"Rows: {args.rows} | initial batch: {args.batch_size} | stub latency: {args.latency * 1000:.0f}ms + {args.row_cost * 1e6:.0f}µs/row\n")
+    print(f"{'Mode':<16} {'Rows/sec':>10} {'Speedup':>9}")
+    print(f"{'-'*16} {'-'*10} {'-'*9}")
+    
+    baseline = await run_sequential(client, rows, args.batch_size)
+    print(f"{'sequential':<16} {baseline:>10.0f} {1.0:>8.1f}x")
+    
+    frame = pl.DataFrame(rows)
+    for level in args.levels:
+        rate = await run_pipelined(client, frame, args.batch_size, level)
+        print(f"{f'pipelined x{level}':<16} {rate:>10.0f} {rate / baseline:>8.1f}x")
+    
+    server.shutdown()
+    print("=================================\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark pipelined upserts against a stub PostgREST server")
+    parser.add_argument("--rows", type=int, default=50000, help="Rows upserted per mode")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Initial (sequential: fixed) batch size")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub round-trip delay in seconds")
+    parser.add_argument("--row-cost", type=float, default=0.00002, help="Stub per-row cost in seconds")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 8], help="In-flight upserts to test")
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -3,6 +3,11 @@
 -- query name: Music Casts Edges
 -- query link: https://dune.com/queries/4937382
 
+-- Define parameters
+-- @start_time datetime      (inclusive)
+-- @end_time datetime        (exclusive)
+-- @cast_start_time datetime oldest cast a reaction in the window may target
+
 WITH spam_users AS (
     SELECT fid
     FROM query_4752413
@@ -26,7 +31,9 @@ user_profiles AS (
     FROM dune.neynar.dataset_farcaster_profile_with_addresses p
     LEFT JOIN latest_fnames f ON p.fid = f.fid AND f.rn = 1  -- Join only with most recent fname
 ),
-base_casts AS (
+channel_casts AS (
+    -- Channel casts from the start of the whole import: reactions in this window
+    -- may target casts from earlier windows/partitions
     SELECT
         c.hash as cast_hash,
         c.fid as author_fid,
@@ -49,8 +56,30 @@ base_casts AS (
     )
     AND c.deleted_at IS NULL
     AND s.fid IS NULL
-    AND c.created_at >= TIMESTAMP '{{start_time}}'
-    AND c.created_at <= TIMESTAMP '{{end_time}}'
+    AND c.created_at >= TIMESTAMP '{{cast_start_time}}'
+    AND c.created_at < TIMESTAMP '{{end_time}}'
+),
+base_casts AS (
+    SELECT *
+    FROM channel_casts
+    WHERE cast_created_at >= TIMESTAMP '{{start_time}}'
+),
+window_reactions AS (
+    SELECT r.*
+    FROM dune.neynar.dataset_farcaster_reactions r
+    LEFT JOIN spam_users s ON r.fid = s.fid
+    WHERE r.deleted_at IS NULL
+    AND s.fid IS NULL
+    AND r.created_at >= TIMESTAMP '{{start_time}}'
+    AND r.created_at < TIMESTAMP '{{end_time}}'
+),
+reacted_casts AS (
+    -- Earlier casts reacted to in this window: their AUTHORED edges come along
+    -- so the cast node exists before the reaction edges that reference it
+    SELECT c.*
+    FROM channel_casts c
+    WHERE c.cast_created_at < TIMESTAMP '{{start_time}}'
+    AND c.cast_hash IN (SELECT target_hash FROM window_reactions)
 ),
 reply_casts AS (
     SELECT
@@ -79,7 +108,7 @@ reply_casts AS (
     AND c.deleted_at IS NULL
     AND s.fid IS NULL
     AND c.created_at >= TIMESTAMP '{{start_time}}'
-    AND c.created_at <= TIMESTAMP '{{end_time}}'
+    AND c.created_at < TIMESTAMP '{{end_time}}'
 ),
 authored_edges AS (
     SELECT 
@@ -95,7 +124,11 @@ authored_edges AS (
         b.cast_text,  -- Include cast text in results
         b.cast_embeds,  -- Include embeds in results
         b.cast_channel  -- Include channel in results
-    FROM base_casts b
+    FROM (
+        SELECT * FROM base_casts
+        UNION ALL
+        SELECT * FROM reacted_casts
+    ) b
     LEFT JOIN user_profiles p ON b.author_fid = p.fid
 ),
 reaction_edges AS (
@@ -115,14 +148,9 @@ reaction_edges AS (
         CAST(NULL AS VARCHAR) as cast_text,  -- Explicitly cast NULL
         CAST(NULL AS VARCHAR) as cast_embeds, -- Explicitly cast NULL
         CAST(NULL AS VARCHAR) as cast_channel -- Explicitly cast NULL
-    FROM dune.neynar.dataset_farcaster_reactions r
-    LEFT JOIN spam_users s ON r.fid = s.fid
+    FROM window_reactions r
     LEFT JOIN user_profiles p ON r.fid = p.fid
-    JOIN base_casts c ON r.target_hash = c.cast_hash
-    WHERE r.deleted_at IS NULL
-    AND s.fid IS NULL
-    AND r.created_at >= TIMESTAMP '{{start_time}}'
-    AND r.created_at <= TIMESTAMP '{{end_time}}'
+    JOIN channel_casts c ON r.target_hash = c.cast_hash
 ),
 reply_edges AS (
     SELECT 
@@ -150,4 +178,4 @@ all_edges AS (
 )
 SELECT *
 FROM all_edges
-ORDER BY created_at DESC;
+ORDER BY created_at, cast_id, edge_type, source_user_id;  -- Same total order as CAST_EDGES_SORT_BY
@@ -4,7 +4,7 @@
 
 -- Define parameters
 -- @start_time datetime
--- @end_time datetime
+-- @end_time datetime (exclusive)
 
 WITH spam_users AS (
     SELECT fid
@@ -27,7 +27,7 @@ music_casts AS (
     AND c.deleted_at IS NULL
     AND s.fid IS NULL
     AND c.created_at >= TIMESTAMP '{{start_time}}'
-    AND c.created_at <= TIMESTAMP '{{end_time}}'
+    AND c.created_at < TIMESTAMP '{{end_time}}'
     AND (c.embeds IS NOT NULL OR c.text IS NOT NULL)
 ),
 -- Extract structured embeds (existing logic)
@@ -173,4 +173,4 @@ SELECT
     created_at
 FROM final_with_index
 WHERE embed_type != 'unknown'
-ORDER BY cast_hash, embed_index;
\ No newline at end of file
+ORDER BY created_at, cast_hash, embed_index;  -- Same total order as CAST_EMBEDS_SORT_BY
\ No newline at end of file
@@ -4,6 +4,7 @@ Jamzy Graph Import - Modular Pipeline
 This module provides modular functions for importing Jamzy graph data:
 - process_jamzy_edges_and_nodes: Process all graph edges and nodes, including users, casts, and reactions
 - process_embeds: Process cast embeds
+- import_jamzy_data: Run both, optionally as concurrent, checkpointed day/hour partitions
 
 Each function is self-contained and handles its own referential integrity. The edge
 processing is smart enough to extract and insert complete cast data from the edge query,
@@ -17,14 +18,18 @@ from dotenv import load_dotenv
 load_dotenv()
 import polars as pl
 import asyncio
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timezone, timedelta
-from data.pipelines.data_importer.lib.dune import batch_fetch_dune
-from data.pipelines.data_importer.lib.data_cleaning import (
-    polars_clean_text,
-    ensure_valid_timestamps,
-    normalize_cast_ids,
-    format_timestamps
+from data.lib.db import get_checkpoint, set_checkpoint
+from data.pipelines.data_importer.lib.dune import (
+    CAST_EDGES_SORT_BY,
+    CAST_EMBEDS_SORT_BY,
+    DUNE_PAGE_ROWS,
+    batch_fetch_dune,
+    stream_dune_pages
 )
+from data.pipelines.data_importer.lib.fingerprints import get_fingerprint_store
+from data.pipelines.data_importer.lib.table_specs import prepare_table
 from data.pipelines.data_importer.lib.db import (
     insert_user_nodes,
     insert_cast_nodes,
@@ -32,41 +37,22 @@ from data.pipelines.data_importer.lib.db import (
     insert_embeds
 )
 
-@flow(name="Process Jamzy Graph Data")
-async def process_edges(testing: bool = False, start_time: str = None, end_time: str = None):
+CHECKPOINT_PIPELINE = "data_importer"
+DUNE_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+PARTITION_SIZES = {
+    "day": timedelta(days=1),
+    "hour": timedelta(hours=1),
+}
+DEFAULT_PARTITION_WORKERS = 4
+# Dune's Farcaster tables trail real time; newer partitions are re-imported on the next run
+PARTITION_SETTLE_TIME = timedelta(days=1)
+
+async def import_edge_chunk(edge_df: pl.DataFrame, testing: bool = False) -> Dict[str, int]:
     """
-    Process complete Jamzy graph data including users, casts, and reactions:
-    1. Fetch reaction edges with user info
-    2. Extract users and insert them
-    3. Extract complete cast data from the edges and insert casts
-    4. Insert reactions
-    
-    This function provides a comprehensive solution for processing all graph elements in one step.
-    
-    Args:
-        testing: If True, only process ~100 reactions for testing purposes and skip DB insertion
-        start_time: Optional start time for the data import
-        end_time: Optional end time for the data import
+    Clean, dedup and insert one chunk of edge rows: users, then casts from
+    AUTHORED/REPLIED edges, then the edges themselves. Each table is cleaned
+    by one lazy plan from its TableSpec.
     """
-    print("\n=== PROCESSING COMPLETE JAMZY GRAPH DATA ===\n")
-
-    dune_params = {
-        "start_time": start_time,
-        "end_time": end_time
-    }
-    
-    # STEP 1: Fetch all edges from Dune
-    edge_df = batch_fetch_dune(
-        query_id=4937382,  # music_cast_edges
-        params=dune_params,
-        api_key=os.environ.get("DUNE_API_KEY")
-    )
-    
-    print(f"Fetched {edge_df.shape[0]} edges with user info")
-    if edge_df.shape[0] == 0:
-        print("No reactions to process")
-        return {"reactions": 0, "reactors": 0}
-    
     # Limit to ~100 rows if in testing mode
     if testing and edge_df.shape[0] > 100:
         print(f"TESTING MODE: Limiting to 100 reactions (out of {edge_df.shape[0]})")
@@ -75,77 +61,58 @@ async def process_edges(testing: bool = False, start_time: str = None, end_time:
     # Debug data types of key columns
     print(f"Column types: {edge_df.schema}")
     print(f"Sample edge data: {edge_df.head(3)}")
+    edges = edge_df.lazy()
     
     # STEP 2: Extract and insert user data
-    # First, extract source users
-    source_users_df = edge_df.select([
+    # Source users come with profile details; target users only have IDs, but must
+    # exist in the database too. Source rows go first so dedup keeps their details.
+    source_users = edges.select([
         pl.col('source_user_id').alias('node_id'),
         pl.col('user_fname').alias('fname'),
         pl.col('user_display_name').alias('display_name'),
         pl.col('user_avatar_url').alias('avatar_url')
     ])
-    
-    # We need to also extract target users, but the query doesn't provide their details
-    # So just grab the IDs to ensure they exist in the database
-    target_user_ids = edge_df.select([
-        pl.col('target_user_id').alias('node_id')
-    ]).unique('node_id')
-    
-    # Add missing columns to target_user_ids to match source_users_df
-    for col in source_users_df.columns:
-        if col not in target_user_ids.columns and col != 'node_id':
-            target_user_ids = target_user_ids.with_columns(pl.lit("").alias(col))
-    
-    # Combine source and target users, keeping all columns from source_users_df
-    # Use 'vertical' for stacking dataframes and then deduplicate
-    user_df = pl.concat([source_users_df, target_user_ids], how="vertical")
-    user_df = user_df.unique('node_id')
+    target_users = edges.select(pl.col('target_user_id').alias('node_id'))
+    user_df = prepare_table(pl.concat([source_users, target_users], how="diagonal"), 'user_nodes')
     
     print(f"Extracted {user_df.shape[0]} unique users (including source and target)")
-    
-    # Clean text data for user fields
-    text_columns = ['fname', 'display_name', 'avatar_url']
-    user_df = polars_clean_text(user_df, text_columns)
     print(f"User sample after cleaning: {user_df.head(3)}")
     
+    # Only send profiles that are new or changed since this worker last loaded them;
+    # placeholder (ID-only) users are inserted if absent so they never blank out a profile
+    fingerprints = get_fingerprint_store()
+    profile_df, placeholder_df = fingerprints.split_changed(user_df)
+    skipped = user_df.shape[0] - profile_df.shape[0] - placeholder_df.shape[0]
+    print(f"👤 {profile_df.shape[0]} new/changed profiles, {placeholder_df.shape[0]} new placeholder users, {skipped} unchanged (skipped)")
+    
     # Insert users
-    print(f"Inserting {user_df.shape[0]} users")
     if not testing:
-        await insert_user_nodes(user_df, batch_size=5000)
+        stored_profiles = await insert_user_nodes(profile_df.drop('fingerprint'), batch_size=5000)
+        stored_placeholders = await insert_user_nodes(placeholder_df.drop('fingerprint'), batch_size=5000, ignore_duplicates=True)
+        # Dead-lettered users aren't remembered, so the next import sends them again
+        fingerprints.record(profile_df.join(stored_profiles.select('node_id'), on='node_id', how='semi'))
+        fingerprints.record(placeholder_df.join(stored_placeholders.select('node_id'), on='node_id', how='semi'))
     else:
-        print(f"TESTING MODE: Skipping database insertion of {user_df.shape[0]} users")
-    
-    # STEP 3: Extract and insert complete cast data from AUTHORED edges
-    # Filter to just the AUTHORED edges which contain full cast data
-    authored_edges = edge_df.filter(pl.col('edge_type') == 'AUTHORED')
-    print(f"Found {authored_edges.shape[0]} AUTHORED edges with complete cast data")
-    
-    # Also extract REPLIED edges which contain reply cast data
-    replied_edges = edge_df.filter(pl.col('edge_type') == 'REPLIED')
-    print(f"Found {replied_edges.shape[0]} REPLIED edges with reply cast data")
-    
-    # Combine authored and replied edges to get all casts that need to be inserted
-    cast_source_edges = pl.concat([authored_edges, replied_edges], how="vertical")
-    print(f"Total edges with cast data: {cast_source_edges.shape[0]}")
-    
-    if cast_source_edges.shape[0] > 0:
-        # Create a dataframe with all cast data
-        cast_df = cast_source_edges.select([
-            pl.col('cast_id').alias('node_id'),
-            pl.col('source_user_id').alias('author_fid'),
-            pl.col('created_at'),
-            pl.col('cast_text'),
-            pl.col('cast_channel'),
-            # Uncomment if cast_embeds is needed
-            # pl.col('cast_embeds'),
-        ]).unique('node_id')
-        
-        # Clean text data for cast fields
-        text_columns = ['cast_text']
-        cast_df = polars_clean_text(cast_df, text_columns)
-        
-        # Format timestamps
-        cast_df = format_timestamps(cast_df, ['created_at'])
+        print(f"TESTING MODE: Skipping database insertion of {profile_df.shape[0] + placeholder_df.shape[0]} users")
+    
+    # STEP 3: Extract and insert complete cast data from AUTHORED and REPLIED edges,
+    # which carry the full cast data
+    edge_type_counts = dict(edge_df.group_by('edge_type').len().iter_rows())
+    authored_count = edge_type_counts.get('AUTHORED', 0)
+    replied_count = edge_type_counts.get('REPLIED', 0)
+    print(f"Found {authored_count} AUTHORED and {replied_count} REPLIED edges with cast data")
+    
+    if authored_count + replied_count > 0:
+        cast_df = prepare_table(
+            edges.filter(pl.col('edge_type').is_in(['AUTHORED', 'REPLIED'])).select([
+                pl.col('cast_id').alias('node_id'),
+                pl.col('source_user_id').alias('author_fid'),
+                pl.col('created_at'),
+                pl.col('cast_text'),
+                pl.col('cast_channel'),
+            ]),
+            'cast_nodes'
+        )
         
         print(f"Extracted {cast_df.shape[0]} unique casts with complete data")
         print(f"Cast sample: {cast_df.head(3)}")
@@ -158,23 +125,8 @@ async def process_edges(testing: bool = False, start_time: str = None, end_time:
     else:
         print("No cast-containing edges found, skipping cast insertion")
     
-    # STEP 4: Create a clean edge dataframe with only necessary columns
-    edge_insert_df = edge_df.select([
-        pl.col('source_user_id'),
-        pl.col('target_user_id'),
-        pl.col('cast_id'),
-        pl.col('edge_type'),
-        pl.col('created_at')
-    ])
-    
-    print("Edge data sample before processing:")
-    print(edge_insert_df.head(3))
-    
-    # Format timestamps
-    edge_insert_df = format_timestamps(edge_insert_df, ['created_at'])
-    
-    # Normalize cast IDs
-    edge_insert_df = normalize_cast_ids(edge_insert_df, 'cast_id')
+    # STEP 4: Clean the edges themselves (only the cast_edges columns)
+    edge_insert_df = prepare_table(edges, 'cast_edges')
     
     # Insert edges
     if edge_insert_df.shape[0] == 0:
@@ -203,44 +155,90 @@ async def process_edges(testing: bool = False, start_time: str = None, end_time:
     else:
         print(f"TESTING MODE: Skipping database insertion of {edge_insert_df.shape[0]} edges")
     
-    print("\n=== GRAPH DATA PROCESSING COMPLETE ===\n")
     return {
         "reactions": edge_insert_df.shape[0], 
         "reactors": user_df.shape[0], 
-        "casts": cast_source_edges.shape[0],
-        "authored": authored_edges.shape[0],
-        "replies": replied_edges.shape[0]
+        "casts": authored_count + replied_count,
+        "authored": authored_count,
+        "replies": replied_count
     }
 
-@flow(name="Process Cast Embeds")
-async def process_embeds(testing: bool = False, start_time: str = None, end_time: str = None):
+@flow(name="Process Jamzy Graph Data")
+async def process_edges(
+    testing: bool = False,
+    start_time: str = None,
+    end_time: str = None,
+    page_rows: Optional[int] = None,
+    cast_start_time: Optional[str] = None
+):
     """
-    Process cast embeds (music links, etc.)
+    Process complete Jamzy graph data including users, casts, and reactions:
+    1. Fetch reaction edges with user info
+    2. Extract users and insert them
+    3. Extract complete cast data from the edges and insert casts
+    4. Insert reactions
+    
+    This function provides a comprehensive solution for processing all graph elements in one step.
     
     Args:
-        testing: If True, only process ~100 embeds for testing purposes and skip DB insertion
-        start_time: Optional start time for the data import
-        end_time: Optional end time for the data import
+        testing: If True, only process ~100 reactions for testing purposes and skip DB insertion
+        start_time: Optional start time for the data import (inclusive)
+        end_time: Optional end time for the data import (exclusive)
+        page_rows: Stream results in pages of this many rows (oldest first) and
+            clean/insert each page while the next one downloads; None loads the
+            whole result at once
+        cast_start_time: Oldest cast a reaction in the window may target
+            (default start_time); partitions pass the start of the whole import
     """
-    print("\n=== PROCESSING CAST EMBEDS ===\n")
+    print("\n=== PROCESSING COMPLETE JAMZY GRAPH DATA ===\n")
     
     dune_params = {
         "start_time": start_time,
-        "end_time": end_time
+        "end_time": end_time,
+        "cast_start_time": cast_start_time or start_time
     }
     
-    # Fetch all cast embeds from Dune
-    embed_df = batch_fetch_dune(
-        query_id=4968426,  # music_cast_embeds
+    if page_rows:
+        # Streaming mode: one Dune execution, read page by page in created_at order
+        # so casts are inserted before the reactions that reference them
+        results = {"reactions": 0, "reactors": 0, "casts": 0, "authored": 0, "replies": 0}
+        async for edge_df in stream_dune_pages(
+            4937382,  # music_cast_edges
+            params=dune_params,
+            api_key=os.environ.get("DUNE_API_KEY"),
+            page_rows=page_rows,
+            sort_by=CAST_EDGES_SORT_BY
+        ):
+            print(f"📦 Fetched page of {edge_df.shape[0]} edges with user info")
+            page_results = await import_edge_chunk(edge_df, testing=testing)
+            for key, value in page_results.items():
+                results[key] = results.get(key, 0) + value
+            
+            if testing:
+                break
+        
+        print("\n=== GRAPH DATA PROCESSING COMPLETE ===\n")
+        return results
+    
+    # STEP 1: Fetch all edges from Dune
+    edge_df = batch_fetch_dune(
+        query_id=4937382,  # music_cast_edges
         params=dune_params,
         api_key=os.environ.get("DUNE_API_KEY")
     )
     
-    print(f"Fetched {embed_df.shape[0]} cast embeds")
-    if embed_df.shape[0] == 0:
-        print("No embeds to process")
-        return {"embeds": 0}
+    print(f"Fetched {edge_df.shape[0]} edges with user info")
+    if edge_df.shape[0] == 0:
+        print("No reactions to process")
+        return {"reactions": 0, "reactors": 0}
     
+    results = await import_edge_chunk(edge_df, testing=testing)
+    
+    print("\n=== GRAPH DATA PROCESSING COMPLETE ===\n")
+    return results
+
+async def import_embed_chunk(embed_df: pl.DataFrame, testing: bool = False) -> Dict[str, int]:
+    """Clean and insert one chunk of embed rows"""
     # Limit to ~100 rows if in testing mode
     if testing and embed_df.shape[0] > 100:
         print(f"TESTING MODE: Limiting to 100 embeds (out of {embed_df.shape[0]})")
@@ -249,7 +247,7 @@ async def process_embeds(testing: bool = False, start_time: str = None, end_time
     # Debug data types of key columns
     print(f"Column types: {embed_df.schema}")
     print(f"Sample embed data: {embed_df.head(3)}")
-
+    
     # Map cast_hash to cast_id if needed (Dune may return cast_hash but our table expects cast_id)
     if 'cast_hash' in embed_df.columns and 'cast_id' not in embed_df.columns:
         print("Mapping cast_hash to cast_id for schema compatibility")
@@ -258,24 +256,11 @@ async def process_embeds(testing: bool = False, start_time: str = None, end_time
         print("Both cast_hash and cast_id present, dropping cast_hash")
         embed_df = embed_df.drop('cast_hash')
     
-    # Clean text data for embed fields
-    text_columns = ['embed_url']
-    if 'embed_type' in embed_df.columns:
-        text_columns.append('embed_type')
-    
-    print(f"Cleaning text data for embed fields: {text_columns}")
-    embed_df = polars_clean_text(embed_df, text_columns)
+    # Clean in one pass from the embeds TableSpec
+    embed_df = prepare_table(embed_df, 'embeds')
     
     # Print sample after cleaning
-    print(f"Sample after text cleaning: {embed_df.head(3)}")
-    
-    # Format timestamps
-    timestamp_cols = ['created_at']
-    embed_df = format_timestamps(embed_df, timestamp_cols)
-    
-    # Print sample after timestamp validation
-    print("Sample after timestamp validation:")
-    print(embed_df.select(timestamp_cols).head(3))
+    print(f"Sample after cleaning: {embed_df.head(3)}")
     
     # Insert all embeds at once - the insert_embeds function already handles batching
     print(f"Inserting {embed_df.shape[0]} embeds")
@@ -284,26 +269,226 @@ async def process_embeds(testing: bool = False, start_time: str = None, end_time
     else:
         print(f"TESTING MODE: Skipping database insertion of {embed_df.shape[0]} embeds")
     
-    print("\n=== EMBED PROCESSING COMPLETE ===\n")
     return {"embeds": embed_df.shape[0]}
 
+@flow(name="Process Cast Embeds")
+async def process_embeds(
+    testing: bool = False,
+    start_time: str = None,
+    end_time: str = None,
+    page_rows: Optional[int] = None
+):
+    """
+    Process cast embeds (music links, etc.)
+    
+    Args:
+        testing: If True, only process ~100 embeds for testing purposes and skip DB insertion
+        start_time: Optional start time for the data import
+        end_time: Optional end time for the data import
+        page_rows: Stream results in pages of this many rows and insert each page
+            while the next one downloads; None loads the whole result at once
+    """
+    print("\n=== PROCESSING CAST EMBEDS ===\n")
+    
+    dune_params = {
+        "start_time": start_time,
+        "end_time": end_time
+    }
+    
+    if page_rows:
+        # Streaming mode: one Dune execution, read page by page
+        results = {"embeds": 0}
+        async for embed_df in stream_dune_pages(
+            4968426,  # music_cast_embeds
+            params=dune_params,
+            api_key=os.environ.get("DUNE_API_KEY"),
+            page_rows=page_rows,
+            sort_by=CAST_EMBEDS_SORT_BY
+        ):
+            print(f"📦 Fetched page of {embed_df.shape[0]} cast embeds")
+            page_results = await import_embed_chunk(embed_df, testing=testing)
+            results["embeds"] += page_results["embeds"]
+            
+            if testing:
+                break
+        
+        print("\n=== EMBED PROCESSING COMPLETE ===\n")
+        return results
+    
+    # Fetch all cast embeds from Dune
+    embed_df = batch_fetch_dune(
+        query_id=4968426,  # music_cast_embeds
+        params=dune_params,
+        api_key=os.environ.get("DUNE_API_KEY")
+    )
+    
+    print(f"Fetched {embed_df.shape[0]} cast embeds")
+    if embed_df.shape[0] == 0:
+        print("No embeds to process")
+        return {"embeds": 0}
+    
+    results = await import_embed_chunk(embed_df, testing=testing)
+    
+    print("\n=== EMBED PROCESSING COMPLETE ===\n")
+    return results
+
+def partition_window(start_time: str, end_time: str, partition: str = "day") -> List[Tuple[str, str]]:
+    """
+    Split [start_time, end_time) into consecutive half-open partitions aligned
+    to whole days/hours, so partition bounds (and checkpoint keys) are the same
+    across runs and a row on a bound belongs to exactly one partition. Only the
+    first and last partition may be clipped.
+    """
+    size = PARTITION_SIZES[partition]
+    start = datetime.strptime(start_time, DUNE_TIME_FORMAT)
+    end = datetime.strptime(end_time, DUNE_TIME_FORMAT)
+    
+    bound = start.replace(minute=0, second=0, microsecond=0)
+    if partition == "day":
+        bound = bound.replace(hour=0)
+    
+    partitions = []
+    while bound < end:
+        next_bound = bound + size
+        partitions.append((
+            max(bound, start).strftime(DUNE_TIME_FORMAT),
+            min(next_bound, end).strftime(DUNE_TIME_FORMAT)
+        ))
+        bound = next_bound
+    return partitions
+
+def partition_checkpoint_key(step: str, start_time: str, end_time: str) -> str:
+    """Checkpoint key of one import step (edges/embeds) of one partition"""
+    return f"{step}:{start_time}/{end_time}"
+
+def is_partition_settled(end_time: str) -> bool:
+    """Whether a partition is old enough that Dune has all of its rows"""
+    end = datetime.strptime(end_time, DUNE_TIME_FORMAT).replace(tzinfo=timezone.utc)
+    return end <= datetime.now(timezone.utc) - PARTITION_SETTLE_TIME
+
+async def run_partition_step(
+    step: str,
+    start_time: str,
+    end_time: str,
+    testing: bool,
+    page_rows: int,
+    resume: bool,
+    cast_start_time: Optional[str] = None
+) -> Dict[str, int]:
+    """Run one import step for one partition unless it is already checkpointed"""
+    key = partition_checkpoint_key(step, start_time, end_time)
+    if resume and not testing:
+        checkpoint = get_checkpoint(CHECKPOINT_PIPELINE, key)
+        if checkpoint:
+            print(f"⏭️ {step} {start_time} → {end_time} already imported at {checkpoint.get('completed_at')}")
+            return {}
+    
+    if step == "edges":
+        results = await process_edges(
+            testing=testing,
+            start_time=start_time,
+            end_time=end_time,
+            page_rows=page_rows,
+            cast_start_time=cast_start_time
+        )
+    else:
+        results = await process_embeds(
+            testing=testing,
+            start_time=start_time,
+            end_time=end_time,
+            page_rows=page_rows
+        )
+    
+    # Checkpoint only partitions Dune has caught up with
+    if not testing and is_partition_settled(end_time):
+        set_checkpoint(CHECKPOINT_PIPELINE, key, {
+            'completed_at': datetime.now(timezone.utc).replace(tzinfo=None).isoformat(),
+            'rows': results
+        })
+    return results
+
+async def import_partitions(
+    partitions: List[Tuple[str, str]],
+    run_edges: bool,
+    run_embeds: bool,
+    testing: bool,
+    page_rows: int,
+    workers: int,
+    resume: bool,
+    cast_start_time: Optional[str] = None
+) -> Tuple[Dict[str, int], List[Tuple[str, str]]]:
+    """
+    Import partitions with up to `workers` running at once. Within a partition
+    embeds follow edges (embeds reference cast_nodes); across partitions the
+    steps overlap. A failed partition doesn't stop the others and stays
+    un-checkpointed, so the next run retries just that partition.
+    
+    Reactions are matched to casts from cast_start_time on (default: the
+    first partition's start), not just their own partition's casts.
+    
+    Returns the summed results and the failed partitions.
+    """
+    if partitions and not cast_start_time:
+        cast_start_time = partitions[0][0]
+    semaphore = asyncio.Semaphore(workers)
+    results: Dict[str, int] = {}
+    failed: List[Tuple[str, str]] = []
+    
+    async def import_partition(start_time: str, end_time: str):
+        async with semaphore:
+            try:
+                partition_results = {}
+                if run_edges:
+                    partition_results.update(await run_partition_step(
+                        "edges", start_time, end_time, testing, page_rows, resume, cast_start_time
+                    ))
+                if run_embeds:
+                    partition_results.update(await run_partition_step(
+                        "embeds", start_time, end_time, testing, page_rows, resume
+                    ))
+            except Exception as e:
+                print(f"❌ Partition {start_time} → {end_time} failed: {str(e)}", flush=True)
+                failed.append((start_time, end_time))
+                return
+            
+            for key, value in partition_results.items():
+                results[key] = results.get(key, 0) + value
+            print(f"✅ Partition {start_time} → {end_time} done", flush=True)
+    
+    await asyncio.gather(*(import_partition(start, end) for start, end in partitions))
+    return results, sorted(failed)
+
 @flow(name="Jamzy Data Import")
 async def import_jamzy_data(
     run_edges: bool = True, 
     run_embeds: bool = True, 
     testing: bool = False, 
     start_time: str = None, 
-    end_time: str = None
+    end_time: str = None,
+    page_rows: Optional[int] = None,
+    partition: Optional[str] = None,
+    workers: int = DEFAULT_PARTITION_WORKERS,
+    resume: bool = True
 ):
     """
     Orchestration flow that runs one or both Jamzy data import processes.
     
+    With `partition` set, the range is split into day or hour partitions that
+    are imported concurrently and checkpointed one by one, so a rerun only
+    imports partitions that haven't completed. Reactions are matched to any
+    cast since start_time, so reactions to casts from earlier partitions are
+    kept (see cast_edges.sql).
+    
     Args:
         run_edges: Whether to run the edge/graph data import
         run_embeds: Whether to run the embeds data import
         testing: If True, only process ~100 items for testing purposes and skip DB insertion
-        start_time: Optional start time for the data import
-        end_time: Optional end time for the data import
+        start_time: Optional start time for the data import (inclusive)
+        end_time: Optional end time for the data import (exclusive)
+        page_rows: If set, stream Dune results in pages of this many rows
+        partition: 'day' or 'hour' to import the range in partitions; None runs one window
+        workers: Number of partitions imported at once
+        resume: Skip partitions checkpointed by earlier runs
     
     Returns:
         Dictionary with summary of processed items
@@ -321,23 +506,44 @@ async def import_jamzy_data(
         if not end_time:
             end_time = tomorrow.strftime("%Y-%m-%d %H:%M:%S")  # Use tomorrow as the end date
     
+    failed_partitions = []
+    if partition:
+        partitions = partition_window(start_time, end_time, partition)
+        if testing:
+            partitions = partitions[:1]
+        print(f"\n=== IMPORTING {len(partitions)} {partition.upper()} PARTITIONS ({workers} at a time) ===\n")
+        
+        # Streamed pages raise on fetch errors, so a failed fetch can't be checkpointed as empty
+        results, failed_partitions = await import_partitions(
+            partitions,
+            run_edges=run_edges,
+            run_embeds=run_embeds,
+            testing=testing,
+            page_rows=page_rows or DUNE_PAGE_ROWS,
+            workers=workers,
+            resume=resume,
+            cast_start_time=start_time
+        )
+    
     # Process graph data if requested
-    if run_edges:
+    if run_edges and not partition:
         print("\n=== STARTING EDGE/GRAPH DATA IMPORT ===\n")
         edge_results = await process_edges(
             testing=testing,
             start_time=start_time, 
-            end_time=end_time
+            end_time=end_time,
+            page_rows=page_rows
         )
         results.update(edge_results)
     
     # Process embeds if requested
-    if run_embeds:
+    if run_embeds and not partition:
         print("\n=== STARTING EMBED DATA IMPORT ===\n")
         embed_results = await process_embeds(
             testing=testing,
             start_time=start_time, 
-            end_time=end_time
+            end_time=end_time,
+            page_rows=page_rows
         )
         results.update(embed_results)
     
@@ -352,20 +558,24 @@ async def import_jamzy_data(
         print(f"Processed {results.get('embeds', 0)} embeds")
     print("=============================\n")
     
+    if failed_partitions:
+        failed_list = ", ".join(f"{start} → {end}" for start, end in failed_partitions)
+        raise RuntimeError(f"{len(failed_partitions)} partitions failed (rerun to retry them): {failed_list}")
+    
     return results
 
 if __name__ == "__main__":
     # For local testing/execution
     print("""
     ========================================================================
-          
+           
            ██╗ █████╗ ███╗   ███╗███████╗██╗   ██╗
            ██║██╔══██╗████╗ ████║╚══███╔╝╚██╗ ██╔╝
            ██║███████║██╔████╔██║  ███╔╝  ╚████╔╝ 
       ██   ██║██╔══██║██║╚██╔╝██║ ███╔╝    ╚██╔╝  
       ╚█████╔╝██║  ██║██║ ╚═╝ ██║███████╗   ██║   
        ╚════╝ ╚═╝  ╚═╝╚═╝     ╚═╝╚══════╝   ╚═╝   
-                   
+             
              🎧 Data Import Pipeline 🎧
     ========================================================================
     
@@ -379,6 +589,7 @@ if __name__ == "__main__":
     - testing=True: Limit processing to ~100 entries of each type and skip DB insertion
     - run_edges=True/False: Control whether to process graph data
     - run_embeds=True/False: Control whether to process embed data
+    - partition='day'/'hour': Import in concurrent, resumable partitions
     ========================================================================
     """)
     
@@ -388,10 +599,13 @@ if __name__ == "__main__":
     # Control which processes to run
     run_edges_process = True
     run_embeds_process = True
-
+    
+    # Split the range into 'day' or 'hour' partitions (None = one window)
+    partition_size = None
+    
     today = datetime.now(timezone.utc)
     tomorrow = today + timedelta(days=1)
-
+    
     start_time = "2025-06-01 00:00:00"  
     end_time = tomorrow.strftime("%Y-%m-%d %H:%M:%S")  # Use tomorrow as the end date
     
@@ -401,7 +615,8 @@ if __name__ == "__main__":
         run_embeds=run_embeds_process,
         testing=testing_mode,
         start_time=start_time, 
-        end_time=end_time
+        end_time=end_time,
+        partition=partition_size
     ))
     
     # Ensure the script terminates properly
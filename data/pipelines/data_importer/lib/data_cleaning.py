@@ -4,6 +4,12 @@ from typing import List
 import re
 from datetime import datetime, timezone
 
+from data.lib.upsert_pipeline import write_dead_letters
+
+# Timestamps are stored as naive UTC at second precision
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+DATE_FORMAT = '%Y-%m-%d'  # Date-only values are taken as midnight UTC
+
 def clean_text_data(text):
     """Clean text data to remove or replace problematic characters"""
     if not text or not isinstance(text, str):
@@ -14,6 +20,67 @@ def clean_text_data(text):
     text = text.replace('\x00', '').strip()     # Remove null bytes
     return text
 
+def clean_text_expr(expr: pl.Expr) -> pl.Expr:
+    """Text cleaning as an expression: nulls to "", non-ASCII runs to spaces, no null bytes, stripped"""
+    return (
+        expr.fill_null("")
+        .str.replace_all(r'[^\x00-\x7F]+', ' ')
+        .str.replace_all('\x00', '')
+        .str.strip_chars()
+    )
+
+def cast_id_expr(expr: pl.Expr) -> pl.Expr:
+    """Cast ID normalization as an expression: lowercase, 0x prefix for alphanumeric IDs"""
+    cast_id = expr.str.to_lowercase()
+    return (
+        pl.when(~cast_id.str.starts_with('0x') & cast_id.str.contains(r'^[\p{L}\p{N}]+$'))
+          .then(pl.lit('0x') + cast_id)
+          .otherwise(cast_id)
+    )
+
+def timestamp_expr(col: str, dtype: pl.DataType, default: datetime) -> pl.Expr:
+    """
+    Expression converting a timestamp column to a naive UTC Datetime at second
+    precision, with nulls and empty strings set to default. Date-only strings
+    become midnight; any other string that isn't a timestamp becomes null, never
+    default - see drop_unparsed_timestamps.
+    """
+    default = pl.lit(default, dtype=pl.Datetime('us'))
+    if isinstance(dtype, pl.Datetime):
+        parsed = pl.col(col)
+        if dtype.time_zone:
+            parsed = parsed.dt.convert_time_zone('UTC').dt.replace_time_zone(None)
+        return parsed.dt.truncate('1s').fill_null(default).alias(col)
+    
+    # '2025-01-01T10:00:00.123Z' / '2025-01-01 10:00:00.000 UTC' -> '2025-01-01 10:00:00'
+    text = pl.col(col).cast(pl.Utf8).str.strip_chars()
+    normalized = text.str.replace('T', ' ', literal=True).str.slice(0, 19)
+    parsed = pl.coalesce(
+        normalized.str.to_datetime(TIMESTAMP_FORMAT, time_unit='us', strict=False),
+        normalized.str.to_datetime(DATE_FORMAT, time_unit='us', strict=False)
+    )
+    missing = text.is_null() | (text.str.len_bytes() == 0)
+    return pl.when(missing).then(default).otherwise(parsed.dt.truncate('1s')).alias(col)
+
+def drop_unparsed_timestamps(df: pl.DataFrame, timestamp_cols: List[str], table_name: str) -> pl.DataFrame:
+    """
+    Drop rows whose timestamp couldn't be parsed (null after timestamp_expr)
+    and write them to the table's dead-letter file
+    """
+    timestamp_cols = [col for col in timestamp_cols if col in df.columns]
+    if df.is_empty() or not timestamp_cols:
+        return df
+    
+    unparsed = pl.any_horizontal([pl.col(col).is_null() for col in timestamp_cols])
+    rejected = df.filter(unparsed)
+    if rejected.is_empty():
+        return df
+    
+    error = ValueError(f"Unparseable timestamp in {', '.join(timestamp_cols)}")
+    path = write_dead_letters(table_name, [(record, error) for record in rejected.iter_rows(named=True)])
+    print(f"⚠️ {rejected.height} {table_name} rows with unparseable timestamps - written to {path}", flush=True)
+    return df.filter(~unparsed)
+
 def ensure_valid_timestamps(df: pl.DataFrame, timestamp_cols: List[str]) -> pl.DataFrame:
     """
     Ensure all timestamp columns have valid values for database insertion
@@ -23,31 +90,19 @@ def ensure_valid_timestamps(df: pl.DataFrame, timestamp_cols: List[str]) -> pl.D
         timestamp_cols: List of column names containing timestamps
     
     Returns:
-        Dataframe with validated timestamps
+        Dataframe with Datetime timestamps (missing values set to the current time,
+        unparseable ones null)
     """
     if df.is_empty() or not timestamp_cols:
         return df
     
-    # Create current timestamp to use as default
-    current_time = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    # Current time is the default for missing timestamps
+    current_time = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
     
     for col in timestamp_cols:
         if col in df.columns:
-            # Simply replace empty strings and nulls with current time,
-            # but preserve all other original timestamp values
-            df = df.with_columns([
-                pl.when(
-                    (pl.col(col) == "") | pl.col(col).is_null()
-                ).then(
-                    pl.lit(current_time)
-                ).otherwise(
-                    # Keep the original timestamp, just standardize format
-                    pl.col(col)
-                      .str.replace('T', ' ')
-                      .str.replace('Z', '')
-                      .str.slice(0, 19)  # Take just yyyy-mm-dd hh:mm:ss portion
-                ).alias(col)
-            ])
+            # A no-op apart from null filling once format_timestamps has run
+            df = df.with_columns(timestamp_expr(col, df.schema[col], current_time))
             
             # Print a sample of the timestamps to verify
             print(f"Sample timestamps after processing {col}:", flush=True)
@@ -74,14 +129,7 @@ def polars_clean_text(df: pl.DataFrame, columns: list[str]) -> pl.DataFrame:
     for col in columns:
         if col in df.columns:
             # Use string operations instead of map_elements to avoid shape issues
-            df = df.with_columns(
-                pl.col(col)
-                .fill_null("")  # Replace nulls with empty strings
-                .str.replace_all(r'[^\x00-\x7F]+', ' ')  # Replace non-ASCII chars with spaces
-                .str.replace_all('\x00', '')  # Remove null bytes
-                .str.strip_chars()  # Strip whitespace
-                .alias(col)
-            )
+            df = df.with_columns(clean_text_expr(pl.col(col)).alias(col))
     
     return df
 
@@ -98,25 +146,10 @@ def normalize_cast_ids(df: pl.DataFrame, id_column: str = 'cast_id') -> pl.DataF
     Returns:
         DataFrame with normalized cast IDs
     """
-    def normalize_id(cast_id):
-        """Normalize ID to ensure consistent format"""
-        if not cast_id:
-            return cast_id
-        
-        # Convert to lowercase
-        cast_id = cast_id.lower()
-        
-        # Ensure 0x prefix for hexadecimal blockchain IDs
-        if not cast_id.startswith('0x') and cast_id.isalnum():
-            cast_id = '0x' + cast_id
-            
-        return cast_id
-    
     # Apply normalization to the specified column
     print(f"Normalizing {id_column} values to ensure consistent format")
-    return df.with_columns(
-        pl.col(id_column).map_elements(normalize_id).alias(id_column)
-    )
+    # Lazy so the lowercased column is computed once and shared by all branches
+    return df.lazy().with_columns(cast_id_expr(pl.col(id_column)).alias(id_column)).collect()
 
 @task(name="Format Timestamps", log_prints=True)
 def format_timestamps(df: pl.DataFrame, timestamp_columns: list) -> pl.DataFrame:
@@ -128,35 +161,23 @@ def format_timestamps(df: pl.DataFrame, timestamp_columns: list) -> pl.DataFrame
         timestamp_columns: List of column names containing timestamps
     
     Returns:
-        DataFrame with properly formatted timestamps
+        DataFrame with timestamp columns as naive UTC Datetime (second precision);
+        unparseable values are logged and left null
     """
-    from datetime import datetime, timezone
-    
     if df.is_empty() or not timestamp_columns:
         return df
     
     print(f"Formatting timestamps in columns: {timestamp_columns}")
     
     # Create current timestamp to use as default
-    current_time = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    current_time = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
     
-    for col in timestamp_columns:
-        if col in df.columns:
-            # Handle null, empty, and format issues
-            df = df.with_columns([
-                pl.when(
-                    (pl.col(col).is_null()) | (pl.col(col) == "")
-                ).then(
-                    pl.lit(current_time)
-                ).otherwise(
-                    # Simple string manipulation to standardize format
-                    pl.col(col)
-                      .str.slice(0, 19)  # Take just the first 19 chars (YYYY-MM-DD HH:MM:SS)
-                      .map_elements(
-                          lambda x: x.replace('T', ' ').replace('Z', '') if isinstance(x, str) else current_time, 
-                          return_dtype=pl.Utf8
-                      )
-                ).alias(col)
-            ])
+    # One pass over all columns, parsed to Datetime so later stages don't re-parse strings
+    columns = [col for col in timestamp_columns if col in df.columns]
+    result = df.with_columns([timestamp_expr(col, df.schema[col], current_time) for col in columns])
     
-    return df
+    for col in columns:
+        unparsed = df.filter(result[col].is_null())[col]
+        if len(unparsed):
+            print(f"⚠️ {len(unparsed)} unparseable {col} values left null, e.g. {unparsed.head(3).to_list()}")
+    return result
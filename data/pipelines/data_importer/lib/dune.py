@@ -1,3 +1,5 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, Tuple, Union
 from prefect import task
 from dotenv import load_dotenv
 import polars as pl
@@ -19,4 +21,79 @@ def batch_fetch_dune(query_id: str, params: dict = None, api_key: str = None) ->
         return df
     except Exception as e:
         print(f"Error fetching data from Dune: {str(e)}")
-        return pl.DataFrame()
\ No newline at end of file
+        return pl.DataFrame()
+
+# Rows per result page when streaming a query
+DUNE_PAGE_ROWS = 50_000
+
+# Page order of each streamed query: created_at, then the table's key, so the
+# order is total and no row falls between two offset pages
+CAST_EDGES_SORT_BY = "created_at asc, cast_id asc, edge_type asc, source_user_id asc"
+CAST_EMBEDS_SORT_BY = "created_at asc, cast_hash asc, embed_index asc"
+
+@task(retries=2, retry_delay_seconds=lambda x: 2 ** x)
+def fetch_dune_page(
+    query: Union[int, Dict[str, Any]],
+    params: dict = None,
+    api_key: str = None,
+    offset: int = 0,
+    limit: int = DUNE_PAGE_ROWS,
+    sort_by: str = None
+) -> Tuple[pl.DataFrame, Dict[str, Any]]:
+    """
+    Fetch one page of query results. query is a query id (first page - runs or
+    reuses the latest execution) or the execution returned with the first page.
+    """
+    df, execution = spice.query(
+        query,
+        parameters=params if not isinstance(query, dict) else None,
+        api_key=api_key,
+        limit=limit,
+        offset=offset,
+        sort_by=sort_by,
+        cache=False,
+        include_execution=True
+    )
+    if not isinstance(df, pl.DataFrame):
+        raise ValueError("Query did not return a Polars DataFrame")
+    return df, execution
+
+async def stream_dune_pages(
+    query_id: int,
+    params: dict = None,
+    api_key: str = None,
+    page_rows: int = DUNE_PAGE_ROWS,
+    sort_by: str = "created_at asc"
+) -> AsyncIterator[pl.DataFrame]:
+    """
+    Yield a query's results page by page from a single execution. The next page
+    is fetched while the caller processes the current one, so at most two pages
+    are held in memory. Page errors raise (a missing page would silently drop rows).
+    sort_by must be a total order (end with unique key columns) or offset paging
+    can skip and repeat rows that tie.
+    """
+    df, execution = await asyncio.to_thread(
+        fetch_dune_page, query_id, params=params, api_key=api_key, limit=page_rows, sort_by=sort_by
+    )
+    offset = 0
+    while True:
+        last_page = df.height < page_rows
+        next_page = None
+        if not last_page:
+            offset += page_rows
+            # Prefetch the next page while this one is cleaned and inserted
+            next_page = asyncio.create_task(asyncio.to_thread(
+                fetch_dune_page, execution, api_key=api_key, offset=offset, limit=page_rows, sort_by=sort_by
+            ))
+        
+        try:
+            if df.height > 0:
+                yield df
+        except BaseException:
+            if next_page:
+                next_page.cancel()
+            raise
+        
+        if next_page is None:
+            return
+        df, _ = await next_page
@@ -0,0 +1,106 @@
+"""
+Local fingerprints of imported user profiles
+
+Keeps a hash of the profile columns per user node_id for the rows this worker
+has loaded, so an import only sends users that are new or whose profile
+changed. The store is per target database (keyed by the URL the import
+backend writes to - the COPY DSN or the Supabase URL); deleting the file,
+or a different polars version hashing differently, just means every user
+is sent once more.
+"""
+
+import hashlib
+import time
+from typing import List, Optional, Tuple
+
+import polars as pl
+
+from data.lib.local_store import open_local_db
+from data.pipelines.data_importer.lib.db import target_database_url
+
+PROFILE_COLUMNS = ['fname', 'display_name', 'avatar_url']
+LOOKUP_CHUNK = 900  # Stay under SQLite's bound-parameter limit
+
+def profile_fingerprint_expr() -> pl.Expr:
+    """Hash of a row's profile columns (stable for a given polars version)"""
+    return (
+        pl.concat_str([pl.col(col).fill_null("") for col in PROFILE_COLUMNS], separator='\x1f')
+        .hash(seed=0x6a616d7a79)
+        .reinterpret(signed=True)  # SQLite INTEGER is signed 64-bit
+        .alias('fingerprint')
+    )
+
+def is_placeholder_expr() -> pl.Expr:
+    """Users with no profile data - e.g. reaction targets, which the edge query only has IDs for"""
+    return pl.all_horizontal([pl.col(col).fill_null("") == "" for col in PROFILE_COLUMNS])
+
+class UserFingerprintStore:
+    """SQLite-backed node_id -> profile fingerprint map"""
+
+    def __init__(self, name: str = "user_fingerprints"):
+        self._conn = open_local_db(name)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS user_fingerprints (
+                node_id TEXT PRIMARY KEY,
+                fingerprint INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def lookup(self, node_ids: List[str]) -> pl.DataFrame:
+        """Stored fingerprints for the given node_ids (node_id, stored_fingerprint)"""
+        rows = []
+        for i in range(0, len(node_ids), LOOKUP_CHUNK):
+            chunk = node_ids[i:i + LOOKUP_CHUNK]
+            rows.extend(self._conn.execute(
+                f"SELECT node_id, fingerprint FROM user_fingerprints WHERE node_id IN ({','.join('?' * len(chunk))})",
+                chunk
+            ).fetchall())
+        return pl.DataFrame(
+            [tuple(row) for row in rows],
+            schema={'node_id': pl.Utf8, 'stored_fingerprint': pl.Int64},
+            orient='row'
+        )
+
+    def split_changed(self, users: pl.DataFrame) -> Tuple[pl.DataFrame, pl.DataFrame]:
+        """
+        Split prepared user_nodes rows into (profiles, placeholders) still to send:
+        profiles that are new or changed since last loaded, and placeholder users
+        this store has never seen. Both carry a fingerprint column for record().
+        """
+        users = users.with_columns(profile_fingerprint_expr())
+        stored = self.lookup(users['node_id'].to_list())
+        users = users.join(stored, on='node_id', how='left')
+
+        placeholder = is_placeholder_expr()
+        profiles = users.filter(~placeholder)
+        placeholders = users.filter(placeholder)
+
+        changed_profiles = profiles.filter(
+            pl.col('stored_fingerprint').is_null() | (pl.col('stored_fingerprint') != pl.col('fingerprint'))
+        )
+        # Any stored fingerprint means the user already exists in the database
+        new_placeholders = placeholders.filter(pl.col('stored_fingerprint').is_null())
+        return changed_profiles.drop('stored_fingerprint'), new_placeholders.drop('stored_fingerprint')
+
+    def record(self, users: pl.DataFrame) -> None:
+        """Remember the fingerprints of users that were loaded"""
+        if users.is_empty():
+            return
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO user_fingerprints (node_id, fingerprint, updated_at) VALUES (?, ?, ?)",
+            ((node_id, fingerprint, now) for node_id, fingerprint in users.select(['node_id', 'fingerprint']).iter_rows())
+        )
+        self._conn.commit()
+
+_store: Optional[UserFingerprintStore] = None
+
+def get_fingerprint_store() -> UserFingerprintStore:
+    """Get the process-wide fingerprint store for the configured database"""
+    global _store
+    if _store is None:
+        database_key = hashlib.sha1(target_database_url().encode()).hexdigest()[:10]
+        _store = UserFingerprintStore(f"user_fingerprints_{database_key}")
+    return _store
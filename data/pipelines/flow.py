@@ -54,9 +54,10 @@ async def metadata_extraction_stage(
     start_time: str,
     end_time: str,
     batch_size: int = 50,
-    testing: bool = False
+    testing: bool = False,
+    incremental: bool = True
 ) -> Dict[str, Any]:
-    """Task wrapper for metadata extraction pipeline"""
+    """Task wrapper for metadata extraction pipeline (incremental: only new embeds)"""
     print("🔄 STAGE 2: METADATA EXTRACTION")
     print("-" * 40)
     
@@ -65,7 +66,8 @@ async def metadata_extraction_stage(
         batch_size=batch_size,
         testing=testing,
         start_time=start_time,
-        end_time=end_time
+        end_time=end_time,
+        incremental=incremental
     )
     duration = (datetime.now(timezone.utc) - stage_start).total_seconds()
     
@@ -115,7 +117,8 @@ async def unified_jamzy_pipeline(
     end_time: Optional[str] = None,
     testing: bool = False,
     batch_size: int = 50,
-    model: str = "claude-3-5-haiku-20241022"
+    model: str = "claude-3-5-haiku-20241022",
+    incremental: bool = True
 ) -> Dict[str, Any]:
     """
     Unified pipeline that runs all three Jamzy data processing stages sequentially
@@ -130,20 +133,16 @@ async def unified_jamzy_pipeline(
         start_time: Start time for data processing (YYYY-MM-DD HH:MM:SS)
         end_time: End time for data processing (YYYY-MM-DD HH:MM:SS)
         testing: If True, run in testing mode (smaller batches, limited processing)
-        batch_size: Batch size for processing (auto-optimized for AI efficiency)
+        batch_size: Embeds fetched per page in stages 2 and 3 (Claude requests are packed by token budget)
         model: Claude model for Stage 3 music parsing (default: claude-3-5-haiku-20241022)
+        incremental: Stage 2 only extracts embeds without metadata, from its high-water mark
         
     Returns:
         Dictionary with comprehensive results from all stages
     """
     
-    # Auto-optimize batch size for AI efficiency
+    # Claude requests are packed by token budget, so batch_size only sets the page size
     model_info = get_model_info(model)
-    optimal_batch_size = model_info['recommended_batch_size']
-    
-    if batch_size != optimal_batch_size:
-        print(f"⚡ Auto-optimizing batch size: {optimal_batch_size} (was {batch_size}) for {model_info['name']}")
-        batch_size = optimal_batch_size
     
     print("\n" + "="*60)
     print("🎵 UNIFIED JAMZY DATA PIPELINE")
@@ -151,7 +150,7 @@ async def unified_jamzy_pipeline(
     print(f"📅 Time Range: {start_time or 'Auto'} to {end_time or 'Auto'}")
     print(f"🧪 Testing Mode: {'ON' if testing else 'OFF'}")
     print(f"🤖 AI Model: {model_info['name']}")
-    print(f"📦 Optimized Batch Size: {batch_size}")
+    print(f"📦 Batch Size: {batch_size}")
     print("🔄 Using Prefect task dependencies for proper sequencing")
     print("="*60 + "\n")
     
@@ -184,6 +183,7 @@ async def unified_jamzy_pipeline(
             end_time=end_time,
             batch_size=batch_size,
             testing=testing,
+            incremental=incremental,
             wait_for=[stage1_future]
         )
         
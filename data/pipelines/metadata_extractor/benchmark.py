@@ -0,0 +1,148 @@
+"""
+Fetch Engine Benchmark
+
+Measures URLs/sec of the shared fetch engine against a local stub HTTP server
+at different concurrency levels. The stub answers every path with a small
+Open Graph page after a fixed delay, so results reflect round-trip overlap
+rather than remote server behaviour.
+
+With --parse-workers it instead measures pages/sec of the parse stage
+(extruct + platform extractor) on a large synthetic page, inline (0) and
+through the process pool.
+
+Usage:
+    python -m data.pipelines.metadata_extractor.benchmark
+    python -m data.pipelines.metadata_extractor.benchmark --urls 400 --latency 0.1 --levels 1 10 50
+    python -m data.pipelines.metadata_extractor.benchmark --parse-workers 0 1 2 4
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+from data.pipelines.metadata_extractor.lib.http_client import FetchEngine
+from data.pipelines.metadata_extractor.lib.parse_pool import close_parse_pool, run_parse
+from data.pipelines.metadata_extractor.lib.parsers import parse_page
+
+STUB_PAGE = b"""<!DOCTYPE html>
+<html><head>
+<meta property="og:title" content="Stub Song" />
+<meta property="og:description" content="Stub Artist \xc2\xb7 Stub Album \xc2\xb7 Song \xc2\xb7 2024" />
+<meta property="og:type" content="music.song" />
+<meta property="og:image" content="https://example.com/cover.jpg" />
+</head><body><p>stub</p></body></html>"""
+
+def start_stub_server(latency: float) -> ThreadingHTTPServer:
+    """Start a keep-alive stub server on a free port in a background thread"""
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(STUB_PAGE)))
+            self.end_headers()
+            self.wfile.write(STUB_PAGE)
+
+        def log_message(self, *args):
+            pass
+
+    class StubServer(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 256  # Default backlog of 5 drops bursts of new connections
+
+    # Bind all interfaces so 127.0.0.x addresses act as distinct "domains"
+    server = StubServer(("0.0.0.0", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def build_urls(port: int, count: int, domains: int) -> List[str]:
+    """Spread requests across several loopback hosts"""
+    return [
+        f"http://127.0.0.{(i % domains) + 1}:{port}/track/{i}"
+        for i in range(count)
+    ]
+
+async def run_level(urls: List[str], concurrency: int, rate_limit: bool) -> float:
+    """Fetch all URLs at one concurrency level and return URLs/sec"""
+    async with FetchEngine(
+        max_concurrency=concurrency,
+        per_domain_concurrency=concurrency,
+        rate_limit=rate_limit
+    ) as engine:
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(engine.fetch(url) for url in urls), return_exceptions=True)
+        elapsed = time.perf_counter() - started
+
+    failures = sum(1 for r in responses if isinstance(r, Exception))
+    if failures:
+        print(f"⚠️ {failures} requests failed at concurrency {concurrency}")
+    return len(urls) / elapsed
+
+def build_large_page(body_kb: int) -> bytes:
+    """Stub page padded with a body of roughly body_kb kilobytes, like a real platform page"""
+    filler = b"<div class=\"row\"><span>lorem ipsum dolor sit amet</span></div>\n"
+    return STUB_PAGE.replace(b"<p>stub</p>", filler * (body_kb * 1024 // len(filler)))
+
+async def run_parse_level(page: bytes, pages: int, workers: int) -> float:
+    """Parse the same page `pages` times through the parse stage and return pages/sec"""
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        run_parse(parse_page, page, f"https://open.spotify.com/track/{i}", "open.spotify.com", "spotify", workers=workers)
+        for i in range(pages)
+    ))
+    elapsed = time.perf_counter() - started
+    close_parse_pool()
+    return pages / elapsed
+
+async def parse_main(args: argparse.Namespace) -> None:
+    page = build_large_page(args.page_kb)
+
+    print(f"\n=== PARSE STAGE BENCHMARK ===")
+    print(f"Pages: {args.urls} | page size: {len(page) // 1024}KB\n")
+    print(f"{'Workers':<12} {'Pages/sec':>10} {'Speedup':>9}")
+    print(f"{'-'*12} {'-'*10} {'-'*9}")
+
+    baseline = None
+    for workers in args.parse_workers:
+        rate = await run_parse_level(page, args.urls, workers)
+        baseline = baseline or rate
+        print(f"{workers if workers else 'inline':<12} {rate:>10.1f} {rate / baseline:>8.1f}x")
+
+    print("==============================\n")
+
+async def main(args: argparse.Namespace) -> None:
+    server = start_stub_server(args.latency)
+    port = server.server_address[1]
+    urls = build_urls(port, args.urls, args.domains)
+
+    print(f"\n=== FETCH ENGINE BENCHMARK ===")
+    print(f"URLs: {args.urls} across {args.domains} hosts | stub latency: {args.latency * 1000:.0f}ms | rate limiter: {'on' if args.rate_limit else 'off'}\n")
+    print(f"{'Concurrency':<12} {'URLs/sec':>10} {'Speedup':>9}")
+    print(f"{'-'*12} {'-'*10} {'-'*9}")
+
+    baseline = None
+    for level in args.levels:
+        rate = await run_level(urls, level, args.rate_limit)
+        baseline = baseline or rate
+        print(f"{level:<12} {rate:>10.1f} {rate / baseline:>8.1f}x")
+
+    server.shutdown()
+    print("==============================\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the metadata fetch engine against a local stub server")
+    parser.add_argument("--urls", type=int, default=200, help="Number of URLs fetched per level")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub server response delay in seconds")
+    parser.add_argument("--domains", type=int, default=8, help="Number of distinct loopback hosts")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 5, 10, 25, 50], help="Concurrency levels to test")
+    parser.add_argument("--rate-limit", action="store_true", help="Apply the per-domain rate limiter as in production")
+    parser.add_argument("--parse-workers", type=int, nargs="+", help="Benchmark the parse stage with these worker counts (0 = inline)")
+    parser.add_argument("--page-kb", type=int, default=200, help="Synthetic page size for the parse benchmark")
+    args = parser.parse_args()
+    asyncio.run(parse_main(args) if args.parse_workers else main(args))
@@ -9,7 +9,7 @@ import os
 import sys
 import asyncio
 from datetime import datetime, timezone, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 from prefect import flow
 from dotenv import load_dotenv
@@ -23,13 +23,38 @@ from data.pipelines.metadata_extractor.lib.db import (
 from data.pipelines.metadata_extractor.lib.metadata_extractor import (
     extract_metadata_batch_task
 )
+from data.pipelines.metadata_extractor.lib.http_client import (
+    DEFAULT_MAX_CONCURRENCY,
+    close_fetch_engine
+)
+from data.pipelines.metadata_extractor.lib.cache import get_metadata_cache
+from data.pipelines.metadata_extractor.lib.parse_pool import DEFAULT_PARSE_WORKERS, close_parse_pool
+from data.lib.db import get_checkpoint, set_checkpoint
+
+# High-water mark of embeds.created_at reached by the last complete incremental run
+CHECKPOINT_PIPELINE = "metadata_extractor"
+HIGH_WATER_MARK_KEY = "embeds_high_water_mark"
+# Re-scan this far behind the mark to catch embeds imported late (the anti-join keeps it cheap)
+HIGH_WATER_MARK_LOOKBACK = timedelta(hours=6)
+
+# Extracted batches waiting to be stored while the next batch is fetched
+STORE_QUEUE_DEPTH = 2
+
+def _parse_timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '').replace(' ', 'T'))
 
 @flow(name="URL Metadata Extraction")
 async def extract_url_metadata(
     batch_size: int = 50,
     testing: bool = False,
     start_time: str = None,
-    end_time: str = None
+    end_time: str = None,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    use_cache: bool = True,
+    resume_cursor: Optional[Dict[str, Any]] = None,
+    incremental: bool = False,
+    stale_after_days: Optional[float] = None,
+    parse_workers: int = DEFAULT_PARSE_WORKERS
 ) -> Dict[str, Any]:
     """
     Extract Open Graph metadata from embed URLs
@@ -39,6 +64,12 @@ async def extract_url_metadata(
         testing: If True, only process one batch and log extra details
         start_time: Start time for filtering embeds (YYYY-MM-DD HH:MM:SS)
         end_time: End time for filtering embeds (YYYY-MM-DD HH:MM:SS)
+        max_concurrency: Maximum number of URLs fetched at once across all domains
+        use_cache: Reuse cached per-URL results instead of refetching every embed
+        resume_cursor: next_cursor from a previous (interrupted) run to continue its scan
+        incremental: Only extract embeds without metadata, starting from the stored high-water mark
+        stale_after_days: In incremental mode, also re-extract metadata older than this
+        parse_workers: Worker processes for HTML parsing (0 parses on the event loop)
     
     Returns:
         Dictionary with processing summary
@@ -64,58 +95,149 @@ async def extract_url_metadata(
     total_processed = 0
     total_successful = 0
     batches_processed = 0
-    offset = 0
+    cursor = resume_cursor
+    total_embeds = 0
+    unique_urls = set()
+    newest_seen = None
+    
+    cache = get_metadata_cache()
+    cache.reset_stats()
+    
+    stale_before = None
+    high_water_mark = None
+    if incremental:
+        checkpoint = get_checkpoint(CHECKPOINT_PIPELINE, HIGH_WATER_MARK_KEY)
+        if checkpoint and checkpoint.get('created_at'):
+            high_water_mark = checkpoint['created_at']
+        if stale_after_days is not None:
+            stale_before = (datetime.now(timezone.utc) - timedelta(days=stale_after_days)).replace(tzinfo=None).isoformat()
+        elif high_water_mark:
+            # Narrow the window to just behind the last run's high-water mark
+            # (not with a stale rescan: stale rows can be anywhere in the range)
+            incremental_start = _parse_timestamp(high_water_mark) - HIGH_WATER_MARK_LOOKBACK
+            if not start_time or incremental_start > _parse_timestamp(start_time):
+                start_time = incremental_start.strftime("%Y-%m-%d %H:%M:%S")
+        print(f"♻️ INCREMENTAL MODE: skipping embeds with metadata"
+              f"{f' newer than {stale_before}' if stale_before else ''}; "
+              f"high-water mark {high_water_mark or 'not set'}, scanning from {start_time or 'beginning'}")
+    
+    if resume_cursor:
+        print(f"⏩ Resuming scan after {resume_cursor}")
+    
+    # Store stage runs behind extraction through a bounded queue
+    store_queue: asyncio.Queue = asyncio.Queue(maxsize=STORE_QUEUE_DEPTH)
+    store_failures = 0
+    
+    async def store_worker() -> None:
+        nonlocal store_failures
+        while True:
+            item = await store_queue.get()
+            if item is None:
+                return
+            stored_batch_num, metadata_results = item
+            
+            # Store results in database
+            stored_ok = await store_metadata_results_task(metadata_results)
+            if not stored_ok:
+                store_failures += 1
+                print(f"❌ Failed to store batch {stored_batch_num} - continuing with next batch")
+    
+    store_task = asyncio.create_task(store_worker())
     
-    # Process batches using simple offset pagination
+    # Process batches using keyset pagination
     batch_num = 1
-    while True:
-        print(f"\n--- BATCH {batch_num} ---")
+    try:
+        while True:
+            print(f"\n--- BATCH {batch_num} ---")
+            
+            # Fetch next batch of URL embeds after the cursor
+            embeds, cursor = await fetch_url_embeds_task(
+                batch_size, cursor, start_time, end_time,
+                only_unprocessed=incremental,
+                stale_before=stale_before
+            )
+            
+            if not embeds:
+                if cursor is None:
+                    print("No more URL embeds to process - pipeline complete")
+                    break
+                # Whole page was non-music rows - keep scanning
+                continue
+            
+            total_embeds += len(embeds)
+            newest_seen = max([embed['created_at'] for embed in embeds] + ([newest_seen] if newest_seen else []))
+            unique_urls.update(embed.get('canonical_url') or embed['embed_url'] for embed in embeds)
+            
+            # Extract metadata from this batch
+            metadata_results = await extract_metadata_batch_task(
+                embeds, batch_num, max_concurrency, use_cache, parse_workers
+            )
+            
+            # Hand off to the store stage (waits only if it is STORE_QUEUE_DEPTH batches behind)
+            await store_queue.put((batch_num, metadata_results))
+            
+            # Update totals
+            batch_successful = len(metadata_results)  # All results are successful since failures aren't stored
+            total_processed += len(metadata_results)
+            total_successful += batch_successful
+            batches_processed += 1
+            
+            print(f"Batch {batch_num} summary: {batch_successful}/{len(metadata_results)} successful")
+            
+            # In testing mode, stop after first batch
+            if testing:
+                break
+            
+            if cursor is None:
+                print("Reached end of embeds - pipeline complete")
+                break
+            
+            # Move to next batch
+            batch_num += 1
         
-        # Fetch next batch of URL embeds using offset
-        embeds = await fetch_url_embeds_task(batch_size, offset, start_time, end_time)
-        
-        if not embeds:
-            print("No more URL embeds to process - pipeline complete")
-            break
-        
-        # Extract metadata from this batch
-        metadata_results = await extract_metadata_batch_task(embeds, batch_num)
-        
-        # Store results in database
-        stored_ok = await store_metadata_results_task(metadata_results)
-        
-        if not stored_ok:
-            print(f"❌ Failed to store batch {batch_num} - continuing with next batch")
-        
-        # Update totals
-        batch_successful = len(metadata_results)  # All results are successful since failures aren't stored
-        total_processed += len(metadata_results)
-        total_successful += batch_successful
-        batches_processed += 1
-        
-        print(f"Batch {batch_num} summary: {batch_successful}/{len(metadata_results)} successful")
-        
-        # In testing mode, stop after first batch
-        if testing:
-            break
-        
-        # Move to next batch
-        offset += batch_size
-        batch_num += 1
+        # Drain the store stage
+        await store_queue.put(None)
+        await store_task
+    finally:
+        if not store_task.done():
+            store_task.cancel()
+        # Release pooled connections and parse workers shared across batches
+        await close_fetch_engine()
+        close_parse_pool()
+    
+    # Advance the high-water mark only after a complete, fully stored scan
+    if incremental and not testing and cursor is None and newest_seen and not store_failures:
+        if not high_water_mark or _parse_timestamp(newest_seen) > _parse_timestamp(high_water_mark):
+            set_checkpoint(CHECKPOINT_PIPELINE, HIGH_WATER_MARK_KEY, {'created_at': newest_seen})
+            high_water_mark = newest_seen
+            print(f"📍 High-water mark advanced to {high_water_mark}")
     
     # Final summary
     print(f"\n=== PIPELINE COMPLETE ===")
     print(f"Batches processed: {batches_processed}")
     print(f"URLs processed: {total_processed}")
+    print(f"Unique URLs: {len(unique_urls)} of {total_embeds} embeds"
+          + (f" ({(1 - len(unique_urls)/total_embeds)*100:.1f}% deduplicated)" if total_embeds else ""))
     print(f"Successful extractions: {total_successful}")
     print(f"Success rate: {(total_successful/total_processed*100):.1f}%" if total_processed > 0 else "N/A")
+    cache_stats = cache.summary()
+    if use_cache:
+        print(f"Cache hit rate: {cache_stats['hit_rate']:.1f}% "
+              f"({cache_stats['hits']} hits, {cache_stats['revalidated']} revalidated, {cache_stats['misses']} misses)")
+        print(f"Bytes saved by cache: {cache_stats['bytes_saved']:,}")
     print("=============================\n")
     
     return {
         "batches_processed": batches_processed,
         "urls_processed": total_processed,
         "successful_extractions": total_successful,
-        "success_rate": (total_successful/total_processed*100) if total_processed > 0 else 0
+        "success_rate": (total_successful/total_processed*100) if total_processed > 0 else 0,
+        "total_embeds": total_embeds,
+        "unique_urls": len(unique_urls),
+        "cache": cache_stats,
+        "store_failures": store_failures,
+        "next_cursor": cursor,  # None once the range has been fully scanned
+        "high_water_mark": high_water_mark
     }
 
 if __name__ == "__main__":
@@ -0,0 +1,136 @@
+"""
+Persistent URL-level metadata cache
+
+Stores the smart-extracted result (og_metadata, platform_name) per canonical
+URL with a TTL. Fresh hits skip the network and extruct entirely; expired
+entries are revalidated with ETag / Last-Modified before refetching.
+"""
+
+import time
+from typing import Any, Dict, Optional
+
+from data.lib.local_store import open_local_db
+from data.pipelines.metadata_extractor.lib.url_normalizer import canonicalize_url
+
+DEFAULT_CACHE_TTL = 7 * 24 * 3600  # Track/album pages rarely change within a week
+
+class MetadataCache:
+    """SQLite-backed metadata cache with per-run hit/bytes counters"""
+
+    def __init__(self, name: str = "url_metadata_cache", ttl_seconds: int = DEFAULT_CACHE_TTL):
+        self.ttl_seconds = ttl_seconds
+        self._conn = open_local_db(name)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS url_metadata (
+                url_key TEXT PRIMARY KEY,
+                url_domain TEXT,
+                platform_name TEXT,
+                og_metadata TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                body_bytes INTEGER NOT NULL DEFAULT 0,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        """Zero the per-run counters"""
+        self.stats = {
+            'hits': 0,
+            'revalidated': 0,
+            'misses': 0,
+            'bytes_saved': 0,
+        }
+
+    def lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        """Get the cached entry for a URL (fresh or stale), or None"""
+        row = self._conn.execute(
+            "SELECT * FROM url_metadata WHERE url_key = ?", (canonicalize_url(url),)
+        ).fetchone()
+        if row is None:
+            return None
+
+        entry = dict(row)
+        entry['fresh'] = time.time() - entry['fetched_at'] < self.ttl_seconds
+        return entry
+
+    def store(
+        self,
+        url: str,
+        result: Dict[str, Any],
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        body_bytes: int = 0
+    ) -> None:
+        """Save a freshly extracted result"""
+        self._conn.execute(
+            """
+            INSERT OR REPLACE INTO url_metadata
+                (url_key, url_domain, platform_name, og_metadata, etag, last_modified, body_bytes, fetched_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                canonicalize_url(url),
+                result.get('url_domain'),
+                result.get('platform_name'),
+                result.get('og_metadata'),
+                etag,
+                last_modified,
+                body_bytes,
+                time.time(),
+            )
+        )
+        self._conn.commit()
+
+    def touch(self, url: str) -> None:
+        """Mark an entry fresh again after a 304 Not Modified"""
+        self._conn.execute(
+            "UPDATE url_metadata SET fetched_at = ? WHERE url_key = ?",
+            (time.time(), canonicalize_url(url))
+        )
+        self._conn.commit()
+
+    def record_hit(self, entry: Dict[str, Any], revalidated: bool = False) -> None:
+        self.stats['revalidated' if revalidated else 'hits'] += 1
+        self.stats['bytes_saved'] += entry.get('body_bytes') or 0
+
+    def record_miss(self) -> None:
+        self.stats['misses'] += 1
+
+    def summary(self) -> Dict[str, Any]:
+        """Counters plus hit rate for the current run"""
+        lookups = self.stats['hits'] + self.stats['revalidated'] + self.stats['misses']
+        served = self.stats['hits'] + self.stats['revalidated']
+        return {
+            **self.stats,
+            'hit_rate': (served / lookups * 100) if lookups else 0.0,
+        }
+
+def cached_result(url: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Build an extraction result from a cache entry"""
+    return {
+        'url': url,
+        'url_domain': entry['url_domain'],
+        'platform_name': entry['platform_name'],
+        'og_metadata': entry['og_metadata'],
+    }
+
+def conditional_headers(entry: Dict[str, Any]) -> Dict[str, str]:
+    """Revalidation headers for a stale entry"""
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+_cache: Optional[MetadataCache] = None
+
+def get_metadata_cache() -> MetadataCache:
+    """Get the process-wide metadata cache"""
+    global _cache
+    if _cache is None:
+        _cache = MetadataCache()
+    return _cache
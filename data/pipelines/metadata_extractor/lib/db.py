@@ -6,14 +6,16 @@ using simplified schema with raw Open Graph storage and AI-extracted results
 """
 
 import json
-from typing import List, Dict, Any, Optional
-from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime, timezone
 from urllib.parse import urlparse
 
 from prefect import task
+from postgrest.exceptions import APIError
 
 # Import the existing Supabase client
-from data.lib.db import sb
+from data.lib.db import sb, apply_keyset, cursor_from_row
+from data.pipelines.metadata_extractor.lib.url_normalizer import canonicalize_url
 
 # =============================================================================
 # APPROVED MUSIC DOMAINS
@@ -70,6 +72,18 @@ def extract_domain(url: str) -> Optional[str]:
     except Exception:
         return None
 
+def match_domain_suffix(domain: str, domains: set) -> Optional[str]:
+    """
+    Most specific entry of `domains` that is the host itself or one of its parents
+    (artist.bandcamp.com -> bandcamp.com). One set lookup per host label.
+    """
+    labels = domain.split('.')
+    for i in range(len(labels)):
+        candidate = '.'.join(labels[i:])
+        if candidate in domains:
+            return candidate
+    return None
+
 async def is_music_url(url: str) -> bool:
     """Check if URL belongs to a known music platform"""
     domain = extract_domain(url)
@@ -78,35 +92,42 @@ async def is_music_url(url: str) -> bool:
     
     music_domains = await get_music_domains()
     
-    # Direct domain match
-    if domain in music_domains:
-        return True
-    
-    # Check for subdomain matches (e.g., artist.bandcamp.com)
-    for music_domain in music_domains:
-        if domain.endswith('.' + music_domain):
-            return True
-    
-    return False
+    # Direct or parent-domain match (e.g., artist.bandcamp.com)
+    return match_domain_suffix(domain, music_domains) is not None
 
 # =============================================================================
 # PREFECT TASKS FOR PIPELINE
 # =============================================================================
 
 @task(name="Fetch URL Embeds", log_prints=True, retries=1)
-async def fetch_url_embeds_task(batch_size: int = 50, offset: int = 0, start_time: str = None, end_time: str = None) -> List[Dict[str, Any]]:
+async def fetch_url_embeds_task(
+    batch_size: int = 50,
+    cursor: Optional[Dict[str, Any]] = None,
+    start_time: str = None,
+    end_time: str = None,
+    only_unprocessed: bool = False,
+    stale_before: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
     """
     Prefect task to fetch embeds for metadata extraction (music platforms only)
+    Returns the embeds and the cursor for the next page (None when the scan is done)
     """
-    print(f"Fetching up to {batch_size} URL embeds (offset: {offset})...")
+    print(f"Fetching up to {batch_size} URL embeds (after: {cursor or 'start'})...")
     if start_time and end_time:
         print(f"Time range: {start_time} to {end_time}")
     
-    # Get embeds for processing using simple offset pagination
-    embeds = await get_embeds_for_processing(limit=batch_size, offset=offset, start_time=start_time, end_time=end_time)
+    # Get embeds for processing using keyset pagination
+    embeds, next_cursor = await get_embeds_for_processing(
+        limit=batch_size,
+        cursor=cursor,
+        start_time=start_time,
+        end_time=end_time,
+        only_unprocessed=only_unprocessed,
+        stale_before=stale_before
+    )
     
     print(f"Found {len(embeds)} URL embeds to process")
-    return embeds
+    return embeds, next_cursor
 
 @task(name="Store Metadata Results", log_prints=True, retries=1)
 async def store_metadata_results_task(metadata_results: List[Dict[str, Any]]) -> bool:
@@ -443,57 +464,150 @@ async def test_database_connection() -> bool:
         print(f"❌ Database connection failed: {str(e)}")
         return False
 
-async def get_embeds_for_processing(limit: Optional[int] = None, offset: int = 0, start_time: str = None, end_time: str = None) -> List[Dict[str, Any]]:
+# Scan order for embeds - matches idx_embeds_keyset
+EMBED_KEYSET = ('created_at', 'cast_id', 'embed_index')
+
+# PostgREST "function not in schema cache" / Postgres undefined_function
+MISSING_FUNCTION_CODES = {'PGRST202', '42883'}
+
+async def get_embeds_for_processing(
+    limit: int = 50,
+    cursor: Optional[Dict[str, Any]] = None,
+    start_time: str = None,
+    end_time: str = None,
+    only_unprocessed: bool = False,
+    stale_before: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
     """
     Get embed URLs for metadata extraction, filtered to music platforms only.
-    Uses simple OFFSET pagination - UPSERT handles duplicates gracefully.
+    Music filtering runs in the database (get_music_embeds_page); pages use keyset
+    pagination on (created_at, cast_id, embed_index) so every page costs the same.
+    Each embed is annotated with its canonical_url for in-batch dedup.
     
     Args:
         limit: Maximum number of embeds to return
-        offset: Number of records to skip (for pagination)
+        cursor: Key of the last scanned row (None to start from the beginning)
         start_time: Start time for filtering
         end_time: End time for filtering
+        only_unprocessed: Skip embeds that already have an embeds_metadata row
+        stale_before: With only_unprocessed, still return rows processed before this time
     
     Returns:
-        List of embed dictionaries ready for metadata extraction (music platforms only)
+        (music platform embeds, cursor after the last scanned row or None at the end)
     """
     try:
-        # Simple query - get ALL embeds in range, excluding images/videos
-        query = sb.table('embeds').select('cast_id, embed_index, embed_url, embed_type, created_at').not_.in_('embed_type', ['image', 'video','cast'])
-        
-        # Add time filters if provided
-        if start_time and end_time:
-            query = query.gte('created_at', start_time).lte('created_at', end_time)
-        
-        # Add pagination
-        if offset:
-            query = query.range(offset, offset + (limit * 2) - 1 if limit else offset + 99)
-        elif limit:
-            query = query.limit(limit * 2)  # Get extra to account for music filtering
-        
-        # Execute the query
-        result = query.execute()
-        
-        if not result.data:
-            print("No embeds found")
-            return []
-        
-        print(f"📝 Found {len(result.data)} total embeds (offset: {offset})")
-        
-        # Filter to only music platform URLs
-        music_embeds = []
-        for embed in result.data:
-            embed_url = embed.get('embed_url', '')
-            if embed_url and await is_music_url(embed_url):
-                music_embeds.append(embed)
-                
-                # Stop when we have enough
-                if limit and len(music_embeds) >= limit:
-                    break
-        
-        print(f"🎵 Found {len(music_embeds)} music platform embeds to process (filtered from {len(result.data)} total)")
-        return music_embeds
-        
+        try:
+            music_embeds, next_cursor = _get_music_embeds_page(
+                limit, cursor, start_time, end_time, only_unprocessed, stale_before
+            )
+        except APIError as e:
+            # Only a missing function means the migration isn't applied; anything else is a real error
+            if str(e.code) not in MISSING_FUNCTION_CODES:
+                raise
+            print(f"⚠️ get_music_embeds_page unavailable ({str(e)[:100]}) - filtering in Python")
+            music_embeds, next_cursor = await _scan_embeds_for_music(limit, cursor, start_time, end_time)
+            if only_unprocessed:
+                music_embeds = _drop_processed_embeds(music_embeds, stale_before)
+        
+        for embed in music_embeds:
+            embed['canonical_url'] = canonicalize_url(embed['embed_url'])
+        
+        unique_urls = len({embed['canonical_url'] for embed in music_embeds})
+        print(f"🎵 Found {len(music_embeds)} music platform embeds to process ({unique_urls} unique URLs)")
+        return music_embeds, next_cursor
+    
     except Exception as e:
         print(f"❌ Error getting embeds for processing: {str(e)}")
-        return [] 
\ No newline at end of file
+        raise
+
+def _get_music_embeds_page(
+    limit: int,
+    cursor: Optional[Dict[str, Any]],
+    start_time: Optional[str],
+    end_time: Optional[str],
+    only_unprocessed: bool = False,
+    stale_before: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """One page of music embeds via the server-side RPC"""
+    cursor = cursor or {}
+    result = sb.rpc('get_music_embeds_page', {
+        'p_limit': limit,
+        'p_start_time': start_time,
+        'p_end_time': end_time,
+        'p_after_created_at': cursor.get('created_at'),
+        'p_after_cast_id': cursor.get('cast_id'),
+        'p_after_embed_index': cursor.get('embed_index'),
+        'p_only_unprocessed': only_unprocessed,
+        'p_stale_before': stale_before,
+    }).execute()
+    
+    rows = result.data or []
+    next_cursor = cursor_from_row(rows[-1], EMBED_KEYSET) if len(rows) == limit else None
+    return rows, next_cursor
+
+async def _scan_embeds_for_music(
+    limit: int,
+    cursor: Optional[Dict[str, Any]],
+    start_time: Optional[str],
+    end_time: Optional[str]
+) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Fallback: scan all URL embeds and keep music platforms client-side"""
+    # Scan extra rows to account for music filtering; rows without created_at can't be paged
+    scan_size = limit * 2
+    query = sb.table('embeds').select('cast_id, embed_index, embed_url, embed_type, created_at') \
+        .not_.in_('embed_type', ['image', 'video','cast']) \
+        .not_.is_('created_at', 'null')
+    
+    # Add time filters if provided (either bound alone still applies)
+    if start_time:
+        query = query.gte('created_at', start_time)
+    if end_time:
+        query = query.lte('created_at', end_time)
+    
+    # Seek past the cursor instead of OFFSET
+    result = apply_keyset(query, EMBED_KEYSET, cursor).limit(scan_size).execute()
+    
+    if not result.data:
+        return [], None
+    
+    # Filter to only music platform URLs
+    music_embeds = []
+    last_scanned = None
+    for embed in result.data:
+        last_scanned = embed
+        embed_url = embed.get('embed_url', '')
+        if embed_url and await is_music_url(embed_url):
+            music_embeds.append(embed)
+            
+            # Stop when we have enough - the cursor resumes right after this row
+            if len(music_embeds) >= limit:
+                break
+    
+    print(f"📝 Scanned {len(result.data)} embeds, kept {len(music_embeds)} music URLs")
+    
+    # A short page with every row consumed means the scan is complete
+    scan_done = len(result.data) < scan_size and last_scanned is result.data[-1]
+    next_cursor = None if scan_done else cursor_from_row(last_scanned, EMBED_KEYSET)
+    return music_embeds, next_cursor
+
+def _drop_processed_embeds(embeds: List[Dict[str, Any]], stale_before: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Fallback anti-join: drop embeds whose metadata row exists (and is fresh)"""
+    if not embeds:
+        return embeds
+    
+    cast_ids = list({embed['cast_id'] for embed in embeds})
+    result = sb.table('embeds_metadata').select('cast_id, embed_index, processed_at') \
+        .in_('cast_id', cast_ids).execute()
+    
+    stale_cutoff = _parse_timestamp(stale_before) if stale_before else None
+    processed = {
+        (row['cast_id'], row['embed_index'])
+        for row in (result.data or [])
+        if not stale_cutoff or (row.get('processed_at') and _parse_timestamp(row['processed_at']) >= stale_cutoff)
+    }
+    return [embed for embed in embeds if (embed['cast_id'], embed['embed_index']) not in processed]
+
+def _parse_timestamp(value: str) -> datetime:
+    """Parse an ISO/Postgres timestamp; naive values are taken as UTC so both forms compare"""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00').replace(' ', 'T', 1))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
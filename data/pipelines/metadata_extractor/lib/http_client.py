@@ -0,0 +1,200 @@
+"""
+Shared async HTTP fetch engine for metadata extraction
+
+One pooled httpx client per event loop (keep-alive, HTTP/2 where the server
+negotiates it) with a global concurrency cap and a per-domain cap on top.
+Pages can be streamed and cut off at </head> or a byte cap.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import httpx
+
+from data.pipelines.metadata_extractor.lib.rate_limiter import (
+    get_domain,
+    get_request_headers,
+    parse_retry_after,
+    record_rate_limited,
+    record_success,
+    wait_for_rate_limit
+)
+
+DEFAULT_MAX_CONCURRENCY = 20
+DEFAULT_PER_DOMAIN_CONCURRENCY = 4
+REQUEST_TIMEOUT = 10.0
+MAX_RATE_LIMIT_RETRIES = 2
+
+# Download caps for streamed pages
+MAX_PAGE_BYTES = 4 * 1024 * 1024    # Full pages (YouTube watch pages run 1-2MB)
+MAX_HEAD_BYTES = 512 * 1024         # Head-only pages give up past this
+HEAD_END_MARKER = b'</head>'
+
+class FetchEngine:
+    """Pooled async HTTP client with global and per-domain concurrency limits"""
+
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        per_domain_concurrency: int = DEFAULT_PER_DOMAIN_CONCURRENCY,
+        timeout: float = REQUEST_TIMEOUT,
+        http2: bool = True,
+        rate_limit: bool = True,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.max_concurrency = max_concurrency
+        self.per_domain_concurrency = per_domain_concurrency
+        self.timeout = timeout
+        self.rate_limit = rate_limit
+        self._global_limit = asyncio.Semaphore(max_concurrency)
+        self._domain_limits: Dict[str, asyncio.Semaphore] = {}
+        self._client = httpx.AsyncClient(
+            http2=http2,
+            headers=get_request_headers(),
+            timeout=timeout,
+            follow_redirects=True,
+            transport=transport,
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+                keepalive_expiry=30.0
+            )
+        )
+
+    def _domain_limit(self, domain: str) -> asyncio.Semaphore:
+        """Get (or create) the semaphore bounding requests to one domain"""
+        limit = self._domain_limits.get(domain)
+        if limit is None:
+            limit = asyncio.Semaphore(self.per_domain_concurrency)
+            self._domain_limits[domain] = limit
+        return limit
+
+    async def _request(
+        self,
+        url: str,
+        send: Callable[[], Awaitable[Tuple[httpx.Response, bytes]]]
+    ) -> Tuple[httpx.Response, bytes]:
+        """
+        Run one GET within the concurrency and rate limits, raising on HTTP errors.
+        429 and 5xx responses slow the domain down and are retried after its
+        Retry-After pause; only 2xx/3xx responses count as successes.
+        304 Not Modified is returned as-is for conditional requests.
+        """
+        async with self._domain_limit(get_domain(url)):
+            for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+                # Wait for domain budget before taking a global slot, so a
+                # throttled domain never holds up requests to other domains
+                if self.rate_limit:
+                    await wait_for_rate_limit(url)
+                async with self._global_limit:
+                    response, body = await send()
+
+                status = response.status_code
+                if (status == 429 or status >= 500) and self.rate_limit:
+                    # An overloaded server gets the same backoff as an explicit rate limit
+                    record_rate_limited(url, parse_retry_after(response.headers.get('Retry-After')))
+                    if attempt < MAX_RATE_LIMIT_RETRIES:
+                        continue
+                elif status < 400 and self.rate_limit:
+                    record_success(url)
+
+                if response.status_code != 304:
+                    response.raise_for_status()
+                return response, body
+
+    async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """GET a URL and read the whole body"""
+        async def send() -> Tuple[httpx.Response, bytes]:
+            response = await self._client.get(url, headers=headers)
+            return response, response.content
+
+        response, _ = await self._request(url, send)
+        return response
+
+    async def fetch_page(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        head_only: bool = False
+    ) -> Tuple[httpx.Response, bytes]:
+        """
+        Stream a page, stopping after </head> when head_only (OpenGraph lives there)
+        and at a byte cap either way. Returns the response and the bytes read.
+        """
+        max_bytes = MAX_HEAD_BYTES if head_only else MAX_PAGE_BYTES
+
+        async def send() -> Tuple[httpx.Response, bytes]:
+            async with self._client.stream('GET', url, headers=headers) as response:
+                if not response.is_success:
+                    return response, b''
+                body = await read_page(response, max_bytes, HEAD_END_MARKER if head_only else None)
+            # Leaving the stream early closes it (HTTP/2 resets just the stream)
+            return response, body
+
+        return await self._request(url, send)
+
+    async def aclose(self) -> None:
+        """Close the underlying connection pool"""
+        await self._client.aclose()
+
+    async def __aenter__(self) -> "FetchEngine":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+async def read_page(response: httpx.Response, max_bytes: int, stop_marker: Optional[bytes] = None) -> bytes:
+    """Read a streamed (decoded) body up to max_bytes, or through the first stop_marker"""
+    chunks = []
+    size = 0
+    tail = b''
+    async for chunk in response.aiter_bytes():
+        chunks.append(chunk)
+        size += len(chunk)
+        if stop_marker:
+            # Search the chunk plus the previous tail so a split marker is still found
+            window = tail + chunk.lower()
+            if stop_marker in window:
+                break
+            tail = window[-len(stop_marker):]
+        if size >= max_bytes:
+            break
+
+    body = b''.join(chunks)[:max_bytes]
+    if stop_marker:
+        end = body.lower().find(stop_marker)
+        if end != -1:
+            body = body[:end + len(stop_marker)]
+    return body
+
+# Engine shared by all batches in a run (asyncio primitives are loop-bound)
+_engine: Optional[FetchEngine] = None
+_engine_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def get_fetch_engine(
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    per_domain_concurrency: int = DEFAULT_PER_DOMAIN_CONCURRENCY
+) -> FetchEngine:
+    """Get the shared fetch engine for the running event loop"""
+    global _engine, _engine_loop
+
+    loop = asyncio.get_running_loop()
+    if (_engine is None or
+        _engine_loop is not loop or
+        _engine.max_concurrency != max_concurrency or
+        _engine.per_domain_concurrency != per_domain_concurrency):
+        # Old engine belongs to another loop or config - let it be garbage collected
+        _engine = FetchEngine(max_concurrency, per_domain_concurrency)
+        _engine_loop = loop
+        print(f"🌐 Started fetch engine (max {max_concurrency} concurrent, {per_domain_concurrency} per domain)")
+
+    return _engine
+
+async def close_fetch_engine() -> None:
+    """Close the shared fetch engine if it belongs to the running loop"""
+    global _engine, _engine_loop
+
+    if _engine is not None and _engine_loop is asyncio.get_running_loop():
+        await _engine.aclose()
+    _engine = None
+    _engine_loop = None
@@ -0,0 +1,48 @@
+"""
+Process pool for CPU-bound page parsing
+
+extruct and the platform extractors are pure Python, so running them on the
+event loop thread stalls every in-flight fetch. Pages are handed to a pool of
+worker processes (one per core by default) instead.
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+DEFAULT_PARSE_WORKERS = os.cpu_count() or 1
+
+# Pool shared by all batches in a run
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+
+def get_parse_pool(workers: int = DEFAULT_PARSE_WORKERS) -> ProcessPoolExecutor:
+    """Get (or start) the shared parse pool with the given number of workers"""
+    global _pool, _pool_workers
+
+    if _pool is None or _pool_workers != workers:
+        close_parse_pool()
+        # spawn: forking a process that already runs httpx/Prefect threads is unsafe
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        _pool_workers = workers
+        print(f"🧮 Started parse pool ({workers} worker processes)")
+
+    return _pool
+
+async def run_parse(func: Callable[..., Any], *args: Any, workers: int = DEFAULT_PARSE_WORKERS) -> Any:
+    """Run a picklable parse function in the pool (inline when workers is 0)"""
+    if workers <= 0:
+        return func(*args)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_parse_pool(workers), func, *args)
+
+def close_parse_pool() -> None:
+    """Shut down the shared parse pool"""
+    global _pool, _pool_workers
+
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+    _pool = None
+    _pool_workers = 0
@@ -0,0 +1,570 @@
+"""
+Pure parsing for URL metadata extraction
+
+Everything here is CPU-bound and side-effect free (no network, no database,
+no event loop), so it can run in worker processes: extruct over the page HTML,
+then the extractor registered for the resolved platform.
+"""
+
+import codecs
+import json
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+import extruct
+
+# =============================================================================
+# EXTRACTOR REGISTRY
+# =============================================================================
+
+# Extractors get the raw extruct output plus its OpenGraph index
+OpenGraphIndex = Dict[str, List[str]]
+PlatformExtractor = Callable[[Dict, OpenGraphIndex], str]
+
+OPENGRAPH_ONLY = ['opengraph']
+
+# platform key -> extractor, and the extruct syntaxes that extractor reads
+EXTRACTORS: Dict[str, PlatformExtractor] = {}
+PLATFORM_SYNTAXES: Dict[str, List[str]] = {}
+
+def register_extractor(platform: str, syntaxes: List[str] = OPENGRAPH_ONLY):
+    """Register a platform extractor; OpenGraph-only ones get head-only fetches"""
+    def decorator(func: PlatformExtractor) -> PlatformExtractor:
+        EXTRACTORS[platform] = func
+        PLATFORM_SYNTAXES[platform] = syntaxes
+        return func
+    return decorator
+
+def get_syntaxes(platform: Optional[str]) -> Optional[List[str]]:
+    """Syntaxes to extract for a platform (None = all, unknown platforms store everything)"""
+    return PLATFORM_SYNTAXES.get(platform) if platform else None
+
+def needs_full_page(platform: Optional[str]) -> bool:
+    """OpenGraph lives in <head>; anything else may be anywhere in <body>"""
+    syntaxes = get_syntaxes(platform)
+    return syntaxes is None or any(syntax != 'opengraph' for syntax in syntaxes)
+
+# Repeatable OpenGraph properties: the first value is the main one (the main
+# image, the artist tag); any other property repeated takes its last value
+OG_ARRAY_PROPERTIES = {'og:image', 'og:video:tag'}
+
+def index_opengraph(metadata: Dict) -> OpenGraphIndex:
+    """
+    Index OpenGraph properties once: property -> values in page order. A
+    property repeated in a later section replaces the earlier section's
+    values, as the per-extractor section scans did (the last section wins).
+    """
+    index: OpenGraphIndex = {}
+    for og_section in metadata.get('opengraph') or []:
+        section: OpenGraphIndex = {}
+        for name, value in og_section.get('properties', []):
+            section.setdefault(name, []).append(value)
+        index.update(section)
+    return index
+
+def og_value(og: OpenGraphIndex, name: str) -> Optional[str]:
+    """Value of an OpenGraph property in the last section that has it (its last, or first for arrays)"""
+    values = og.get(name)
+    if not values:
+        return None
+    return values[0] if name in OG_ARRAY_PROPERTIES else values[-1]
+
+def format_parts(platform: str, fields: List[tuple]) -> str:
+    """Join non-empty (label, value) pairs into 'label - value | ...'"""
+    parts = [f"{label} - {value}" for label, value in fields if value]
+    return " | ".join(parts) if parts else f"{platform} - metadata extracted"
+
+# =============================================================================
+# PLATFORM-SPECIFIC EXTRACTORS
+# =============================================================================
+
+@register_extractor('spotify')
+def extract_spotify_metadata(metadata: Dict, og: Optional[OpenGraphIndex] = None) -> str:
+    """Extract key Spotify metadata into clean format"""
+    try:
+        og = index_opengraph(metadata) if og is None else og
+        
+        # Get type from Open Graph: "music.song" -> "song"
+        content_type = None
+        og_type = og_value(og, 'og:type')
+        if og_type and og_type.startswith('music.'):
+            content_type = og_type.replace('music.', '')
+        
+        # Get artist, album, year from description
+        artist = album = year = None
+        desc = og_value(og, 'og:description')
+        if desc:
+            # Format: "Artist(s) · Album · Song · Year"
+            parts = desc.split(' · ')
+            if len(parts) >= 2:
+                artist = parts[0]
+                if len(parts) >= 3:
+                    album = parts[1]
+                if len(parts) >= 4:
+                    year_match = re.search(r'\b(19|20)\d{2}\b', parts[-1])
+                    if year_match:
+                        year = year_match.group()
+        
+        return format_parts('spotify', [
+            ('title', og_value(og, 'og:title')),
+            ('artist', artist),
+            ('album', album),
+            ('year', year),
+            ('release_date', og_value(og, 'music:release_date')),
+            ('type', content_type),
+            ('image', og_value(og, 'og:image')),
+        ])
+        
+    except Exception as e:
+        return f"spotify - extraction error: {str(e)}"
+
+@register_extractor('youtube', syntaxes=['opengraph', 'json-ld', 'microdata'])
+def extract_youtube_metadata(metadata: Dict, og: Optional[OpenGraphIndex] = None) -> str:
+    """Extract key YouTube metadata into clean format"""
+    try:
+        og = index_opengraph(metadata) if og is None else og
+        
+        # Get channel from microdata
+        channel = None
+        if 'microdata' in metadata:
+            for item in metadata['microdata']:
+                if item.get('type') == 'http://schema.org/VideoObject':
+                    author = item.get('properties', {}).get('author')
+                    if author and isinstance(author, dict):
+                        # Try name field first (if it's not a URL)
+                        channel_name = author.get('properties', {}).get('name')
+                        if channel_name and not channel_name.startswith('https://'):
+                            channel = channel_name
+                            break
+                        
+                        # If name is a URL, extract channel from url field
+                        channel_url = author.get('properties', {}).get('url')
+                        if channel_url and isinstance(channel_url, str):
+                            # Extract channel name from URL like "http://www.youtube.com/@pattismithVEVO"
+                            if '@' in channel_url:
+                                channel = channel_url.split('@')[-1]
+                                break
+                elif item.get('type') == 'https://schema.org/BreadcrumbList':
+                    # Fallback to breadcrumb
+                    item_list = item.get('properties', {}).get('itemListElement')
+                    if item_list and isinstance(item_list, dict):
+                        item_props = item_list.get('properties', {}).get('item')
+                        if item_props and isinstance(item_props, dict):
+                            channel = item_props.get('properties', {}).get('name')
+                            break
+        
+        # Get duration from microdata
+        duration = None
+        if 'microdata' in metadata:
+            for item in metadata['microdata']:
+                if item.get('type') == 'http://schema.org/VideoObject':
+                    duration_raw = item.get('properties', {}).get('duration')
+                    if duration_raw:
+                        # Convert PT2M5S to readable format
+                        match = re.search(r'PT(?:(\d+)M)?(?:(\d+)S)?', duration_raw)
+                        if match:
+                            minutes = int(match.group(1) or 0)
+                            seconds = int(match.group(2) or 0)
+                            if minutes > 0:
+                                duration = f"{minutes}:{seconds:02d}"
+                            else:
+                                duration = f"0:{seconds}"
+                    break
+        
+        # Get upload date from JSON-LD (Phase 2 enhancement)
+        upload_date = None
+        if 'json-ld' in metadata:
+            for item in metadata['json-ld']:
+                if isinstance(item, dict) and 'uploadDate' in item:
+                    upload_date = item['uploadDate']
+                    break
+        
+        return format_parts('youtube', [
+            ('title', og_value(og, 'og:title')),
+            ('channel', channel),
+            ('duration', duration),
+            ('upload_date', upload_date),
+            ('image', og_value(og, 'og:image')),
+        ])
+        
+    except Exception as e:
+        return f"youtube - extraction error: {str(e)}"
+
+@register_extractor('soundcloud', syntaxes=['opengraph', 'microdata', 'rdfa'])
+def extract_soundcloud_metadata(metadata: Dict, og: Optional[OpenGraphIndex] = None) -> str:
+    """Extract key SoundCloud metadata into clean format"""
+    try:
+        og = index_opengraph(metadata) if og is None else og
+        
+        # Get artist, duration and genre from the MusicRecording microdata item
+        channel = duration = genre = None
+        recording = next((item for item in metadata.get('microdata') or []
+                          if item.get('type') == 'http://schema.org/MusicRecording'), None)
+        if recording:
+            properties = recording.get('properties', {})
+            by_artist = properties.get('byArtist')
+            if by_artist and isinstance(by_artist, dict):
+                channel = by_artist.get('properties', {}).get('name')
+            
+            duration_raw = properties.get('duration')
+            if duration_raw:
+                # Convert PT00H05M56S to readable format
+                match = re.search(r'PT(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?', duration_raw)
+                if match:
+                    hours = int(match.group(1) or 0)
+                    minutes = int(match.group(2) or 0)
+                    seconds = int(match.group(3) or 0)
+                    if hours > 0:
+                        duration = f"{hours}:{minutes:02d}:{seconds:02d}"
+                    elif minutes > 0:
+                        duration = f"{minutes}:{seconds:02d}"
+                    else:
+                        duration = f"0:{seconds:02d}"
+            
+            genre = properties.get('genre')
+        
+        # Get play count and like count from rdfa
+        play_count = like_count = None
+        if 'rdfa' in metadata:
+            for item in metadata['rdfa']:
+                if 'soundcloud:play_count' in item:
+                    play_count_data = item['soundcloud:play_count']
+                    if isinstance(play_count_data, list) and play_count_data:
+                        play_count = play_count_data[0].get('@value')
+                if 'soundcloud:like_count' in item:
+                    like_count_data = item['soundcloud:like_count']
+                    if isinstance(like_count_data, list) and like_count_data:
+                        like_count = like_count_data[0].get('@value')
+        
+        return format_parts('soundcloud', [
+            ('title', og_value(og, 'og:title')),
+            ('channel', channel),
+            ('duration', duration),
+            ('genre', genre),
+            ('plays', play_count),
+            ('likes', like_count),
+            ('image', og_value(og, 'og:image')),
+        ])
+        
+    except Exception as e:
+        return f"soundcloud - extraction error: {str(e)}"
+
+@register_extractor('audius')
+def extract_audius_metadata(metadata: Dict, og: Optional[OpenGraphIndex] = None) -> str:
+    """Extract key Audius metadata into clean format"""
+    try:
+        og = index_opengraph(metadata) if og is None else og
+        
+        # Format: "Song Title by Artist • Audius" - keep just the song and artist part
+        title = og_value(og, 'og:title')
+        if title and ' by ' in title and ' • Audius' in title:
+            title = title.replace(' • Audius', '')
+        
+        return format_parts('audius', [
+            ('title', title),
+            ('image', og_value(og, 'og:image')),
+        ])
+        
+    except Exception as e:
+        return f"audius - extraction error: {str(e)}"
+
+@register_extractor('songlink')
+def extract_songlink_metadata(metadata: Dict, og: Optional[OpenGraphIndex] = None) -> str:
+    """Extract key Songlink/Odesli metadata into clean format"""
+    try:
+        og = index_opengraph(metadata) if og is None else og
+        
+        # Title is already clean: "Title by Artist"
+        return format_parts('songlink', [
+            ('title', og_value(og, 'og:title')),
+            ('image', og_value(og, 'og:image')),
+        ])
+        
+    except Exception as e:
+        return f"songlink - extraction error: {str(e)}"
+
+@register_extractor('youtube_music')
+def extract_youtube_music_metadata(metadata: Dict, og: Optional[OpenGraphIndex] = None) -> str:
+    """Extract key YouTube Music metadata into clean format"""
+    try:
+        og = index_opengraph(metadata) if og is None else og
+        
+        # Remove "- YouTube Music" suffix
+        title = og_value(og, 'og:title')
+        if title and title.endswith(' - YouTube Music'):
+            title = title.replace(' - YouTube Music', '')
+        
+        return format_parts('youtube_music', [
+            ('title', title),
+            # First video tag is usually the artist
+            ('artist', og_value(og, 'og:video:tag')),
+            ('image', og_value(og, 'og:image')),
+        ])
+        
+    except Exception as e:
+        return f"youtube_music - extraction error: {str(e)}"
+
+@register_extractor('apple_music', syntaxes=['opengraph', 'json-ld'])
+def extract_apple_music_metadata(metadata: Dict, og: Optional[OpenGraphIndex] = None) -> str:
+    """Extract key Apple Music metadata into clean format"""
+    try:
+        og = index_opengraph(metadata) if og is None else og
+        
+        # Get title and artist from JSON-LD (most reliable)
+        title = artist = album = year = None
+        if 'json-ld' in metadata:
+            for item in metadata['json-ld']:
+                if item.get('@type') == 'MusicAlbum':
+                    title = item.get('name')
+                    year_str = item.get('datePublished', '')
+                    if year_str and len(year_str) >= 4:
+                        year = year_str[:4]
+                    
+                    # Get artist from byArtist array
+                    by_artist = item.get('byArtist')
+                    if by_artist and isinstance(by_artist, list) and by_artist:
+                        artist = by_artist[0].get('name')
+                    break
+        
+        # Fallback to Open Graph if JSON-LD doesn't have what we need
+        raw_title = og_value(og, 'og:title') if not title else None
+        if raw_title:
+            # Remove " su Apple Music" suffix and extract parts
+            if ' su Apple Music' in raw_title:
+                clean_title = raw_title.replace(' su Apple Music', '')
+                # Format is usually "Album di Artist"
+                if ' di ' in clean_title:
+                    parts = clean_title.split(' di ')
+                    title = parts[0]
+                    if len(parts) > 1:
+                        artist = parts[1]
+            else:
+                title = raw_title
+        
+        return format_parts('apple_music', [
+            ('title', title),
+            ('artist', artist),
+            # Don't duplicate if album name same as title
+            ('album', album if album != title else None),
+            ('year', year),
+            ('tracks', og_value(og, 'music:song_count')),
+            ('image', og_value(og, 'og:image')),
+        ])
+        
+    except Exception as e:
+        return f"apple_music - extraction error: {str(e)}"
+
+@register_extractor('aux')
+def extract_aux_metadata(metadata: Dict, og: Optional[OpenGraphIndex] = None) -> str:
+    """Extract key AUX metadata into clean format"""
+    try:
+        og = index_opengraph(metadata) if og is None else og
+        
+        # Remove " - AUX" suffix
+        title = og_value(og, 'og:title')
+        if title and title.endswith(' - AUX'):
+            title = title.replace(' - AUX', '')
+        
+        # Skip generic AUX description
+        description = og_value(og, 'og:description')
+        if description == "The AUX for the internet":
+            description = None
+        
+        return format_parts('aux', [
+            ('title', title),
+            ('description', description),
+            ('image', og_value(og, 'og:image')),
+        ])
+        
+    except Exception as e:
+        return f"aux - extraction error: {str(e)}"
+
+@register_extractor('tidal')
+def extract_tidal_metadata(metadata: Dict, og: Optional[OpenGraphIndex] = None) -> str:
+    """Extract key Tidal metadata into clean format"""
+    try:
+        og = index_opengraph(metadata) if og is None else og
+        
+        # Format is "Artist - Song"; keep the full title as backup
+        title = og_value(og, 'og:title')
+        artist = None
+        if title and ' - ' in title:
+            artist, song = (part.strip() for part in title.split(' - ', 1))
+            title = song
+        
+        return format_parts('tidal', [
+            ('title', title),
+            ('artist', artist),
+            ('image', og_value(og, 'og:image')),
+        ])
+        
+    except Exception as e:
+        return f"tidal - extraction error: {str(e)}"
+
+@register_extractor('rodeo')
+def extract_rodeo_metadata(metadata: Dict, og: Optional[OpenGraphIndex] = None) -> str:
+    """Extract key Rodeo metadata into clean format"""
+    try:
+        og = index_opengraph(metadata) if og is None else og
+        
+        # Truncate long descriptions for readability
+        description = og_value(og, 'og:description')
+        if description and len(description) > 200:
+            description = description[:200] + "..."
+        
+        return format_parts('rodeo', [
+            # Already clean, no suffix removal needed
+            ('title', og_value(og, 'og:title')),
+            ('description', description),
+            ('image', og_value(og, 'og:image')),
+        ])
+        
+    except Exception as e:
+        return f"rodeo - extraction error: {str(e)}"
+
+@register_extractor('bandcamp')
+def extract_bandcamp_metadata(metadata: Dict, og: Optional[OpenGraphIndex] = None) -> str:
+    """Extract key Bandcamp metadata into clean format"""
+    try:
+        og = index_opengraph(metadata) if og is None else og
+        
+        # Format is typically "Song Title, by Artist" or "Album Title by Artist"
+        title = og_value(og, 'og:title')
+        artist = None
+        if title:
+            for separator in (', by ', ' by '):
+                if separator in title:
+                    title, artist = (part.strip() for part in title.split(separator, 1))
+                    break
+        
+        # Extract album from "from the album [Album Name]"
+        album = None
+        desc = og_value(og, 'og:description')
+        if desc:
+            album_match = re.search(r'from the album\s+(.+)', desc.strip())
+            if album_match:
+                album = album_match.group(1).strip()
+        
+        return format_parts('bandcamp', [
+            ('title', title),
+            ('artist', artist),
+            ('album', album),
+            ('image', og_value(og, 'og:image')),
+        ])
+        
+    except Exception as e:
+        return f"bandcamp - extraction error: {str(e)}"
+
+@register_extractor('ffm')
+def extract_ffm_metadata(metadata: Dict, og: Optional[OpenGraphIndex] = None) -> str:
+    """Extract key FFM (Feature.fm) metadata into clean format"""
+    try:
+        og = index_opengraph(metadata) if og is None else og
+        
+        # Title is the song name, description the artist
+        artist = og_value(og, 'og:description')
+        
+        return format_parts('ffm', [
+            ('title', og_value(og, 'og:title')),
+            ('artist', artist.strip() if artist else None),
+            ('image', og_value(og, 'og:image')),
+        ])
+        
+    except Exception as e:
+        return f"ffm - extraction error: {str(e)}"
+
+def is_empty_metadata(metadata: Dict) -> bool:
+    """Check if metadata is essentially empty (no useful content)"""
+    try:
+        # Check if all main sections are empty or contain only empty structures
+        for section_name in ['microdata', 'json-ld', 'opengraph', 'rdfa']:
+            section = metadata.get(section_name, [])
+            if section:  # If any section has content, it's not empty
+                return False
+        
+        # Check dublincore separately as it has different structure
+        dublincore = metadata.get('dublincore', [])
+        if dublincore:
+            for dc_item in dublincore:
+                elements = dc_item.get('elements', [])
+                terms = dc_item.get('terms', [])
+                if elements or terms:  # If has actual content
+                    return False
+        
+        return True  # All sections are empty
+        
+    except Exception:
+        return False  # If error parsing, assume it has content
+
+# =============================================================================
+# RESULT BUILDING
+# =============================================================================
+
+def build_metadata_result(url: str, url_domain: Optional[str], platform: Optional[str], raw_metadata: Dict) -> Dict[str, Any]:
+    """
+    Create metadata result with the platform's registered extractor
+    """
+    # Check if metadata is empty (e.g., imagedelivery URLs)
+    if is_empty_metadata(raw_metadata):
+        return {
+            'url': url,
+            'url_domain': url_domain,
+            'platform_name': None,  # No platform for empty metadata
+            'og_metadata': None,  # Store null instead of empty JSON
+        }
+    
+    extractor = EXTRACTORS.get(platform) if platform else None
+    if extractor:
+        # Extract clean platform metadata
+        og_metadata = extractor(raw_metadata, index_opengraph(raw_metadata))
+    else:
+        # Fallback: store full raw metadata for unknown platforms
+        og_metadata = json.dumps(raw_metadata)
+    
+    return {
+        'url': url,
+        'url_domain': url_domain,
+        'platform_name': platform,  # Could be None for unknown platforms
+        'og_metadata': og_metadata,
+    }
+
+# <meta charset="..."> or <meta http-equiv="Content-Type" content="...; charset=...">
+META_CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+META_SNIFF_BYTES = 4096  # Browsers look for the declaration this early in the page
+
+def page_encoding(html: bytes, charset: Optional[str] = None) -> str:
+    """
+    Encoding of a page: byte order mark, then the Content-Type charset, then
+    <meta charset>; UTF-8 when none of them names a known codec
+    """
+    if html.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    meta = META_CHARSET_PATTERN.search(html[:META_SNIFF_BYTES])
+    for candidate in (charset, meta.group(1).decode('ascii', 'ignore') if meta else None):
+        if not candidate:
+            continue
+        try:
+            return codecs.lookup(candidate.strip()).name
+        except LookupError:
+            continue
+    return 'utf-8'
+
+def parse_page(
+    html: bytes,
+    url: str,
+    url_domain: Optional[str],
+    platform: Optional[str],
+    charset: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Run extruct over a fetched page (possibly just its <head>) with only the
+    platform's syntaxes and build the extraction result (picklable, process-safe).
+    charset is the Content-Type header's, if it had one.
+    """
+    syntaxes = get_syntaxes(platform)
+    text = html.decode(page_encoding(html, charset), errors='replace')
+    if syntaxes:
+        metadata = extruct.extract(text, base_url=url, syntaxes=syntaxes)
+    else:
+        metadata = extruct.extract(text, base_url=url)
+    return build_metadata_result(url, url_domain, platform, metadata)
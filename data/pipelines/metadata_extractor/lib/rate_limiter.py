@@ -1,14 +1,86 @@
 """
-Simple rate limiting for web requests
+Per-domain token-bucket rate limiting for web requests
+
+Each domain gets its own bucket: requests go out immediately while the domain
+has budget and only wait once its bucket is empty. 429 responses halve the
+domain's rate and honour Retry-After; successes slowly restore it.
 """
 
 import asyncio
-import random
-from typing import Dict
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
 from urllib.parse import urlparse
 
-# Simple domain delay tracking
-_last_request_times: Dict[str, float] = {}
+# (requests per second, burst size) per music_sources domain
+DOMAIN_RATE_LIMITS: Dict[str, Tuple[float, int]] = {
+    'spotify.com': (5.0, 10),
+    'open.spotify.com': (5.0, 10),
+    'youtube.com': (5.0, 10),
+    'youtu.be': (5.0, 10),
+    'music.youtube.com': (3.0, 6),
+    'music.apple.com': (4.0, 8),
+    'itunes.apple.com': (4.0, 8),
+    'soundcloud.com': (3.0, 6),
+    'on.soundcloud.com': (3.0, 6),
+    'bandcamp.com': (2.0, 4),
+    'tidal.com': (2.0, 4),
+    'audius.co': (3.0, 6),
+    'album.link': (2.0, 4),
+    'song.link': (2.0, 4),
+}
+
+# Used for domains without an explicit entry
+DEFAULT_RATE_LIMIT: Tuple[float, int] = (2.0, 4)
+
+# Adaptive behaviour on throttling
+MIN_RATE = 0.1                 # Never drop below one request per 10s
+RATE_LIMIT_BACKOFF = 0.5       # Multiply rate by this on 429
+RATE_RECOVERY_STEP = 0.05      # Fraction of the base rate regained per success
+DEFAULT_RETRY_AFTER = 5.0      # Pause when a 429 carries no Retry-After header
+MAX_RETRY_AFTER = 120.0        # Cap on how long one Retry-After may block a domain
+
+class TokenBucket:
+    """Token bucket with reservation-based waiting and adaptive rate"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.base_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Take one token and return how long the caller must wait for it"""
+        now = time.monotonic()
+        self._refill(now)
+        # Reserving into negative balance keeps concurrent waiters in FIFO order
+        self.tokens -= 1
+        wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def throttle(self, retry_after: Optional[float]) -> None:
+        """Back off after a 429: halve the rate and pause until Retry-After"""
+        now = time.monotonic()
+        self._refill(now)
+        self.rate = max(MIN_RATE, self.rate * RATE_LIMIT_BACKOFF)
+        pause = min(retry_after if retry_after is not None else DEFAULT_RETRY_AFTER, MAX_RETRY_AFTER)
+        self.blocked_until = max(self.blocked_until, now + pause)
+        self.tokens = min(self.tokens, 0.0)
+
+    def recover(self) -> None:
+        """Additively restore the rate after a successful request"""
+        if self.rate < self.base_rate:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * RATE_RECOVERY_STEP)
+
+# One bucket per rate-limit key (configured domain or bare host)
+_buckets: Dict[str, TokenBucket] = {}
 
 def get_domain(url: str) -> str:
     """Extract domain from URL"""
@@ -21,11 +93,62 @@ def get_domain(url: str) -> str:
     except Exception:
         return 'unknown'
 
-async def wait_for_rate_limit(url: str, delay: float = 0.1) -> None:
-    """Simple rate limiting with jitter"""
-    # Add small jitter to avoid predictable patterns
-    actual_delay = delay + random.uniform(0.05, 0.15)
-    await asyncio.sleep(actual_delay)
+def _rate_limit_key(domain: str) -> str:
+    """Map a host onto its configured domain (artist.bandcamp.com -> bandcamp.com)"""
+    candidate = domain
+    while candidate:
+        if candidate in DOMAIN_RATE_LIMITS:
+            return candidate
+        _, _, candidate = candidate.partition('.')
+    return domain
+
+def _get_bucket(url: str) -> TokenBucket:
+    key = _rate_limit_key(get_domain(url))
+    bucket = _buckets.get(key)
+    if bucket is None:
+        rate, capacity = DOMAIN_RATE_LIMITS.get(key, DEFAULT_RATE_LIMIT)
+        bucket = TokenBucket(rate, capacity)
+        _buckets[key] = bucket
+    return bucket
+
+def set_domain_rate_limit(domain: str, rate: float, burst: int) -> None:
+    """Configure (or override) the rate limit for a domain"""
+    DOMAIN_RATE_LIMITS[domain] = (rate, burst)
+    _buckets.pop(domain, None)
+
+def reset_rate_limits() -> None:
+    """Drop all bucket state (rates, backoffs) - mainly for tests and benchmarks"""
+    _buckets.clear()
+
+async def wait_for_rate_limit(url: str) -> None:
+    """Wait only if the URL's domain has no budget left"""
+    wait = _get_bucket(url).reserve()
+    if wait > 0:
+        await asyncio.sleep(wait)
+
+def record_rate_limited(url: str, retry_after: Optional[float] = None) -> None:
+    """Tell the limiter the domain answered 429"""
+    bucket = _get_bucket(url)
+    bucket.throttle(retry_after)
+    print(f"🐢 Rate limited by {get_domain(url)} - slowing to {bucket.rate:.2f} req/s")
+
+def record_success(url: str) -> None:
+    """Tell the limiter a request to the domain succeeded"""
+    _get_bucket(url).recover()
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delta-seconds or HTTP date) into seconds"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
 
 def get_request_headers() -> Dict[str, str]:
     """Get basic request headers"""
@@ -33,4 +156,4 @@ def get_request_headers() -> Dict[str, str]:
         'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
         'Accept-Language': 'en-US,en;q=0.5',
-    } 
\ No newline at end of file
+    }
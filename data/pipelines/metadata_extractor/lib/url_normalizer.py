@@ -0,0 +1,82 @@
+"""
+Canonical URL forms for music links
+
+Reshared songs show up under many spellings (share tracking params, short
+links, mobile hosts, localized paths). Collapsing them to one canonical URL
+lets each resource be fetched once per run and cached under a single key.
+"""
+
+import re
+from typing import Dict, List
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+# Query params that only track the share on any site (plus utm_*)
+TRACKING_PARAMS = {'fbclid', 'gclid', 'igsh', 'igshid', 'mc_cid', 'mc_eid'}
+
+# Share params that only mean tracking on these hosts; elsewhere they may select content
+HOST_TRACKING_PARAMS = {
+    'open.spotify.com': {'si', 'nd'},
+    'youtube.com': {'si', 'feature', 'pp', 'ab_channel'},
+    'music.youtube.com': {'si', 'feature'},
+    'soundcloud.com': {'si', 'ref'},
+}
+
+# Mobile/alternate hosts that serve the same pages as the main host. Not
+# music.youtube.com: it is its own platform (extractor, rate limit, rules)
+HOST_ALIASES = {
+    'm.youtube.com': 'youtube.com',
+    'm.soundcloud.com': 'soundcloud.com',
+    'm.audius.co': 'audius.co',
+    'mobile.tidal.com': 'tidal.com',
+    'listen.tidal.com': 'tidal.com',
+}
+
+# open.spotify.com/intl-de/track/... -> open.spotify.com/track/...
+SPOTIFY_INTL_PATH = re.compile(r'^/intl-[a-z]{2}(?:-[a-z]{2})?(?=/)', re.IGNORECASE)
+
+def _is_tracking_param(name: str, host: str) -> bool:
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith('utm_') or name in HOST_TRACKING_PARAMS.get(host, ())
+
+def canonicalize_url(url: str) -> str:
+    """Canonical form of a URL: no tracking params, fragments or host/path variants"""
+    try:
+        parsed = urlparse(url.strip())
+        # Scheme is kept: the canonical URL is also what gets fetched
+        scheme = (parsed.scheme or 'https').lower()
+        host = parsed.netloc.lower()
+        if host.startswith('www.'):
+            host = host[4:]
+        path = parsed.path
+        params = parse_qsl(parsed.query, keep_blank_values=True)
+
+        host = HOST_ALIASES.get(host, host)
+
+        if host == 'youtu.be':
+            # Short links carry the video id in the path
+            video_id = path.strip('/')
+            if not video_id:
+                raise ValueError(f"youtu.be link without a video id: {url}")
+            host, path = 'youtube.com', '/watch'
+            params = [('v', video_id)] + [(k, v) for k, v in params if k != 'v']
+        params = [(k, v) for k, v in params if not _is_tracking_param(k, host)]
+        if host in ('youtube.com', 'music.youtube.com'):
+            # Start offsets don't change the video
+            params = [(k, v) for k, v in params if k != 't']
+        elif host == 'open.spotify.com':
+            path = SPOTIFY_INTL_PATH.sub('', path)
+
+        if len(path) > 1:
+            path = path.rstrip('/')
+
+        return urlunparse((scheme, host, path, '', urlencode(sorted(params)), ''))
+    except Exception:
+        return url
+
+def group_by_canonical_url(embeds: List[Dict]) -> Dict[str, List[Dict]]:
+    """Group embed rows by canonical URL, preserving first-seen order"""
+    groups: Dict[str, List[Dict]] = {}
+    for embed in embeds:
+        canonical = embed.get('canonical_url') or canonicalize_url(embed['embed_url'])
+        groups.setdefault(canonical, []).append(embed)
+    return groups
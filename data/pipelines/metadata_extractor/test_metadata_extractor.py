@@ -0,0 +1,377 @@
+"""
+Test suite for URL Metadata Extraction Pipeline
+
+Tests pure helpers without external dependencies (no network, no database).
+"""
+
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from postgrest.exceptions import APIError
+
+from data.pipelines.metadata_extractor import flow as extractor_flow
+from data.pipelines.metadata_extractor.lib import db, rate_limiter
+from data.pipelines.metadata_extractor.lib.http_client import FetchEngine
+from data.pipelines.metadata_extractor.lib.parsers import (
+    EXTRACTORS,
+    PLATFORM_SYNTAXES,
+    build_metadata_result,
+    extract_tidal_metadata,
+    index_opengraph,
+    needs_full_page,
+    og_value,
+    page_encoding,
+    parse_page,
+    register_extractor
+)
+from data.pipelines.metadata_extractor.lib.cache import (
+    MetadataCache,
+    conditional_headers
+)
+from data.pipelines.metadata_extractor.lib.url_normalizer import (
+    canonicalize_url,
+    group_by_canonical_url
+)
+from data.pipelines.metadata_extractor.lib.rate_limiter import (
+    TokenBucket,
+    parse_retry_after,
+    record_rate_limited,
+    wait_for_rate_limit
+)
+
+@pytest.fixture(autouse=True)
+def fresh_rate_limits():
+    """Each test starts with empty buckets"""
+    rate_limiter.reset_rate_limits()
+    yield
+    rate_limiter.reset_rate_limits()
+
+def test_token_bucket_no_wait_with_budget():
+    """Requests within the burst never wait"""
+    bucket = TokenBucket(rate=1.0, capacity=5)
+    waits = [bucket.reserve() for _ in range(5)]
+    assert waits == [0.0] * 5
+
+def test_token_bucket_waits_when_empty():
+    """Once empty, waiters are spaced by the refill rate in FIFO order"""
+    bucket = TokenBucket(rate=10.0, capacity=1)
+    assert bucket.reserve() == 0.0
+    first = bucket.reserve()
+    second = bucket.reserve()
+    assert first == pytest.approx(0.1, abs=0.01)
+    assert second == pytest.approx(0.2, abs=0.01)
+
+def test_token_bucket_throttle_and_recover():
+    """429 halves the rate and blocks until Retry-After; successes restore it"""
+    bucket = TokenBucket(rate=4.0, capacity=4)
+    bucket.throttle(retry_after=2.0)
+    assert bucket.rate == 2.0
+    assert bucket.reserve() >= 1.9
+    for _ in range(100):
+        bucket.recover()
+    assert bucket.rate == 4.0
+
+def test_domains_do_not_share_budget():
+    """A throttled domain does not slow down other domains"""
+    record_rate_limited("https://open.spotify.com/track/abc", retry_after=30)
+
+    started = time.monotonic()
+    asyncio.run(wait_for_rate_limit("https://www.youtube.com/watch?v=abc"))
+    assert time.monotonic() - started < 0.05
+
+def test_subdomains_use_configured_domain_bucket():
+    """artist.bandcamp.com shares the bandcamp.com bucket"""
+    assert rate_limiter._rate_limit_key("artist.bandcamp.com") == "bandcamp.com"
+    assert rate_limiter._rate_limit_key("unknown.example.org") == "unknown.example.org"
+
+def test_parse_retry_after():
+    """Retry-After accepts seconds and HTTP dates"""
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("garbage") is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+def test_cache_fresh_and_stale_entries():
+    """Entries are fresh within the TTL and keep validators for revalidation"""
+    cache = MetadataCache(name=":memory:", ttl_seconds=60)
+    result = {'url_domain': 'open.spotify.com', 'platform_name': 'spotify', 'og_metadata': '{}'}
+    cache.store("https://open.spotify.com/track/abc#x", result, etag='"v1"', body_bytes=1000)
+
+    entry = cache.lookup("HTTPS://open.spotify.com/track/abc")
+    assert entry['fresh'] and entry['platform_name'] == 'spotify'
+    assert conditional_headers(entry) == {'If-None-Match': '"v1"'}
+
+    cache.ttl_seconds = 0
+    assert not cache.lookup("https://open.spotify.com/track/abc")['fresh']
+    assert cache.lookup("https://open.spotify.com/track/other") is None
+
+def test_cache_stats():
+    """Hit rate counts revalidations as hits and sums bytes saved"""
+    cache = MetadataCache(name=":memory:")
+    entry = {'body_bytes': 500}
+    cache.record_hit(entry)
+    cache.record_hit(entry, revalidated=True)
+    cache.record_miss()
+    summary = cache.summary()
+    assert summary['bytes_saved'] == 1000
+    assert summary['hit_rate'] == pytest.approx(66.7, abs=0.1)
+
+def test_canonicalize_url_strips_share_noise():
+    """Tracking params, fragments, www. and Spotify intl paths are removed"""
+    assert canonicalize_url("https://open.spotify.com/intl-de/track/abc?si=123&utm_source=x#frag") == \
+        "https://open.spotify.com/track/abc"
+    assert canonicalize_url("https://WWW.SoundCloud.com/artist/song/?utm_medium=text") == \
+        "https://soundcloud.com/artist/song"
+    assert canonicalize_url("http://example.com/a") == "http://example.com/a"
+
+def test_canonicalize_url_unifies_youtube_variants():
+    """youtu.be and m. links collapse to youtube.com/watch; YouTube Music keeps its own host"""
+    expected = "https://youtube.com/watch?v=abc123"
+    assert canonicalize_url("https://youtu.be/abc123?si=xyz") == expected
+    assert canonicalize_url("https://m.youtube.com/watch?v=abc123&feature=share") == expected
+    assert canonicalize_url("https://www.youtube.com/watch?v=other") != expected
+    assert canonicalize_url("https://music.youtube.com/watch?v=abc123&t=42&si=q") == \
+        "https://music.youtube.com/watch?v=abc123"
+    # No video id: left as it was rather than turned into watch?v=
+    assert canonicalize_url("https://youtu.be/?si=xyz") == "https://youtu.be/?si=xyz"
+
+def test_canonicalize_url_scopes_share_params_to_their_hosts():
+    """Share params are only dropped where they're known to be tracking"""
+    assert canonicalize_url("https://open.spotify.com/track/abc?nd=1&si=x") == "https://open.spotify.com/track/abc"
+    assert canonicalize_url("https://example.com/player?feature=album&si=2&utm_source=x") == \
+        "https://example.com/player?feature=album&si=2"
+
+def test_group_by_canonical_url():
+    """Reshares of one song end up in a single fetch group"""
+    embeds = [
+        {'cast_id': '1', 'embed_index': 0, 'embed_url': "https://youtu.be/abc123"},
+        {'cast_id': '2', 'embed_index': 0, 'embed_url': "https://www.youtube.com/watch?v=abc123&si=q"},
+        {'cast_id': '3', 'embed_index': 1, 'embed_url': "https://open.spotify.com/track/xyz"},
+    ]
+    groups = group_by_canonical_url(embeds)
+    assert list(groups) == ["https://youtube.com/watch?v=abc123", "https://open.spotify.com/track/xyz"]
+    assert [e['cast_id'] for e in groups["https://youtube.com/watch?v=abc123"]] == ['1', '2']
+
+SPOTIFY_PAGE = (
+    b'<html><head><meta property="og:title" content="Song" />'
+    b'<meta property="og:description" content="Artist \xc2\xb7 Album \xc2\xb7 Song \xc2\xb7 2024" />'
+    b'</HEAD><body>' + b'<p>filler</p>' * 50000 + b'</body></html>'
+)
+
+def test_fetch_page_stops_after_head():
+    """Head-only fetches keep just the <head>; full fetches keep the body"""
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=SPOTIFY_PAGE))
+
+    async def fetch(head_only: bool) -> bytes:
+        async with FetchEngine(rate_limit=False, transport=transport) as engine:
+            _, body = await engine.fetch_page("https://open.spotify.com/track/abc", head_only=head_only)
+        return body
+
+    assert asyncio.run(fetch(True)).endswith(b'</HEAD>')
+    assert asyncio.run(fetch(False)) == SPOTIFY_PAGE
+
+def test_fetch_backs_off_on_server_errors():
+    """5xx slows the domain down and is retried like a 429; it never counts as a success"""
+    statuses = iter([503, 200])
+    transport = httpx.MockTransport(lambda request: httpx.Response(next(statuses), headers={'Retry-After': '0'}))
+    url = "https://open.spotify.com/track/abc"
+
+    async def fetch() -> int:
+        async with FetchEngine(transport=transport) as engine:
+            return (await engine.fetch(url)).status_code
+
+    assert asyncio.run(fetch()) == 200
+    bucket = rate_limiter._get_bucket(url)
+    assert bucket.rate < bucket.base_rate
+
+    # A server error that outlasts the retries raises without restoring the rate
+    transport = httpx.MockTransport(lambda request: httpx.Response(500, headers={'Retry-After': '0'}))
+    rate_limiter.reset_rate_limits()
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(fetch())
+    bucket = rate_limiter._get_bucket(url)
+    assert bucket.rate < bucket.base_rate
+
+def test_parse_page_head_only():
+    """OpenGraph-only platforms parse from the truncated <head>"""
+    head = SPOTIFY_PAGE[:SPOTIFY_PAGE.index(b'<body>')]
+    result = parse_page(head, "https://open.spotify.com/track/abc", "open.spotify.com", "spotify")
+    assert result['og_metadata'].startswith("title - Song | artist - Artist | album - Album | year - 2024")
+    assert not needs_full_page("spotify")
+    assert needs_full_page("youtube") and needs_full_page(None)
+
+def test_parse_page_decodes_with_the_declared_charset():
+    """Content-Type charset first, then <meta charset>, UTF-8 only as the fallback"""
+    page = '<html><head><meta charset="iso-8859-1"><meta property="og:title" content="Café del Mar"></head>'.encode('latin-1')
+    result = parse_page(page, "https://tidal.com/browse/track/1", "tidal.com", "tidal")
+    assert 'Café del Mar' in result['og_metadata']
+    
+    assert page_encoding(page, 'windows-1252') == 'cp1252'
+    assert page_encoding(b'<meta http-equiv="Content-Type" content="text/html; charset=Shift_JIS">') == 'shift_jis'
+    assert page_encoding(b'<meta charset="bogus">') == 'utf-8'
+    assert page_encoding(b'\xef\xbb\xbf<html>', 'latin-1') == 'utf-8-sig'
+
+def test_index_opengraph_keeps_page_order():
+    """OpenGraph is indexed once into property -> values; a later section wins"""
+    metadata = {'opengraph': [
+        {'namespace': {}, 'properties': [('og:title', 'A'), ('og:video:tag', 'x')]},
+        {'namespace': {}, 'properties': [('og:video:tag', 'y'), ('og:video:tag', 'z')]},
+    ]}
+    og = index_opengraph(metadata)
+    assert og == {'og:title': ['A'], 'og:video:tag': ['y', 'z']}
+    assert og_value(og, 'og:video:tag') == 'y'
+    assert index_opengraph({}) == {}
+
+def test_og_value_keeps_the_last_value_of_a_repeated_property():
+    """A property repeated within a section takes its last value (Spotify repeats og:title); arrays their first"""
+    metadata = {'opengraph': [{'namespace': {}, 'properties': [
+        ('og:title', 'Spotify'), ('og:image', 'cover'), ('og:title', 'YAH.'),
+        ('og:image', 'logo'), ('og:video:tag', 'Kendrick Lamar'), ('og:video:tag', 'DAMN.')
+    ]}]}
+    og = index_opengraph(metadata)
+    assert og_value(og, 'og:title') == 'YAH.'
+    assert og_value(og, 'og:image') == 'cover'
+    assert og_value(og, 'og:video:tag') == 'Kendrick Lamar'
+    assert og_value(og, 'og:description') is None
+
+def test_registered_extractor_builds_result():
+    """Adding a platform is a registration; unknown platforms keep raw metadata"""
+    metadata = {'opengraph': [{'namespace': {}, 'properties': [('og:title', 'Track - Label'), ('og:image', 'img')]}]}
+
+    @register_extractor('test_platform')
+    def extract_test_metadata(metadata, og):
+        return og_value(og, 'og:title').split(' - ')[0]
+
+    try:
+        assert not needs_full_page('test_platform')
+        result = build_metadata_result("https://x.test/1", "x.test", 'test_platform', metadata)
+        assert result['og_metadata'] == "Track"
+        assert result['platform_name'] == 'test_platform'
+    finally:
+        EXTRACTORS.pop('test_platform')
+        PLATFORM_SYNTAXES.pop('test_platform')
+
+    raw = build_metadata_result("https://x.test/1", "x.test", None, metadata)
+    assert json.loads(raw['og_metadata']) == json.loads(json.dumps(metadata))
+    assert extract_tidal_metadata(metadata) == "title - Label | artist - Track | image - img"
+
+class FakeQuery:
+    """Chainable stand-in for a supabase query/RPC builder"""
+    def __init__(self, data=None, error=None):
+        self.data, self.error = data, error
+
+    def __getattr__(self, name):
+        return self
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+    def execute(self):
+        if self.error:
+            raise self.error
+        return self
+
+def test_embeds_fallback_only_when_rpc_is_missing(monkeypatch):
+    """A missing RPC falls back to the client-side scan; other errors propagate"""
+    class FakeSupabase:
+        def __init__(self, error):
+            self.error = error
+
+        def rpc(self, name, params):
+            return FakeQuery(error=self.error)
+
+        def table(self, name):
+            return FakeQuery(data=[{'cast_id': 'c1', 'embed_index': 0, 'created_at': '2025-01-01T00:00:00',
+                                    'embed_url': 'https://open.spotify.com/track/abc', 'embed_type': 'url'}])
+
+    async def is_music_url(url):
+        return 'spotify' in url
+
+    monkeypatch.setattr(db, 'is_music_url', is_music_url)
+    monkeypatch.setattr(db, 'sb', FakeSupabase(APIError({'code': 'PGRST202', 'message': 'not found'})))
+    embeds, _ = asyncio.run(db.get_embeds_for_processing(limit=5))
+    assert [embed['cast_id'] for embed in embeds] == ['c1']
+
+    monkeypatch.setattr(db, 'sb', FakeSupabase(APIError({'code': '57014', 'message': 'statement timeout'})))
+    with pytest.raises(APIError):
+        asyncio.run(db.get_embeds_for_processing(limit=5))
+
+def test_embeds_fallback_applies_each_time_bound_alone(monkeypatch):
+    """The client-side scan filters on start_time or end_time even when only one is given"""
+    class RecordingQuery(FakeQuery):
+        def __init__(self):
+            super().__init__(data=[])
+            self.filters = []
+
+        def gte(self, column, value):
+            self.filters.append(('gte', value))
+            return self
+
+        def lte(self, column, value):
+            self.filters.append(('lte', value))
+            return self
+
+    query = RecordingQuery()
+    monkeypatch.setattr(db, 'sb', type('FakeSupabase', (), {'table': lambda self, name: query})())
+
+    asyncio.run(db._scan_embeds_for_music(5, None, '2025-01-01 00:00:00', None))
+    asyncio.run(db._scan_embeds_for_music(5, None, None, '2025-02-01 00:00:00'))
+    assert query.filters == [('gte', '2025-01-01 00:00:00'), ('lte', '2025-02-01 00:00:00')]
+
+def test_drop_processed_embeds_compares_times_not_strings(monkeypatch):
+    """processed_at and stale_before in different ISO forms still compare by time"""
+    rows = [
+        {'cast_id': 'c1', 'embed_index': 0, 'processed_at': '2025-01-01T10:00:00+00:00'},
+        {'cast_id': 'c1', 'embed_index': 1, 'processed_at': '2025-01-01T08:00:00.5+00:00'},
+        {'cast_id': 'c1', 'embed_index': 2, 'processed_at': None},
+    ]
+    monkeypatch.setattr(db, 'sb', type('FakeSupabase', (), {'table': lambda self, name: FakeQuery(data=rows)})())
+    embeds = [{'cast_id': 'c1', 'embed_index': i} for i in range(4)]
+
+    # '2025-01-01 09:00:00' sorts after the 'T' forms as a string
+    kept = db._drop_processed_embeds(embeds, stale_before='2025-01-01 09:00:00')
+    assert [embed['embed_index'] for embed in kept] == [1, 2, 3]
+    assert [embed['embed_index'] for embed in db._drop_processed_embeds(embeds)] == [3]
+
+def test_incremental_stale_rescan_covers_rows_behind_the_high_water_mark(monkeypatch):
+    """With stale_after_days the scan isn't narrowed to the high-water window, so old stale rows are refreshed"""
+    rows = [
+        {'cast_id': 'old', 'embed_index': 0, 'created_at': '2024-01-01T00:00:00', 'embed_url': 'https://open.spotify.com/track/a'},
+        {'cast_id': 'new', 'embed_index': 0, 'created_at': '2025-06-01T12:00:00', 'embed_url': 'https://open.spotify.com/track/b'},
+    ]
+    scans, extracted = [], []
+
+    async def fetch_url_embeds(batch_size, cursor, start_time, end_time, only_unprocessed=False, stale_before=None):
+        scans.append((start_time, stale_before))
+        return [row for row in rows if not start_time or row['created_at'] >= start_time.replace(' ', 'T')], None
+
+    async def extract_metadata_batch(embeds, batch_num, max_concurrency, use_cache, parse_workers):
+        extracted.extend(embed['cast_id'] for embed in embeds)
+        return []
+
+    async def succeed(*args):
+        return True
+
+    async def close():
+        pass
+
+    monkeypatch.setattr(extractor_flow, 'test_database_connection', succeed)
+    monkeypatch.setattr(extractor_flow, 'store_metadata_results_task', succeed)
+    monkeypatch.setattr(extractor_flow, 'fetch_url_embeds_task', fetch_url_embeds)
+    monkeypatch.setattr(extractor_flow, 'extract_metadata_batch_task', extract_metadata_batch)
+    monkeypatch.setattr(extractor_flow, 'close_fetch_engine', close)
+    monkeypatch.setattr(extractor_flow, 'close_parse_pool', lambda: None)
+    monkeypatch.setattr(extractor_flow, 'get_metadata_cache', lambda: MetadataCache(name=":memory:"))
+    monkeypatch.setattr(extractor_flow, 'get_checkpoint', lambda *args: {'created_at': '2025-06-01T12:00:00'})
+    monkeypatch.setattr(extractor_flow, 'set_checkpoint', lambda *args: True)
+
+    asyncio.run(extractor_flow.extract_url_metadata.fn(incremental=True))
+    assert extracted == ['new']
+
+    scans.clear(), extracted.clear()
+    asyncio.run(extractor_flow.extract_url_metadata.fn(incremental=True, stale_after_days=30))
+    assert scans[0][0] is None and scans[0][1]
+    assert extracted == ['old', 'new']
@@ -0,0 +1,13 @@
+-- Composite indexes backing keyset (seek) pagination of embed scans
+-- Pipelines page with WHERE (created_at, cast_id, embed_index) > cursor
+-- ORDER BY created_at, cast_id, embed_index so every page is an index range scan
+
+CREATE INDEX IF NOT EXISTS idx_embeds_keyset
+ON public.embeds(created_at, cast_id, embed_index);
+
+CREATE INDEX IF NOT EXISTS idx_embeds_metadata_keyset
+ON public.embeds_metadata(created_at, cast_id, embed_index);
+
+-- Superseded by the composite indexes (created_at is their leading column)
+DROP INDEX IF EXISTS idx_embeds_created_at;
+DROP INDEX IF EXISTS idx_embeds_metadata_created_at;
@@ -0,0 +1,79 @@
+-- Migration: Server-side music-domain filtering for embed selection
+-- The metadata extractor used to pull every URL embed in a window and filter
+-- music platforms in Python. The host is now stored on embeds and the filter
+-- runs against music_sources in the database, so only music rows are returned.
+
+-- =====================================================
+-- Column: embeds.url_domain
+-- Lowercased host of embed_url without www. (e.g. 'open.spotify.com')
+-- =====================================================
+
+ALTER TABLE public.embeds
+ADD COLUMN IF NOT EXISTS url_domain TEXT GENERATED ALWAYS AS (
+  regexp_replace(lower(substring(embed_url FROM '^[a-zA-Z][a-zA-Z0-9+.-]*://([^/?#:@]+)')), '^www\.', '')
+) STORED;
+
+COMMENT ON COLUMN public.embeds.url_domain IS 'Host of embed_url (lowercase, no www.) for server-side platform filtering';
+
+-- No index on url_domain: pages are read in keyset order (idx_embeds_keyset)
+-- and each row's domain is looked up in music_sources by its primary key
+
+-- =====================================================
+-- Function: get_music_embeds_page
+-- Next keyset page of embeds whose host is an active music_sources domain
+-- or a subdomain of one (artist.bandcamp.com -> bandcamp.com)
+-- =====================================================
+
+CREATE OR REPLACE FUNCTION get_music_embeds_page(
+  p_limit INTEGER DEFAULT 100,
+  p_start_time TIMESTAMP DEFAULT NULL,
+  p_end_time TIMESTAMP DEFAULT NULL,
+  p_after_created_at TIMESTAMP DEFAULT NULL,
+  p_after_cast_id TEXT DEFAULT NULL,
+  p_after_embed_index INTEGER DEFAULT NULL
+)
+RETURNS TABLE(
+  cast_id TEXT,
+  embed_index INTEGER,
+  embed_url TEXT,
+  embed_type TEXT,
+  url_domain TEXT,
+  platform_name TEXT,
+  created_at TIMESTAMP
+) AS $$
+BEGIN
+  RETURN QUERY
+  SELECT
+    e.cast_id,
+    e.embed_index,
+    e.embed_url,
+    e.embed_type,
+    e.url_domain,
+    ms.platform_name,
+    e.created_at
+  FROM embeds e
+  CROSS JOIN LATERAL (
+    -- Primary-key lookups of url_domain and each parent domain
+    -- (artist.bandcamp.com, bandcamp.com, com); the most specific match wins
+    -- (music.youtube.com over youtube.com)
+    SELECT s.platform_name
+    FROM generate_series(1, coalesce(array_length(string_to_array(e.url_domain, '.'), 1), 0)) AS label
+    JOIN music_sources s
+      ON s.domain = array_to_string((string_to_array(e.url_domain, '.'))[label:], '.')
+    WHERE s.is_active
+    ORDER BY label
+    LIMIT 1
+  ) ms
+  WHERE e.embed_type NOT IN ('image', 'video', 'cast')
+    AND e.created_at IS NOT NULL
+    AND (p_start_time IS NULL OR e.created_at >= p_start_time)
+    AND (p_end_time IS NULL OR e.created_at <= p_end_time)
+    AND (p_after_created_at IS NULL OR
+         (e.created_at, e.cast_id, e.embed_index) > (p_after_created_at, p_after_cast_id, p_after_embed_index))
+  ORDER BY e.created_at, e.cast_id, e.embed_index
+  LIMIT p_limit;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Grant permissions
+GRANT EXECUTE ON FUNCTION get_music_embeds_page TO service_role;
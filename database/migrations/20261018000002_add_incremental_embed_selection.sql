@@ -0,0 +1,93 @@
+-- Migration: Incremental metadata extraction
+-- Lets get_music_embeds_page skip embeds that already have (fresh) metadata
+-- with a server-side anti-join, and adds a table for pipeline high-water marks.
+
+-- =====================================================
+-- Table: pipeline_checkpoints
+-- Resumable progress markers per pipeline (high-water marks, cursors)
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS public.pipeline_checkpoints (
+  pipeline TEXT NOT NULL,
+  checkpoint_key TEXT NOT NULL,
+  value JSONB NOT NULL,
+  updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (pipeline, checkpoint_key)
+);
+
+COMMENT ON TABLE public.pipeline_checkpoints IS 'Progress markers written by data pipelines between runs';
+COMMENT ON COLUMN public.pipeline_checkpoints.value IS 'Checkpoint payload, e.g. {"created_at": "2025-09-01T12:00:00"}';
+
+GRANT ALL PRIVILEGES ON TABLE public.pipeline_checkpoints TO postgres, service_role;
+
+-- =====================================================
+-- Function: get_music_embeds_page
+-- Adds p_only_unprocessed / p_stale_before: when set, only embeds with no
+-- embeds_metadata row (or one processed before p_stale_before) are returned
+-- =====================================================
+
+DROP FUNCTION IF EXISTS get_music_embeds_page(INTEGER, TIMESTAMP, TIMESTAMP, TIMESTAMP, TEXT, INTEGER);
+
+CREATE OR REPLACE FUNCTION get_music_embeds_page(
+  p_limit INTEGER DEFAULT 100,
+  p_start_time TIMESTAMP DEFAULT NULL,
+  p_end_time TIMESTAMP DEFAULT NULL,
+  p_after_created_at TIMESTAMP DEFAULT NULL,
+  p_after_cast_id TEXT DEFAULT NULL,
+  p_after_embed_index INTEGER DEFAULT NULL,
+  p_only_unprocessed BOOLEAN DEFAULT FALSE,
+  p_stale_before TIMESTAMP DEFAULT NULL
+)
+RETURNS TABLE(
+  cast_id TEXT,
+  embed_index INTEGER,
+  embed_url TEXT,
+  embed_type TEXT,
+  url_domain TEXT,
+  platform_name TEXT,
+  created_at TIMESTAMP
+) AS $$
+BEGIN
+  RETURN QUERY
+  SELECT
+    e.cast_id,
+    e.embed_index,
+    e.embed_url,
+    e.embed_type,
+    e.url_domain,
+    ms.platform_name,
+    e.created_at
+  FROM embeds e
+  CROSS JOIN LATERAL (
+    -- Primary-key lookups of url_domain and each parent domain
+    -- (artist.bandcamp.com, bandcamp.com, com); the most specific match wins
+    -- (music.youtube.com over youtube.com)
+    SELECT s.platform_name
+    FROM generate_series(1, coalesce(array_length(string_to_array(e.url_domain, '.'), 1), 0)) AS label
+    JOIN music_sources s
+      ON s.domain = array_to_string((string_to_array(e.url_domain, '.'))[label:], '.')
+    WHERE s.is_active
+    ORDER BY label
+    LIMIT 1
+  ) ms
+  WHERE e.embed_type NOT IN ('image', 'video', 'cast')
+    AND e.created_at IS NOT NULL
+    AND (p_start_time IS NULL OR e.created_at >= p_start_time)
+    AND (p_end_time IS NULL OR e.created_at <= p_end_time)
+    AND (p_after_created_at IS NULL OR
+         (e.created_at, e.cast_id, e.embed_index) > (p_after_created_at, p_after_cast_id, p_after_embed_index))
+    -- Anti-join on the embeds_metadata primary key
+    AND (NOT p_only_unprocessed OR NOT EXISTS (
+      SELECT 1
+      FROM embeds_metadata em
+      WHERE em.cast_id = e.cast_id
+        AND em.embed_index = e.embed_index
+        AND (p_stale_before IS NULL OR em.processed_at >= p_stale_before)
+    ))
+  ORDER BY e.created_at, e.cast_id, e.embed_index
+  LIMIT p_limit;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Grant permissions
+GRANT EXECUTE ON FUNCTION get_music_embeds_page TO service_role;